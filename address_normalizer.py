@@ -0,0 +1,358 @@
+import csv
+import logging
+import re
+import threading
+import unicodedata
+
+# 都道府県（北から順）
+PREFECTURES = (
+    "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
+    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
+    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県", "静岡県", "愛知県",
+    "三重県", "滋賀県", "京都府", "大阪府", "兵庫県", "奈良県", "和歌山県",
+    "鳥取県", "島根県", "岡山県", "広島県", "山口県",
+    "徳島県", "香川県", "愛媛県", "高知県",
+    "福岡県", "佐賀県", "長崎県", "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県",
+)
+
+# 組み込みの市区町村（政令指定都市・東京23区・県庁所在地、および名称に市/町/村を含み規則で区切れないもの）
+# 全市区町村はADDRESS_MUNICIPALITY_CSV（日本郵便のKEN_ALL.CSV等）から読み込む
+DEFAULT_MUNICIPALITIES = {
+    "北海道": ("札幌市",),
+    "青森県": ("青森市",),
+    "岩手県": ("盛岡市",),
+    "宮城県": ("仙台市",),
+    "秋田県": ("秋田市",),
+    "山形県": ("山形市", "村山市"),
+    "福島県": ("福島市", "田村市"),
+    "茨城県": ("水戸市",),
+    "栃木県": ("宇都宮市", "市貝町"),
+    "群馬県": ("前橋市", "玉村町"),
+    "埼玉県": ("さいたま市",),
+    "千葉県": ("千葉市", "市川市", "市原市"),
+    "東京都": (
+        "千代田区", "中央区", "港区", "新宿区", "文京区", "台東区", "墨田区", "江東区", "品川区", "目黒区",
+        "大田区", "世田谷区", "渋谷区", "中野区", "杉並区", "豊島区", "北区", "荒川区", "板橋区", "練馬区",
+        "足立区", "葛飾区", "江戸川区", "東村山市", "武蔵村山市", "羽村市", "町田市",
+    ),
+    "神奈川県": ("横浜市", "川崎市", "相模原市"),
+    "新潟県": ("新潟市", "十日町市", "村上市"),
+    "富山県": ("富山市", "上市町"),
+    "石川県": ("金沢市", "野々市市"),
+    "福井県": ("福井市",),
+    "山梨県": ("甲府市", "市川三郷町"),
+    "長野県": ("長野市", "大町市"),
+    "岐阜県": ("岐阜市",),
+    "静岡県": ("静岡市", "浜松市"),
+    "愛知県": ("名古屋市",),
+    "三重県": ("津市", "四日市市"),
+    "滋賀県": ("大津市",),
+    "京都府": ("京都市",),
+    "大阪府": ("大阪市", "堺市"),
+    "兵庫県": ("神戸市",),
+    "奈良県": ("奈良市",),
+    "和歌山県": ("和歌山市",),
+    "鳥取県": ("鳥取市",),
+    "島根県": ("松江市",),
+    "岡山県": ("岡山市",),
+    "広島県": ("広島市", "廿日市市"),
+    "山口県": ("山口市",),
+    "徳島県": ("徳島市",),
+    "香川県": ("高松市",),
+    "愛媛県": ("松山市",),
+    "高知県": ("高知市",),
+    "福岡県": ("福岡市", "北九州市"),
+    "佐賀県": ("佐賀市",),
+    "長崎県": ("長崎市", "大村市"),
+    "熊本県": ("熊本市",),
+    "大分県": ("大分市",),
+    "宮崎県": ("宮崎市",),
+    "鹿児島県": ("鹿児島市",),
+    "沖縄県": ("那覇市",),
+}
+
+# 政令指定都市（市の後に行政区が続く）
+DESIGNATED_CITIES = frozenset((
+    "札幌市", "仙台市", "さいたま市", "千葉市", "横浜市", "川崎市", "相模原市", "新潟市", "静岡市", "浜松市",
+    "名古屋市", "京都市", "大阪市", "堺市", "神戸市", "岡山市", "広島市", "北九州市", "福岡市", "熊本市",
+))
+
+# 一致の段階（上から順に強い）
+EXACT = "exact"            # 番地・号まで一致
+BLOCK = "block"            # 町域と最初の番号（丁目・番地）まで一致
+CITY = "city"              # 市区町村まで一致
+PREFECTURE = "prefecture"  # 都道府県のみ一致
+
+# NFKC正規化が必要な文字（全角英数字・記号、和文空白、丸数字・㈱等の囲み文字、半角カナ）とハイフン類の連続
+# ページ本文全体をNFKC正規化すると遅いため、該当する部分だけを正規化する
+_COMPAT_RUN = re.compile(r"[\u3000\u2010-\u2015\u2212\u2460-\u24ff\u3200-\u33ff\ufe63\uff01-\uffef]+")
+_DASH_TABLE = str.maketrans({c: "-" for c in "\u2010\u2011\u2012\u2013\u2014\u2015\u2212\ufe63"})
+# 数字の間、および末尾の「番地」「号」と数字の間の空白は区切りとして残す（「1番地 0565-…」が「1-0565」にならないように）
+_WHITESPACE_BETWEEN_DIGITS = re.compile(r"(?<=[\d地号])\s+(?=\d)")
+_DIGIT_SEPARATOR = "\x00"
+_POSTAL_CODE = re.compile(r"〒\s*-?\s*\d{3}-?\d{4}|(?<![\d-])\d{3}-\d{4}(?![\d-])")
+_KANJI_DIGITS = {"〇": 0, "零": 0, "一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_KANJI_UNITS = {"十": 10, "百": 100, "千": 1000}
+# 丁目/番地/号等の前の漢数字、または末尾の枝番（「番地の五」「丁目五」）の漢数字
+_KANJI_NUMBER = re.compile(
+    r"(?P<number>[〇零一二三四五六七八九十百千]+)(?=丁目|番地|番町|番|号|地割|条|の[0-9〇一二三四五六七八九十])"
+    r"|(?P<marker>番地の|丁目|番|-)(?P<branch>[〇零一二三四五六七八九十百千]+)(?![\u3400-\u9fff])"
+)
+_LONG_VOWEL_BETWEEN_DIGITS = re.compile(r"(?<=\d)[ーｰ](?=\d)")
+# 数字の後の丁目・番地・番・号・「の」（番町は町名のため対象外）
+_BLOCK_MARKER = re.compile(r"(?<=\d)(?:丁目|番地の?|番(?!町)|号|の(?=\d))")
+_TRAILING_DASH = re.compile(r"(?<=\d)-(?!\d)")
+_GUN = re.compile(r"^(.{1,5}?郡)")
+_WARD = re.compile(r"^(.{1,4}?区)")
+_MUNICIPALITY_CHARS = "市区町村"
+
+def kanji_to_number(kanji: str) -> int:
+    """漢数字を整数に変換する（「二十三」「百五」等の位取り表記と「二〇三」等の並び表記に対応）"""
+    if not any(c in _KANJI_UNITS for c in kanji):
+        value = 0
+        for c in kanji:
+            value = value * 10 + _KANJI_DIGITS[c]
+        return value
+    total = 0
+    digit = 0
+    for c in kanji:
+        if c in _KANJI_UNITS:
+            total += (digit or 1) * _KANJI_UNITS[c]
+            digit = 0
+        else:
+            digit = digit * 10 + _KANJI_DIGITS[c]
+    return total + digit
+
+def _normalize_compat(match) -> str:
+    return unicodedata.normalize("NFKC", match.group(0)).translate(_DASH_TABLE)
+
+def _replace_kanji_number(match) -> str:
+    if match.group("number"):
+        return str(kanji_to_number(match.group("number")))
+    return match.group("marker") + str(kanji_to_number(match.group("branch")))
+
+def _replace_block_marker(match) -> str:
+    """丁目・番地・番・号を、後に番号が続く場合はハイフン、続かない場合は空文字にする"""
+    text = match.string
+    end = match.end()
+    if end < len(text) and text[end].isdigit():
+        return "-"
+    return ""
+
+def normalize_address(text: str) -> str:
+    """
+    住所表記を比較用に正規化する（ページ本文全体にも適用できるよう、各段階を正規表現の1回の置換で行う）
+    ・全角英数字・記号を半角に、ハイフン類を「-」に統一し、空白を除去（数字の間の空白は1つの空白にする）
+    ・郵便番号（〒123-4567）を除去
+    ・丁目/番地/号の前の漢数字を数字に変換
+    ・「1丁目2番3号」「1番地の2」を「1-2-3」「1-2」のハイフン形式に変換
+    :param text: 住所またはページ本文
+    :return: 正規化したテキスト
+    """
+    if not text:
+        return ""
+    text = _COMPAT_RUN.sub(_normalize_compat, text)
+    # 郵便番号は空白の処理より前に除去する（前後の数字が連結しないように）
+    text = _POSTAL_CODE.sub(" ", text)
+    text = _WHITESPACE_BETWEEN_DIGITS.sub(_DIGIT_SEPARATOR, text)
+    text = "".join(text.split()).replace(_DIGIT_SEPARATOR, " ")
+    text = _KANJI_NUMBER.sub(_replace_kanji_number, text)
+    text = _BLOCK_MARKER.sub(_replace_block_marker, text)
+    text = _LONG_VOWEL_BETWEEN_DIGITS.sub("-", text)
+    return _TRAILING_DASH.sub("", text)
+
+class MunicipalityIndex:
+    """
+    都道府県 → 市区町村のメモリ上のインデックス
+    住所を「都道府県 / 市区町村 / 町域以降」に分割し、都道府県が省略された住所は市区町村から補う
+    """
+
+    def __init__(self, municipalities: dict = None):
+        """
+        :param municipalities: {都道府県: [市区町村]}（Noneの場合は組み込みデータ）
+        """
+        self._by_prefecture = {pref: set() for pref in PREFECTURES}
+        self._prefectures_by_city = {}
+        self._max_city_len = 0
+        self._prefecture_re = re.compile("|".join(sorted(PREFECTURES, key=len, reverse=True)))
+        for pref, cities in (municipalities if municipalities is not None else DEFAULT_MUNICIPALITIES).items():
+            for city in cities:
+                self.add(pref, city)
+
+    def add(self, prefecture: str, city: str):
+        """市区町村を追加する（「〇〇郡〇〇町」の場合は郡を除いた町村名も登録）"""
+        city = normalize_address(city)
+        if prefecture not in self._by_prefecture or not city:
+            return
+        names = [city]
+        gun = _GUN.match(city)
+        if gun and len(city) > len(gun.group(1)):
+            names.append(city[len(gun.group(1)):])
+        for name in names:
+            self._by_prefecture[prefecture].add(name)
+            self._prefectures_by_city.setdefault(name, set()).add(prefecture)
+            self._max_city_len = max(self._max_city_len, len(name))
+
+    def load_csv(self, path: str, encoding: str = None) -> int:
+        """
+        市区町村の一覧をCSVから読み込む
+        各行で最初に現れる都道府県名の次の列を市区町村名とする
+        （日本郵便のKEN_ALL.CSV、「都道府県,市区町村」形式のどちらにも対応）
+        :param path: CSVファイルのパス
+        :param encoding: 文字コード（Noneの場合はUTF-8、失敗時はCP932）
+        :return: 読み込んだ行数
+        """
+        for enc in ([encoding] if encoding else ["utf-8-sig", "cp932"]):
+            try:
+                count = 0
+                with open(path, "r", encoding=enc, newline="") as f:
+                    for row in csv.reader(f):
+                        for col, value in enumerate(row[:-1]):
+                            if value in self._by_prefecture:
+                                self.add(value, row[col + 1])
+                                count += 1
+                                break
+                return count
+            except UnicodeDecodeError:
+                continue
+        raise ValueError(f"市区町村CSVの文字コードを判定できません: {path}")
+
+    def prefectures_of(self, city: str) -> set:
+        """市区町村名が属する都道府県の集合（同名の市区町村は複数）"""
+        return self._prefectures_by_city.get(city, set())
+
+    def _match_city(self, rest: str, prefecture: str) -> str:
+        """町域以前の部分から市区町村を取り出す（登録済みの名称を最長一致で優先し、なければ規則で区切る）"""
+        known = self._by_prefecture.get(prefecture) if prefecture else self._prefectures_by_city
+        for length in range(min(len(rest), self._max_city_len), 1, -1):
+            if rest[:length] in known:
+                city = rest[:length]
+                break
+        else:
+            city = ""
+            gun = _GUN.match(rest)
+            start = len(gun.group(1)) if gun else 0
+            for pos in range(start + 1, min(len(rest), start + 8)):
+                if rest[pos] in _MUNICIPALITY_CHARS:
+                    # 「四日市市」「十日町市」のように区切り文字が続く場合は後ろまで含める
+                    if pos + 1 < len(rest) and rest[pos + 1] in _MUNICIPALITY_CHARS:
+                        pos += 1
+                    city = rest[:pos + 1]
+                    break
+            if not city:
+                return ""
+        # 政令指定都市は行政区まで含める
+        if city in DESIGNATED_CITIES:
+            ward = _WARD.match(rest[len(city):])
+            if ward:
+                city += ward.group(1)
+        return city
+
+    def split(self, address: str, normalized: bool = False):
+        """
+        住所を都道府県・市区町村・町域以降に分割する
+        :param address: 住所
+        :param normalized: normalize_address済みの場合True
+        :return: (都道府県, 市区町村, 町域以降)（判定できない部分は空文字）
+        """
+        text = address if normalized else normalize_address(address)
+        match = self._prefecture_re.match(text)
+        prefecture = match.group(0) if match else ""
+        rest = text[len(prefecture):]
+        city = self._match_city(rest, prefecture)
+        if not prefecture and city:
+            # 政令指定都市は行政区を除いた市名で都道府県を引く
+            base_city = next((c for c in DESIGNATED_CITIES if city.startswith(c)), city)
+            prefectures = self.prefectures_of(base_city)
+            if len(prefectures) == 1:
+                prefecture = next(iter(prefectures))
+        return prefecture, city, rest[len(city):]
+
+class AddressMatcher:
+    """
+    申請住所がテキスト中にどの段階まで現れるかを判定する（都道府県 / 市区町村 / 町域+番号 / 完全一致）
+    テキストはnormalize_addressで1回正規化すれば、複数の判定で使い回せる
+    """
+
+    def __init__(self, address: str, index: MunicipalityIndex = None):
+        """
+        :param address: 申請住所
+        :param index: 市区町村インデックス（Noneの場合は既定のインデックス）
+        """
+        self.index = index if index is not None else get_default_index()
+        self.normalized = normalize_address(address)
+        self.prefecture, self.city, self.rest = self.index.split(self.normalized, normalized=True)
+        block = re.match(r"^\D*\d+", self.rest)
+        self.block = block.group(0) if block else ""
+
+    @staticmethod
+    def _bounded(text: str, start: int, part: str, strict: bool = False) -> bool:
+        """
+        text[start:]がpartで始まり、番号がそこで終わっているか（「1-9-1」が「1-9-10」に一致しないように）
+        strict=Trueの場合は枝番が続く場合（「1」に対する「1-2」）も一致としない
+        """
+        if not text.startswith(part, start):
+            return False
+        end = start + len(part)
+        if end >= len(text):
+            return True
+        if text[end].isdigit():
+            return False
+        return not (strict and text[end] == "-" and end + 1 < len(text) and text[end + 1].isdigit())
+
+    def match(self, text: str, normalized: bool = False):
+        """
+        テキスト中の住所の一致段階を返す
+        :param text: ページ本文・スニペット等
+        :param normalized: normalize_address済みの場合True
+        :return: EXACT / BLOCK / CITY / PREFECTURE（一致なしの場合はNone）
+        """
+        if not self.normalized:
+            return None
+        if not normalized:
+            text = normalize_address(text)
+        if not self.city:
+            # 市区町村を判定できない住所は全体の一致のみ判定する
+            if self.normalized in text:
+                return EXACT
+            return PREFECTURE if self.prefecture and self.prefecture in text else None
+
+        best = None
+        pos = text.find(self.city)
+        while pos != -1:
+            after = pos + len(self.city)
+            if self.rest and self._bounded(text, after, self.rest, strict=True):
+                return EXACT
+            if self.block and self._bounded(text, after, self.block):
+                best = BLOCK
+            elif best is None:
+                best = CITY
+            pos = text.find(self.city, after)
+        if best is not None:
+            return best
+        return PREFECTURE if self.prefecture and self.prefecture in text else None
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+def get_default_index(config=None) -> MunicipalityIndex:
+    """
+    プロセス内で共有する市区町村インデックス（初回のみ構築。ADDRESS_MUNICIPALITY_CSVがあれば読み込む）
+    :param config: 設定情報（Noneの場合はload_config()）
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            if config is None:
+                from config import load_config
+                config = load_config()
+            index = MunicipalityIndex()
+            csv_path = config.get("ADDRESS_MUNICIPALITY_CSV")
+            if csv_path:
+                try:
+                    count = index.load_csv(csv_path)
+                    logging.info(f"市区町村CSVを読み込み: {csv_path} ({count}行)")
+                except (OSError, ValueError) as e:
+                    logging.warning(f"市区町村CSVの読み込みに失敗（組み込みデータのみ使用）: {e}")
+            _default_index = index
+        return _default_index
@@ -1,12 +1,165 @@
-import requests
 import json
+import logging
 import re
+import time
+from utils import http_request, JobInterruptedException
+from event_log import PAYLOAD, log_event
+from query_planner import build_template_queries
+from company_name import CompanyNameMatcher
 
 
-def ai_generate_query(application_info, ollama_url, ollama_model, max_queries=1) -> list:
+# ページ解析の判定ルール（全呼び出しで同一の文字列にして、Ollamaのプロンプトキャッシュを効かせる）
+ANALYSIS_SYSTEM_PROMPT = """申請された企業情報と取得したウェブページを比較し、企業の実在性と同一性を厳密に評価してスコア化してください。
+判定は必ずステップバイステップで行い、最終的なスコアを0.0から1.0の範囲で出力してください。
+申請情報と取得ページ情報はユーザーメッセージで渡します。
+
+【厳密な判定ルール - 必ず以下の基準に従ってください】
+【重要】郵便番号の〒や括弧()は無視して判定してください
+
+1. 会社名の判定:
+   - 完全一致（〒、括弧、英語表記は無視）: +0.5点
+   - 例: "トヨタ自動車株式会社" = "トヨタ自動車株式会社（TOYOTA MOTOR CORPORATION）" → 完全一致
+   - 部分一致（略称・旧称等）: +0.2点
+   - 不一致または無関係: 0点
+
+2. 住所の判定:
+   - 完全一致（〒郵便番号は無視、番地まで一致）: +0.25点
+   - 例1: "愛知県豊田市トヨタ町1番地" = "〒471-8571　愛知県豊田市トヨタ町1番地" → 完全一致 0.25点
+   - 例2: "東京都千代田区1-1-1" = "〒100-0001 東京都千代田区1-1-1" → 完全一致 0.25点
+   - 部分一致（市区町村レベル一致）: +0.15点
+   - 例: "愛知県豊田市" のみ一致 → 部分一致 0.15点
+   - 都道府県のみ一致: +0.05点
+   - 不一致: 0点
+
+3. 電話番号の判定:
+   - 完全一致（ハイフンの有無無視）: +0.25点
+   - 不一致: 0点
+
+【計算方法】
+1. 上記ルールに基づいて各項目の点数を算出
+2. 合計点数を計算（上限1.0、下限0.0）
+3. 最終スコアを0.0-1.0の範囲で出力
+
+【計算検証】必ず以下の手順で計算してください：
+STEP1: 会社名判定 → X点
+STEP2: 住所判定 → Y点  
+STEP3: 電話番号判定 → Z点
+STEP4: 合計 = X + Y + Z
+STEP5: 上限1.0で切り捨て
+
+【判定例】
+- 会社名完全一致(0.5) + 住所完全一致(0.25) + 電話番号一致(0.25) = 1.0
+- 会社名完全一致(0.5) + 住所部分一致(0.15) + 電話番号一致(0.25) = 0.9
+- 会社名部分一致(0.2) + 住所部分一致(0.15) + 電話番号不一致(0) = 0.35
+
+【出力形式】
+以下のJSON形式で回答してください。計算過程や説明文は一切出力せず、JSONのみを出力してください：
+
+{
+    "score": 計算した正確な一致度スコア（小数点第3位まで）,
+    "reasoning": "STEP1:会社名判定=X点, STEP2:住所判定=Y点, STEP3:電話番号判定=Z点",
+    "matched_info": ["具体的に一致した項目のリスト"],
+    "confidence": 判定の確実性を示す信頼度スコア（0.0-1.0）
+}
+
+【絶対厳守】
+- JSON以外の文字（説明、計算過程、コメント等）は一切出力禁止
+- JSONの前後に空行や文字を含めない
+- 波括弧{}で始まり波括弧で終わる形式のみ
+"""
+
+def ollama_request_options(config) -> dict:
+    """
+    Ollamaへのリクエストに付ける共通の項目（keep_alive・options）
+    :param config: 設定情報（OLLAMA_KEEP_ALIVE / OLLAMA_NUM_CTX / OLLAMA_NUM_PREDICT）
+    """
+    fields = {}
+    keep_alive = config.get("OLLAMA_KEEP_ALIVE", "")
+    if keep_alive != "":
+        # "30m"等の文字列、秒数、-1（常駐）を受け付ける
+        fields["keep_alive"] = int(keep_alive) if re.fullmatch(r"-?\d+", str(keep_alive)) else keep_alive
+    options = {}
+    if int(config.get("OLLAMA_NUM_CTX", 0)) > 0:
+        options["num_ctx"] = int(config.get("OLLAMA_NUM_CTX"))
+    if int(config.get("OLLAMA_NUM_PREDICT", 0)) != 0:
+        options["num_predict"] = int(config.get("OLLAMA_NUM_PREDICT"))
+    if options:
+        fields["options"] = options
+    return fields
+
+def ollama_chat(ollama_url, ollama_model, messages, job=None, timeout=120, purpose="chat", **log_data) -> str:
+    """
+    Ollamaのchat APIをストリーミングで呼び出し、応答本文を返す
+    最初のトークンまでの時間（TTFT）とOllamaが返す処理時間の内訳をllm.callイベントとして記録する
+    :param messages: チャットメッセージ（固定のsystemメッセージを先頭に置くとプロンプトキャッシュが効く）
+    :param job: ジョブコンテキスト（残り時間をタイムアウトの上限とし、設定を参照する）
+    :param timeout: 既定タイムアウト（秒）
+    :param purpose: ログ用の呼び出し種別（query / analyze 等）
+    :return: 応答本文
+    """
+    import requests
+    from config import load_config
+
+    config = job.config if job is not None else load_config()
+    logger = job.logger if job is not None else logging.getLogger()
+    deadline = job.deadline if job is not None else None
+    payload = {"model": ollama_model, "messages": messages, "stream": True, **ollama_request_options(config)}
+
+    started = time.perf_counter()
+    first_token_at = None
+    parts = []
+    final = {}
+    response = http_request("POST", ollama_url, deadline=deadline, timeout=timeout, json=payload, stream=True)
+    try:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            # 生成中でも早期終了・期限切れで打ち切る（応答はfinallyで閉じてOllama側の生成も止める）
+            if deadline is not None:
+                deadline.check()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(f"Ollamaエラー: {chunk['error']}")
+            text = chunk.get("message", {}).get("content", "")
+            if text:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(text)
+            if chunk.get("done"):
+                final = chunk
+                break
+    except requests.exceptions.RequestException:
+        # 読み取り中のタイムアウト・切断は、ジョブの期限切れ・キャンセルであればそれとして扱う
+        if deadline is not None:
+            deadline.check()
+        raise
+    finally:
+        response.close()
+
+    ended = time.perf_counter()
+
+    def ns_to_ms(key):
+        # Ollamaの処理時間はナノ秒
+        return round(final[key] / 1e6, 1) if key in final else None
+
+    ttft_ms = round((first_token_at - started) * 1000, 1) if first_token_at is not None else None
+    log_event(logger, "llm.call",
+              f"AI呼び出し({purpose}): TTFT={ttft_ms}ms, 合計={round((ended - started) * 1000, 1)}ms, "
+              f"プロンプト={final.get('prompt_eval_count')}トークン, 生成={final.get('eval_count')}トークン",
+              purpose=purpose, model=ollama_model, ttft_ms=ttft_ms, total_ms=round((ended - started) * 1000, 1),
+              load_ms=ns_to_ms("load_duration"), prompt_eval_count=final.get("prompt_eval_count"),
+              prompt_eval_ms=ns_to_ms("prompt_eval_duration"), eval_count=final.get("eval_count"),
+              eval_ms=ns_to_ms("eval_duration"), **log_data)
+    return "".join(parts)
+
+def ai_generate_query(application_info, ollama_url, ollama_model, max_queries=1, job=None, include_templates=True) -> list:
     """
     申請情報（リストやdict）をもとにAI（ollama）でGoogle検索クエリを最大max_queries件生成する
     企業の実在性検証に特化した検索クエリを生成
+    job（JobContext）指定時はジョブの残り時間をLLM呼び出しのタイムアウト上限とする
+    include_templates=Falseの場合はテンプレートクエリを含めず、LLMの提案クエリのみを返す
+    （テンプレートはquery_planner.QueryPlannerが実績順に計画する）
     戻り値: クエリのリスト
     """
     import json
@@ -47,31 +200,16 @@ def ai_generate_query(application_info, ollama_url, ollama_model, max_queries=1)
 検索クエリのみを1行ずつ出力してください。説明文、番号、記号、余計な文字は不要です。
 """
     
-    payload = {
-        "model": ollama_model,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": False
-    }
-    
-    response = requests.post(ollama_url, json=payload, timeout=60)
-    response.raise_for_status()
-    result = response.json()
-    content = result["message"]["content"]
+    content = ollama_chat(ollama_url, ollama_model, [{"role": "user", "content": prompt}], job=job,
+                          timeout=60, purpose="query")
     
-    # 会社名から核心部分を抽出（フィルタリング用）
-    company_core = company_name.replace('株式会社', ' 株式会社 ').replace('有限会社', ' 有限会社 ').replace('合同会社', ' 合同会社 ')\
-        .replace('株式会社', '').replace('有限会社', '').replace('合同会社', '')\
-        .replace('（株）', '').replace('（有）', '').replace('（合）', '')\
-        .replace('法人', '法人 ')\
-        .replace('(株) ', '').replace('(有)', '').strip()
+    # 会社名（法人格・表記ゆれ・英文社名・旧社名を考慮）でクエリをフィルタリング
+    name_matcher = CompanyNameMatcher(company_name, other_info)
     
     # クエリリストに分割し、不要な行を除去
     queries = []
-    queries.append(f"{company_name} {address.split()[0] if address else ''} {tel.split()[0] if tel else ''}")
-    queries.append(f"{company_name} {address}")
-    queries.append(f"{company_name} {tel}")
-    queries.append(f"{company_name} {other_info[0] if other_info else ''}")
-    queries.append(f"{company_name}")
+    if include_templates:
+        queries.extend(query for _, query in build_template_queries(application_info))
     for line in content.strip().split("\n"):
         line = line.strip()
         if not line:
@@ -87,7 +225,7 @@ def ai_generate_query(application_info, ollama_url, ollama_model, max_queries=1)
             continue
             
         # 対象会社名が含まれていないクエリは除外
-        if company_core and company_core.lower() not in line.lower():
+        if name_matcher.core and name_matcher.match(line) is None:
             continue
             
         # サンプルやテスト関連のクエリを除外（ただし実際の会社名に含まれる場合は例外）
@@ -113,7 +251,7 @@ def ai_generate_query(application_info, ollama_url, ollama_model, max_queries=1)
     return unique_queries[:max_queries]
 
 
-def ai_analyze_content(application_info, scraped_content, ollama_url, ollama_model, _stop_flag=None):
+def ai_analyze_content(application_info, scraped_content, ollama_url, ollama_model, job=None, max_content_chars=3000):
     """
     申請情報とスクレイピング内容をAIで解析し、一致度をスコア化する
     
@@ -122,7 +260,8 @@ def ai_analyze_content(application_info, scraped_content, ollama_url, ollama_mod
         scraped_content: スクレイピング結果辞書 {"title": "", "url": "", "content": "", "links": []}
         ollama_url: OllamaのAPIエンドポイント
         ollama_model: 使用するAIモデル名
-        _stop_flag: 早期終了フラグ（threading.Event）
+        job: ジョブコンテキスト（JobContext）。早期終了・残り時間をこのジョブ単位で判定する
+        max_content_chars: 本文の最大文字数（Noneの場合は切り詰めない。サイト単位の解析では選択済みの断片を渡す）
     
     Returns:
         dict: {
@@ -132,27 +271,22 @@ def ai_analyze_content(application_info, scraped_content, ollama_url, ollama_mod
             "confidence": float  # 信頼度
         }
     """
-    # 早期終了フラグのチェック
-    from utils import check_early_termination, EarlyTerminationException
-    if check_early_termination():
-        raise EarlyTerminationException("早期終了フラグが設定されています")
-    
-    if _stop_flag and _stop_flag.is_set():
-        raise EarlyTerminationException("停止フラグが設定されています")
+    # 早期終了・処理時間上限のチェック（ジョブ単位）
+    logger = job.logger if job is not None else logging.getLogger()
+    if job is not None:
+        job.check()
     company_name = application_info[0] if len(application_info) > 0 else ""
     address = application_info[1] if len(application_info) > 1 else ""
     tel = application_info[2] if len(application_info) > 2 else ""
     other_info = application_info[3:] if len(application_info) > 3 else []
       # スクレイピング内容を要約（長すぎる場合はトランケート）
-    content = scraped_content.get("content", "")[:3000]  # 最大3000文字
+    content = scraped_content.get("content", "")[:max_content_chars]  # 既定は最大3000文字
     title = scraped_content.get("title", "")
     url = scraped_content.get("url", "")
     
-    prompt = f"""
-申請された企業情報と取得したウェブページを比較し、企業の実在性と同一性を厳密に評価してスコア化してください。
-判定は必ずステップバイステップで行い、最終的なスコアを0.0から1.0の範囲で出力してください。
-
-【申請情報】
+    # 固定の判定ルール（システムプロンプト）の後に、ジョブ内で共通の申請情報、ページごとに異なる内容の順に並べる
+    # （前方一致する部分はOllamaのKVキャッシュが再利用され、プロンプト処理が短くなる）
+    prompt = f"""【申請情報】
 会社名: {company_name}
 住所: {address}
 電話番号: {tel}
@@ -162,80 +296,17 @@ def ai_analyze_content(application_info, scraped_content, ollama_url, ollama_mod
 タイトル: {title}
 URL: {url}
 内容: {content}
-
-【厳密な判定ルール - 必ず以下の基準に従ってください】
-【重要】郵便番号の〒や括弧()は無視して判定してください
-
-1. 会社名の判定:
-   - 完全一致（〒、括弧、英語表記は無視）: +0.5点
-   - 例: "トヨタ自動車株式会社" = "トヨタ自動車株式会社（TOYOTA MOTOR CORPORATION）" → 完全一致
-   - 部分一致（略称・旧称等）: +0.2点
-   - 不一致または無関係: 0点
-
-2. 住所の判定:
-   - 完全一致（〒郵便番号は無視、番地まで一致）: +0.25点
-   - 例1: "愛知県豊田市トヨタ町1番地" = "〒471-8571　愛知県豊田市トヨタ町1番地" → 完全一致 0.25点
-   - 例2: "東京都千代田区1-1-1" = "〒100-0001 東京都千代田区1-1-1" → 完全一致 0.25点
-   - 部分一致（市区町村レベル一致）: +0.15点
-   - 例: "愛知県豊田市" のみ一致 → 部分一致 0.15点
-   - 都道府県のみ一致: +0.05点
-   - 不一致: 0点
-
-3. 電話番号の判定:
-   - 完全一致（ハイフンの有無無視）: +0.25点
-   - 不一致: 0点
-
-【計算方法】
-1. 上記ルールに基づいて各項目の点数を算出
-2. 合計点数を計算（上限1.0、下限0.0）
-3. 最終スコアを0.0-1.0の範囲で出力
-
-【計算検証】必ず以下の手順で計算してください：
-STEP1: 会社名判定 → X点
-STEP2: 住所判定 → Y点  
-STEP3: 電話番号判定 → Z点
-STEP4: 合計 = X + Y + Z
-STEP5: 上限1.0で切り捨て
-
-【判定例】
-- 会社名完全一致(0.5) + 住所完全一致(0.25) + 電話番号一致(0.25) = 1.0
-- 会社名完全一致(0.5) + 住所部分一致(0.15) + 電話番号一致(0.25) = 0.9
-- 会社名部分一致(0.2) + 住所部分一致(0.15) + 電話番号不一致(0) = 0.35
-
-【出力形式】
-以下のJSON形式で回答してください。計算過程や説明文は一切出力せず、JSONのみを出力してください：
-
-{{
-    "score": 計算した正確な一致度スコア（小数点第3位まで）,
-    "reasoning": "STEP1:会社名判定=X点, STEP2:住所判定=Y点, STEP3:電話番号判定=Z点",
-    "matched_info": ["具体的に一致した項目のリスト"],
-    "confidence": 判定の確実性を示す信頼度スコア（0.0-1.0）
-}}
-
-【絶対厳守】
-- JSON以外の文字（説明、計算過程、コメント等）は一切出力禁止
-- JSONの前後に空行や文字を含めない
-- 波括弧{{}}で始まり波括弧で終わる形式のみ
 """
 
-    payload = {
-        "model": ollama_model,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "stream": False
-    }
+    messages = [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
     
     try:
-        response = requests.post(ollama_url, json=payload, timeout=120)
-        response.raise_for_status()
-        
-        # stream=Falseの場合、レスポンスは単一のJSONオブジェクト
-        response_data = response.json()
-        content = response_data.get("message", {}).get("content", "")
-          # JSONレスポンスをパース
-        # 生の情報をprintする
-        print(f"AI応答(raw): {content}")  # 完全な応答を表示
+        content = ollama_chat(ollama_url, ollama_model, messages, job=job, timeout=120, purpose="analyze", url=url)
+        # 生の応答はPAYLOADレベル有効時のみ記録（通常時は整形・書き込みを行わない）
+        log_event(logger, "llm.raw_response", "AI応答(raw)", level=PAYLOAD, url=url, content=content)
         
         # JSONのみを抽出する処理
         try:
@@ -244,13 +315,12 @@ STEP5: 上限1.0で切り捨て
             end_idx = content.rfind('}')
             if start_idx != -1 and end_idx != -1:
                 json_content = content[start_idx:end_idx+1]
-                print(f"抽出したJSON: {json_content}")
                 result = json.loads(json_content)
             else:
                 raise json.JSONDecodeError("JSON形式が見つかりません", content, 0)
         except json.JSONDecodeError:
             # JSONが見つからない場合の処理
-            print(f"JSON抽出失敗。元の応答: {content[:200]}...")
+            logger.warning(f"JSON抽出失敗。元の応答: {content[:200]}...")
             result = json.loads(content.strip())
         
         # スコアを0.0-1.0の範囲に制限
@@ -259,6 +329,9 @@ STEP5: 上限1.0で切り捨て
         
         return result
         
+    except JobInterruptedException:
+        # タイムアウト・キャンセルは呼び出し元で処理する
+        raise
     except json.JSONDecodeError as e:
         # JSONパースエラーの場合はデフォルト値を返す
         return {
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+住所正規化・照合のベンチマーク
+
+表記ゆれ（全角数字・漢数字・丁目/番地/号・ハイフンの種類・郵便番号・空白）を含む合成住所を
+生成し、normalize_address と AddressMatcher.match のスループット（文字/秒）を計測する
+
+使い方: python bench_address.py [--count N]
+"""
+
+import argparse
+import random
+import time
+
+from address_normalizer import AddressMatcher, normalize_address, kanji_to_number
+
+_BASES = (
+    "愛知県豊田市トヨタ町", "東京都千代田区丸の内", "大阪府大阪市北区梅田", "北海道札幌市中央区北一条西",
+    "神奈川県横浜市西区みなとみらい", "福岡県福岡市博多区博多駅前", "富山県中新川郡上市町", "三重県四日市市諏訪町",
+)
+_KANJI = "〇一二三四五六七八九"
+
+def _kanji(number: int) -> str:
+    """1〜99を漢数字にする"""
+    tens, ones = divmod(number, 10)
+    return ("" if tens == 0 else ("十" if tens == 1 else _KANJI[tens] + "十")) + ("" if ones == 0 else _KANJI[ones])
+
+def synth_address(rng: random.Random) -> str:
+    """表記ゆれを含む住所を1件生成する"""
+    base = rng.choice(_BASES)
+    numbers = [rng.randint(1, 30) for _ in range(3)]
+    style = rng.randrange(4)
+    if style == 0:
+        rest = f"{_kanji(numbers[0])}丁目{_kanji(numbers[1])}番{_kanji(numbers[2])}号"
+    elif style == 1:
+        rest = "－".join(str(n).translate(str.maketrans("0123456789", "０１２３４５６７８９")) for n in numbers)
+    elif style == 2:
+        rest = f"{numbers[0]}番地の{numbers[1]}"
+    else:
+        rest = "−".join(str(n) for n in numbers) + " 5F"
+    postal = f"〒{rng.randint(100, 999)}-{rng.randint(0, 9999):04d} " if rng.random() < 0.5 else ""
+    return postal + base + rest
+
+def main():
+    parser = argparse.ArgumentParser(description="住所正規化・照合のベンチマーク")
+    parser.add_argument("--count", type=int, default=50000, help="住所の件数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    addresses = [synth_address(rng) for _ in range(args.count)]
+    total_chars = sum(len(a) for a in addresses)
+    assert kanji_to_number("二十三") == 23
+
+    t0 = time.perf_counter()
+    for address in addresses:
+        normalize_address(address)
+    normalize_s = time.perf_counter() - t0
+
+    matcher = AddressMatcher("〒471-8571 愛知県豊田市トヨタ町１番地")
+    t1 = time.perf_counter()
+    levels = {}
+    for address in addresses:
+        level = matcher.match(address)
+        levels[level] = levels.get(level, 0) + 1
+    match_s = time.perf_counter() - t1
+
+    print(f"住所: {args.count}件 / {total_chars}文字")
+    print(f"normalize_address   {normalize_s * 1000:8.1f} ms ({total_chars / normalize_s / 1e6:5.2f} M文字/秒)")
+    print(f"AddressMatcher.match {match_s * 1000:8.1f} ms ({total_chars / match_s / 1e6:5.2f} M文字/秒) 判定: {levels}")
+
+if __name__ == "__main__":
+    main()
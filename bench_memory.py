@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ページ保持メモリのベンチマーク
+
+同一サイトを巡回した想定の合成ページ（共通ナビゲーションリンク・ページ内の重複リンク・日本語本文）を
+生成し、保持したままの状態でのメモリ使用量を tracemalloc で比較する
+- dict: 従来のscrape_pageの戻り値（{'url', 'title', 'content', 'links'}、リンクはページごとに別文字列のリスト）
+- PageRecord: __slots__、リンクの重複除去・巡回内でのURL文字列共有
+- PageRecord(圧縮): 上記に加えて本文をzlib圧縮
+
+使い方: python bench_memory.py [--pages N] [--links N] [--chars N]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from page_record import PageRecord
+
+_WORDS = (
+    "株式会社", "会社概要", "事業内容", "所在地", "代表取締役", "設立", "資本金", "従業員数", "お問い合わせ",
+    "アクセス", "採用情報", "ニュース", "製品", "サービス", "東京都", "大阪府", "愛知県", "本社", "営業所",
+    "電話番号", "取引先", "沿革", "プライバシーポリシー", "サイトマップ", "令和", "年", "月", "日", "の", "と",
+)
+
+_BASE = "https://www.example.co.jp"
+
+def synth_page(index: int, links_per_page: int, chars: int, rng: random.Random) -> dict:
+    """
+    1ページ分の生データを生成する（HTML解析直後に相当し、URL文字列はページごとに新規生成）
+    リンクの半分はサイト共通のナビゲーション、残りはページ固有。ページ内で同じリンクが2回ずつ現れる
+    """
+    paths = [f"/nav/{n}" for n in range(links_per_page // 2)] + [f"/page/{index}/{n}" for n in range(links_per_page // 2)]
+    # urljoinと同様に、同じURLでも出現ごとに別の文字列オブジェクトになる
+    links = [_BASE + path for path in paths for _ in range(2)]
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word)
+    return {
+        "url": f"{_BASE}/page/{index}",
+        "title": f"ページ{index} | 株式会社サンプル",
+        "content": "".join(words),
+        "links": links,
+    }
+
+def measure(label: str, build, pages: int, links_per_page: int, chars: int) -> tuple:
+    """
+    pages件のページを生成して保持し、保持メモリ・ピーク・所要時間を返す
+    :param build: 生データdictと巡回単位のURL共有辞書から保持形式を作る関数
+    """
+    rng = random.Random(0)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    url_pool = {}
+    kept = [build(synth_page(i, links_per_page, chars, rng), url_pool) for i in range(pages)]
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # 保持形式から本文を参照できること（圧縮時は展開コストも計測）
+    t1 = time.perf_counter()
+    total_chars = sum(len(page.get("content")) for page in kept)
+    read_s = time.perf_counter() - t1
+    del kept
+    return label, current, peak, elapsed, read_s, total_chars
+
+def main():
+    parser = argparse.ArgumentParser(description="ページ保持メモリのベンチマーク")
+    parser.add_argument("--pages", type=int, default=200, help="ページ数")
+    parser.add_argument("--links", type=int, default=200, help="1ページあたりのリンク数（重複除去前は2倍）")
+    parser.add_argument("--chars", type=int, default=8000, help="1ページあたりの本文文字数")
+    args = parser.parse_args()
+
+    cases = [
+        ("dict", lambda raw, pool: raw),
+        ("PageRecord", lambda raw, pool: PageRecord(**raw, url_pool=pool)),
+        ("PageRecord(圧縮)", lambda raw, pool: PageRecord(**raw, compress=True, url_pool=pool)),
+    ]
+    results = [measure(label, build, args.pages, args.links, args.chars) for label, build in cases]
+
+    print(f"ページ数: {args.pages} / リンク数: {args.links * 2}（重複含む） / 本文: {args.chars}文字")
+    baseline = results[0][1]
+    for label, current, peak, elapsed, read_s, total_chars in results:
+        print(
+            f"{label:<18} 保持 {current / 1024 / 1024:7.2f} MiB ({current / baseline:5.1%})"
+            f" / ピーク {peak / 1024 / 1024:7.2f} MiB / 生成 {elapsed * 1000:7.1f} ms"
+            f" / 本文参照 {read_s * 1000:6.1f} ms ({total_chars}文字)"
+        )
+
+if __name__ == "__main__":
+    main()
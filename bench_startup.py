@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時間ベンチマーク
+
+- main モジュールのimport時間（新しいインタプリタで計測）
+- load_config() の初回（.env解析あり）と2回目（キャッシュ）の所要時間
+- import直後に重いモジュール（requests, bs4, dotenv）が読み込まれていないことの確認
+
+使い方: python bench_startup.py [--runs N]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("requests", "bs4", "dotenv", "urllib.request", "logging.handlers")
+
+_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+heavy = [m for m in {heavy!r} if m in sys.modules]
+from config import load_config
+load_config()
+t2 = time.perf_counter()
+load_config()
+t3 = time.perf_counter()
+print(f"{{t1 - t0:.6f}} {{t2 - t1:.6f}} {{t3 - t2:.6f}} {{','.join(heavy) or '-'}}")
+"""
+
+def run_probe() -> tuple:
+    """新しいインタプリタで1回計測する"""
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    import_s, config_first_s, config_cached_s, heavy = out.split()
+    return float(import_s), float(config_first_s), float(config_cached_s), heavy
+
+def run_interpreter_baseline() -> float:
+    """何もimportしないインタプリタ起動時間（比較用）"""
+    import time
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間ベンチマーク")
+    parser.add_argument("--runs", type=int, default=10, help="計測回数")
+    args = parser.parse_args()
+
+    # バイトコードキャッシュを作成するためのウォームアップ
+    run_probe()
+
+    samples = [run_probe() for _ in range(args.runs)]
+    baseline = statistics.median(run_interpreter_baseline() for _ in range(args.runs))
+
+    import_ms = [s[0] * 1000 for s in samples]
+    config_first_ms = [s[1] * 1000 for s in samples]
+    config_cached_us = [s[2] * 1_000_000 for s in samples]
+    heavy = samples[-1][3]
+
+    print(f"計測回数: {args.runs}")
+    print(f"インタプリタ起動（python -c pass）: {baseline * 1000:.1f} ms")
+    print(f"import main: 中央値 {statistics.median(import_ms):.1f} ms / 最大 {max(import_ms):.1f} ms")
+    print(f"load_config() 初回: 中央値 {statistics.median(config_first_ms):.2f} ms")
+    print(f"load_config() 2回目以降: 中央値 {statistics.median(config_cached_us):.1f} µs")
+    print(f"import直後に読み込み済みの重いモジュール: {heavy}")
+    if heavy != "-":
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlparse, parse_qsl, urlunparse
+
+RECORD = "record"
+REPLAY = "replay"
+
+# 記録しないクエリパラメータ（APIキー等。照合にも使わない）
+SECRET_PARAMS = ("key", "api_key", "apikey", "token", "access_token")
+
+def cassette_name(application_info) -> str:
+    """
+    申請情報から決まるカセット名（同じ申請情報の記録と再生で同じファイルを使う）
+    :param application_info: 申請情報リスト [会社名, 住所, 電話番号, その他...]
+    """
+    digest = hashlib.sha1("\0".join(str(item) for item in application_info).encode("utf-8")).hexdigest()
+    return f"cassette_{digest[:16]}.jsonl.gz"
+
+def request_key(method: str, url: str, params=None, json_body=None, data=None) -> tuple:
+    """
+    リクエストの照合キー（メソッド・クエリを整列したURL・リクエスト本文のハッシュ）
+    :return: (メソッド, URL, 本文のハッシュ)
+    """
+    parsed = urlparse(url)
+    query = parse_qsl(parsed.query, keep_blank_values=True)
+    if params:
+        query += list(params.items()) if isinstance(params, dict) else list(params)
+    query = sorted((str(k), str(v)) for k, v in query if str(k).lower() not in SECRET_PARAMS)
+    normalized = urlunparse(parsed._replace(query=urlencode(query), fragment=""))
+    if json_body is not None:
+        body = json.dumps(json_body, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    elif isinstance(data, str):
+        body = data.encode("utf-8")
+    else:
+        body = data or b""
+    return method.upper(), normalized, hashlib.sha1(body).hexdigest() if body else ""
+
+def _build_response(entry: dict):
+    """記録したやり取りからrequests.Responseを組み立てる（本文は読み込み済みとして扱う）"""
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+    from datetime import timedelta
+
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.reason = entry.get("reason", "")
+    response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+    response.url = entry.get("final_url", entry["url"])
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.elapsed = timedelta(seconds=entry.get("elapsed", 0.0))
+    if "body_b64" in entry:
+        response._content = base64.b64decode(entry["body_b64"])
+    else:
+        response._content = entry.get("body", "").encode("utf-8")
+    response._content_consumed = True
+    return response
+
+class Cassette:
+    """
+    1ジョブ分の外部HTTP通信（Google検索・robots.txt・ページ・サイトマップ・Ollama）の記録と再生
+    記録：全てのやり取りをgzip圧縮のJSONL（1行1リクエスト）に追記する（APIキーは記録しない）
+    再生：同じリクエスト（メソッド・URL・本文）の記録を記録順に返す。通信せずにパイプラインを実行できるため、
+          CPU処理・スケジューリングの変更を同じ入力で繰り返し計測できる
+    """
+
+    def __init__(self, path: str, mode: str, latency: str = "recorded"):
+        """
+        :param path: カセットファイル（.jsonl.gz）
+        :param mode: "record" または "replay"
+        :param latency: 再生時の応答待ち（"recorded": 記録した所要時間だけ待つ、"zero": 待たない）
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"不明なカセットモード: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._file = None
+        self._tmp_path = None
+        self._entries = {}
+        if mode == RECORD:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            # 同じ申請情報のジョブが並行して記録しても一時ファイルが衝突しないよう、記録ごとに別名にする
+            fd, self._tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+            os.close(fd)
+            self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8")
+        else:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            # 再生モードでは通信しない（全リクエストを接続エラーとして扱う）
+            logging.warning(f"再生するカセットがありません（全ての通信を接続エラーとして扱います）: {self.path}")
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                self._entries.setdefault(tuple(entry["key"]), []).append(entry)
+        logging.info(f"カセットを再生: {self.path}（{sum(len(v) for v in self._entries.values())}件）")
+
+    def session(self, session, deadline=None):
+        """
+        記録・再生を行うHTTPセッション（requests.Sessionのrequest()のみ置き換える）
+        :param session: 実際の通信に使うrequests.Session
+        :param deadline: ジョブのDeadline（再生時の応答待ちをキャンセル可能にする）
+        """
+        return _CassetteSession(self, session, deadline)
+
+    def record(self, key: tuple, url: str, response=None, error: Exception = None, elapsed: float = 0.0):
+        """やり取りを1件記録する（responseの本文は読み込み済みであること）"""
+        entry = {"key": list(key), "url": key[1], "elapsed": round(elapsed, 4)}
+        if error is not None:
+            entry["error"] = type(error).__name__
+            entry["message"] = str(error)
+        else:
+            entry["status"] = response.status_code
+            entry["reason"] = response.reason
+            entry["headers"] = dict(response.headers)
+            if response.history:
+                # リダイレクト先（APIキー等は除く）
+                entry["final_url"] = request_key("GET", response.url)[1]
+            content = response.content or b""
+            try:
+                entry["body"] = content.decode("utf-8")
+            except UnicodeDecodeError:
+                entry["body_b64"] = base64.b64encode(content).decode("ascii")
+        with self._lock:
+            if self._file is None:
+                return
+            entry["seq"] = self._seq
+            self._seq += 1
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def replay(self, key: tuple) -> dict:
+        """
+        記録したやり取りを返す（同じキーが複数あれば記録順。使い切った場合は最後の記録を繰り返す）
+        :return: 記録（見つからない場合はNone）
+        """
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            return entries.pop(0) if len(entries) > 1 else entries[0]
+
+    def close(self):
+        """記録を確定する（記録中の一時ファイルを置き換える）"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                os.chmod(self._tmp_path, 0o644)
+                os.replace(self._tmp_path, self.path)
+                logging.info(f"カセットに記録: {self.path}（{self._seq}件）")
+
+class _CassetteSession:
+    """requests.Sessionのrequest()を記録・再生に置き換えるラッパー"""
+
+    def __init__(self, cassette: Cassette, session, deadline=None):
+        self._cassette = cassette
+        self._session = session
+        self._deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def request(self, method, url, **kwargs):
+        key = request_key(method, url, kwargs.get("params"), kwargs.get("json"), kwargs.get("data"))
+        if self._cassette.mode == REPLAY:
+            return self._replay(key)
+        started = time.perf_counter()
+        try:
+            response = self._session.request(method, url, **kwargs)
+            # ストリーミング応答も本文を読み切って記録する（呼び出し側は読み込み済みの本文を逐次読みできる）
+            response.content
+        except Exception as e:
+            import requests
+            if isinstance(e, requests.exceptions.RequestException):
+                self._cassette.record(key, url, error=e, elapsed=time.perf_counter() - started)
+            raise
+        self._cassette.record(key, url, response=response, elapsed=time.perf_counter() - started)
+        return response
+
+    def _replay(self, key):
+        import requests
+        entry = self._cassette.replay(key)
+        if entry is None:
+            logging.warning(f"カセットに記録がないリクエスト: {key[0]} {key[1]}")
+            raise requests.exceptions.ConnectionError(f"カセットに記録がありません: {key[0]} {key[1]}")
+        if self._cassette.latency == "recorded" and entry.get("elapsed"):
+            if self._deadline is not None:
+                self._deadline.sleep(entry["elapsed"])
+            else:
+                time.sleep(entry["elapsed"])
+        if "error" in entry:
+            error_class = getattr(requests.exceptions, entry["error"], requests.exceptions.ConnectionError)
+            raise error_class(entry.get("message", ""))
+        return _build_response(entry)
+
+def open_cassette(config, application_info):
+    """
+    設定に従ってジョブのカセットを開く
+    :param config: 設定情報
+    :param application_info: 申請情報リスト（カセット名の決定に使う）
+    :return: Cassette（CASSETTE_MODEが未設定の場合はNone）
+    """
+    mode = str(config.get("CASSETTE_MODE", "")).lower()
+    if mode not in (RECORD, REPLAY):
+        return None
+    path = os.path.join(config.get("CASSETTE_DIR", "cassettes"), cassette_name(application_info))
+    return Cassette(path, mode, latency=str(config.get("CASSETTE_LATENCY", "recorded")).lower())
@@ -0,0 +1,183 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+
+# 法人格（NFKC正規化・小文字化後。㈱は(株)、（株）は(株)になる）
+_LEGAL_FORMS = re.compile(
+    r"株式会社|有限会社|合同会社|合資会社|合名会社|相互会社"
+    r"|(?:一般|公益)(?:社団|財団)法人|特定非営利活動法人|npo法人|医療法人(?:社団|財団)?|社会福祉法人|学校法人|宗教法人|独立行政法人"
+    r"|\((?:株|有|合|資|名|社|財|医|福|学|特非)\)"
+    r"|\b(?:co\.?\s*,?\s*ltd|company\s+limited|limited|ltd|incorporated|inc|corporation|corp|kabushiki\s+kaisha"
+    r"|k\.\s*k|l\.\s*l\.\s*c|llc|g\.\s*k|plc|gmbh)\b\.?"
+)
+# 法人格の略記（法人格を残す正規化では正式な表記にそろえる）
+_LEGAL_ABBREVIATIONS = {"株": "株式会社", "有": "有限会社", "合": "合同会社", "資": "合資会社", "名": "合名会社"}
+_LEGAL_ABBREVIATION = re.compile(r"\((株|有|合|資|名)\)")
+# 比較時に無視する区切り文字（空白・中黒・句読点・括弧・引用符）
+_SEPARATORS = re.compile(r"[\s・･.,，、。'\"‘’“”\-‐‑–—―()（）「」『』\[\]【】]+")
+_SMALL_KANA = str.maketrans({"ヶ": "ケ", "ヵ": "カ", "ゖ": "け", "ゕ": "か"})
+# その他情報のうち別名として扱う項目（「旧社名: テスト商事」「英文社名: Test Corp.」の形式）
+_ALIAS_ENTRY = re.compile(r"^\s*(?P<label>[^:：]{1,12})\s*[:：]\s*(?P<name>.+?)\s*$")
+_ALIAS_LABELS = re.compile(r"旧社名|旧商号|旧称|英文|英語|英字|english|former|商号|屋号|通称|ブランド", re.IGNORECASE)
+
+# 会社名の一致種別
+FULL = "full"        # 申請どおりの会社名全体（法人格を含む）が一致
+CORE = "core"        # 法人格を除いた名称が一致
+ALIAS = "alias"      # 英文社名・旧社名等の別名が一致
+FUZZY = "fuzzy"      # 表記ゆれを許容して一致（編集距離）
+
+def fold_width(text: str) -> str:
+    """全角英数字・半角カナ等をNFKCで統一し、小文字化する（ヶ・ヵはケ・カにそろえる）"""
+    return unicodedata.normalize("NFKC", text or "").translate(_SMALL_KANA).lower()
+
+def normalize_company_name(name: str, keep_legal_form: bool = False) -> str:
+    """
+    会社名を比較用に正規化する
+    ・全角/半角・大文字/小文字の統一
+    ・法人格（株式会社・(株)・Co., Ltd.等）の除去（keep_legal_form=Trueの場合は残し、(株)等の略記は正式な表記にする）
+    ・空白・中黒・句読点・括弧の除去
+    :param name: 会社名（ページ本文にも適用できる）
+    :return: 正規化した文字列
+    """
+    text = fold_width(name)
+    if keep_legal_form:
+        text = _LEGAL_ABBREVIATION.sub(lambda m: _LEGAL_ABBREVIATIONS[m.group(1)], text)
+    else:
+        text = _LEGAL_FORMS.sub("", text)
+    return _SEPARATORS.sub("", text)
+
+def extract_aliases(other_info) -> list:
+    """
+    その他情報から英文社名・旧社名等の別名を取り出す
+    :param other_info: その他情報のリスト（["旧社名: テスト商事", "支店名: 新宿支店", ...]）
+    :return: 別名のリスト
+    """
+    aliases = []
+    for entry in other_info or []:
+        match = _ALIAS_ENTRY.match(str(entry))
+        if match and _ALIAS_LABELS.search(match.group("label")):
+            aliases.append(match.group("name"))
+    return aliases
+
+def _levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ac in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, bc in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ac != bc))
+        previous = current
+    return previous[-1]
+
+def _substring_distance(pattern: str, text: str) -> tuple:
+    """
+    patternとtext内の任意の部分文字列との最小編集距離（Sellersのアルゴリズム）
+    :return: (距離, 一致部分の終了位置)
+    """
+    previous = [0] * (len(text) + 1)
+    for i, pc in enumerate(pattern, 1):
+        current = [i] + [0] * len(text)
+        for j, tc in enumerate(text, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (pc != tc))
+        previous = current
+    end = min(range(len(previous)), key=previous.__getitem__)
+    return previous[end], end
+
+@dataclass
+class NameMatch:
+    """会社名の一致結果"""
+    kind: str
+    similarity: float
+    name: str           # 一致した申請側の名称（会社名または別名）
+    matched_text: str   # テキスト側の一致部分（正規化後）
+
+class CompanyNameMatcher:
+    """
+    会社名（および英文社名・旧社名）がテキスト中に現れるかを判定する
+    完全一致は部分文字列検索、表記ゆれは文字バイグラムで候補位置を絞ってから編集距離で照合する
+    """
+
+    def __init__(self, company_name: str, other_info=None, min_similarity: float = 0.8):
+        """
+        :param company_name: 申請会社名
+        :param other_info: その他情報（英文社名・旧社名を別名として使う）
+        :param min_similarity: 表記ゆれを一致とみなす最低類似度（1 - 編集距離/名称の長さ）
+        """
+        self.company_name = company_name or ""
+        self.full = normalize_company_name(self.company_name, keep_legal_form=True)
+        self.core = normalize_company_name(self.company_name)
+        # 申請会社名の法人格（前株・後株のどちらで書かれていても会社名全体の一致とする）
+        self.legal_forms = [normalize_company_name(m.group(0), keep_legal_form=True)
+                            for m in _LEGAL_FORMS.finditer(fold_width(self.company_name))]
+        self.min_similarity = min_similarity
+        self.aliases = []
+        for alias in extract_aliases(other_info):
+            core = normalize_company_name(alias)
+            if len(core) >= 2 and core != self.core and core not in (c for _, c in self.aliases):
+                self.aliases.append((alias, core))
+
+    @property
+    def names(self) -> list:
+        """検索クエリ等で会社を表す名称（法人格を除いた名称と別名）"""
+        return [core for core in [self.core] + [c for _, c in self.aliases] if core]
+
+    def _fuzzy(self, name: str, core: str, text: str):
+        """バイグラムの出現位置から候補の開始位置を投票し、上位の候補だけ編集距離を計算する"""
+        if len(core) < 3:
+            return None
+        votes = {}
+        for offset in range(len(core) - 1):
+            bigram = core[offset:offset + 2]
+            pos = text.find(bigram)
+            while pos != -1:
+                start = pos - offset
+                votes[start] = votes.get(start, 0) + 1
+                pos = text.find(bigram, pos + 1)
+        # 名称の半分以上のバイグラムが揃わない位置は、編集距離を計算しても閾値に届かない
+        needed = max(1, (len(core) - 1) // 2)
+        candidates = sorted((s for s, v in votes.items() if v >= needed), key=lambda s: -votes[s])[:5]
+        slack = max(1, int(len(core) * (1 - self.min_similarity)))
+        best = None
+        for start in candidates:
+            window_start = max(0, start - slack)
+            window = text[window_start:start + len(core) + slack]
+            distance, end = _substring_distance(core, window)
+            similarity = 1 - distance / len(core)
+            if similarity >= self.min_similarity and (best is None or similarity > best.similarity):
+                # 終了位置から、編集距離が最小となる開始位置を求める
+                starts = range(max(0, end - len(core) - distance), max(0, end - len(core) + distance) + 1)
+                matched = min((window[s:end] for s in starts), key=lambda m: _levenshtein(core, m))
+                best = NameMatch(FUZZY, similarity, name, matched)
+        return best
+
+    def match(self, text: str, normalized: bool = False):
+        """
+        テキスト中の会社名の最良の一致を返す
+        :param text: ページ本文・スニペット・検索クエリ等
+        :param normalized: normalize_company_name(text, keep_legal_form=True)済みの場合True
+        :return: NameMatch（一致しない場合はNone）
+        """
+        if not self.core:
+            return None
+        if not normalized:
+            text = normalize_company_name(text, keep_legal_form=True)
+        if self.full in text:
+            return NameMatch(FULL, 1.0, self.company_name, self.full)
+        pos = text.find(self.core)
+        if pos != -1:
+            while pos != -1:
+                end = pos + len(self.core)
+                for form in self.legal_forms:
+                    if text.endswith(form, 0, pos) or text.startswith(form, end):
+                        return NameMatch(FULL, 1.0, self.company_name, text[pos - len(form):end]
+                                         if text.endswith(form, 0, pos) else text[pos:end + len(form)])
+                pos = text.find(self.core, end)
+            return NameMatch(CORE, 1.0, self.company_name, self.core)
+        for alias, core in self.aliases:
+            if core in text:
+                return NameMatch(ALIAS, 1.0, alias, core)
+        best = self._fuzzy(self.company_name, self.core, text)
+        for alias, core in self.aliases:
+            candidate = self._fuzzy(alias, core, text)
+            if candidate and (best is None or candidate.similarity > best.similarity):
+                best = candidate
+        return best
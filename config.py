@@ -1,32 +1,208 @@
 import os
-from dotenv import load_dotenv
-
-def load_config():
-    load_dotenv()
-    def get_int_env(key, default):
-        val = os.getenv(key)
-        print(f"[DEBUG][config.py] os.getenv({key})={val}")
-        if val is None or val.strip() == '':
-            return default
+import threading
+from dataclasses import dataclass, fields
+from typing import Optional
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; CompanyVerificationBot/1.0; +http://localhost/robots.txt)"
+
+@dataclass(frozen=True)
+class Config:
+    """
+    .env/環境変数から読み込んだ型付き設定
+    フィールド名は環境変数名と同じ。従来のdict形式（config.get(key, default) / config[key]）でも参照できる
+    """
+    # 基本処理設定
+    MAX_PROCESSING_TIME: int = 300
+    PER_PROCESSING_TIME: int = 20
+
+    # Google Search API設定
+    GOOGLE_API_KEY: Optional[str] = None
+    GOOGLE_CSE_ID: Optional[str] = None
+    GOOGLE_API_DAILY_LIMIT: int = 100
+    GOOGLE_API_RATE_LIMIT_PER_MINUTE: int = 60
+    GOOGLE_API_RATE_LIMIT_PER_SECOND: int = 10
+    GOOGLE_API_BURST_LIMIT: int = 20
+    GOOGLE_API_WARNING_THRESHOLD: int = 80
+    GOOGLE_API_RETRY_ATTEMPTS: int = 3
+    GOOGLE_API_RETRY_DELAY: float = 1.0
+    GOOGLE_API_STRICT_MODE: bool = False
+    GOOGLE_API_AUTO_PAUSE: bool = True
+    GOOGLE_API_PAUSE_DURATION: int = 60
+    GOOGLE_API_SPECULATIVE_RESERVE: int = 10
+
+    # AI分析設定（Ollama）
+    OLLAMA_API_URL: Optional[str] = None
+    OLLAMA_MODEL: Optional[str] = None
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_NUM_CTX: int = 0
+    OLLAMA_NUM_PREDICT: int = 0
+
+    # サイト単位解析設定（埋め込みによる断片検索）
+    ANALYSIS_MODE: str = "page"
+    OLLAMA_EMBED_URL: str = ""
+    OLLAMA_EMBED_MODEL: str = ""
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_FILE: str = "embedding_cache.db"
+    RETRIEVAL_TOP_K: int = 8
+    RETRIEVAL_CHUNK_CHARS: int = 400
+
+    # 検索・スクレイピング設定
+    MAX_GOOGLE_SEARCH: int = 3
+    GOOGLE_SEARCH_NUM_RESULTS: int = 3
+    MAX_SCRAPE_DEPTH: int = 3
+    MAX_CRAWL_PAGES: int = 100
+    PAGE_BODY_COMPRESSION: bool = False
+    PREFETCH_RESULTS: int = 0
+    SCORE_THRESHOLD: float = 0.95
+
+    # 検索クエリ計画設定
+    QUERY_PLANNER_STATS_FILE: str = "query_planner_stats.json"
+    QUERY_PLANNER_MIN_TRIALS: int = 5
+    QUERY_PLANNER_MIN_SUCCESS_RATE: float = 0.05
+    CONCURRENT_QUERIES: bool = False
+
+    # Webスクレイピング倫理設定
+    SCRAPER_USER_AGENT: str = DEFAULT_USER_AGENT
+    SCRAPER_INTERVAL: float = 1.0
+    ROBOTS_TXT_TIMEOUT: int = 5
+    ROBOTS_TXT_STRICT: bool = True
+    HOST_MAX_CONCURRENCY: int = 4
+    HOST_MAX_INTERVAL: float = 60.0
+    HOST_SLOW_FACTOR: float = 3.0
+
+    # サイトマップ探索設定
+    SITEMAP_DISCOVERY_ENABLED: bool = True
+    SITEMAP_SEEDS: int = 3
+    SITEMAP_MAX_FILES: int = 5
+    SITEMAP_MAX_URLS: int = 50000
+    SITEMAP_CACHE_SIZE: int = 1000
+    SITEMAP_CACHE_TTL: float = 3600.0
+
+    # ドメイン評価設定
+    DOMAIN_INDEX_ENABLED: bool = True
+    DOMAIN_REPUTATION_FILE: str = "domain_reputation.json"
+    DOMAIN_DEMOTE_SCORE: float = 0.3
+    DOMAIN_DEMOTE_MIN_SAMPLES: int = 5
+    DOMAIN_DENY_LIST: str = ""
+    DOMAIN_ALLOW_LIST: str = ""
+    DOMAIN_BOOST_LIST: str = ""
+
+    # スニペット判定設定
+    TRIAGE_ENABLED: bool = True
+    TRIAGE_ACCEPT_FROM_SNIPPET: bool = True
+
+    # 住所照合設定
+    ADDRESS_MUNICIPALITY_CSV: str = ""
+
+    # 法人登記インデックス設定
+    REGISTRY_DB: str = ""
+    REGISTRY_SKIP_WEB_SEARCH: bool = True
+
+    # 判定結果ストア設定
+    RESULT_STORE_ENABLED: bool = True
+    RESULT_STORE_JSONL: str = "results.jsonl"
+    RESULT_STORE_DB: str = "results.db"
+
+    # プロファイル設定
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_MS: float = 10.0
+    PROFILE_DIR: str = "."
+
+    # 通信の記録・再生設定
+    CASSETTE_MODE: str = ""
+    CASSETTE_DIR: str = "cassettes"
+    CASSETTE_LATENCY: str = "recorded"
+
+    # 分散実行設定
+    WORKER_COORDINATOR_DB: str = "coordinator.db"
+    WORKER_CONCURRENCY: int = 2
+    WORKER_LEASE_SECONDS: float = 120.0
+    WORKER_HEARTBEAT_SECONDS: float = 20.0
+    WORKER_MAX_ATTEMPTS: int = 3
+    QUOTA_LEASE_BATCH: int = 5
+
+    # API使用枠の配分設定
+    QUOTA_DAY_START_HOUR: int = 0
+    QUOTA_DAY_END_HOUR: int = 24
+    QUOTA_BURST_RATIO: float = 0.2
+    QUOTA_LOW_RATIO: float = 0.1
+    QUOTA_LOW_PRIORITY: int = 1
+    QUOTA_CACHE_MAX_AGE_DAYS: float = 30.0
+
+    # 見込みによる打ち切り設定
+    STOP_POLICY_ENABLED: bool = True
+    STOP_MIN_PROBABILITY: float = 0.05
+    STOP_MIN_HISTORY: int = 30
+    STOP_HISTORY_DAYS: float = 30.0
+    STOP_EXPLORE_RATE: float = 0.1
+
+    # ログ設定
+    LOG_LEVEL: str = "INFO"
+    LOG_FILE: str = "app.jsonl"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 5
+    LOG_CONSOLE: bool = True
+
+    def get(self, key, default=None):
+        """dict互換の参照（未定義のキーはdefault）"""
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
         try:
-            return int(val)
-        except Exception:
-            return default
-        
-    config = {
-        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY"),
-        "GOOGLE_CSE_ID": os.getenv("GOOGLE_CSE_ID"),
-        "OLLAMA_API_URL": os.getenv("OLLAMA_API_URL"),
-        "OLLAMA_MODEL": os.getenv("OLLAMA_MODEL"),
-        "MAX_GOOGLE_SEARCH": get_int_env("MAX_GOOGLE_SEARCH", 3),
-        "GOOGLE_SEARCH_NUM_RESULTS": get_int_env("GOOGLE_SEARCH_NUM_RESULTS", 3),
-        "MAX_SCRAPE_DEPTH": get_int_env("MAX_SCRAPE_DEPTH", 3),
-        "SCORE_THRESHOLD": float(os.getenv("SCORE_THRESHOLD", 0.95)),
-        "LOG_LEVEL": os.getenv("LOG_LEVEL", "INFO"),
-        "MAX_PROCESSING_TIME": get_int_env("MAX_PROCESSING_TIME", 10),
-    }
-    print(f"[DEBUG][config.py] MAX_PROCESSING_TIME={config['MAX_PROCESSING_TIME']}")
-    return config
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return hasattr(self, key)
+
+    def items(self):
+        """(キー, 値) の一覧"""
+        return [(f.name, getattr(self, f.name)) for f in fields(self)]
+
+def _parse_value(raw: str, field_type, default):
+    """環境変数の文字列をフィールドの型に変換する（変換できない場合はdefault）"""
+    if raw is None or raw.strip() == "":
+        return default
+    raw = raw.strip()
+    try:
+        if field_type is bool:
+            return raw.lower() in ("true", "1", "yes", "on")
+        if field_type is int:
+            return int(raw)
+        if field_type is float:
+            return float(raw)
+    except ValueError:
+        return default
+    return raw
+
+_env_loaded = False
+_config_cache = None
+_config_lock = threading.Lock()
+
+def _load_env_once():
+    """.envを1プロセスにつき1回だけ読み込む（python-dotenvは必要になった時点でimport）"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def load_config(reload: bool = False) -> Config:
+    """
+    設定を読み込む（初回のみ.envを解析し、以降は同じConfigを返す）
+    :param reload: Trueの場合は環境変数から読み直す
+    :return: Config
+    """
+    global _config_cache
+    with _config_lock:
+        if _config_cache is None or reload:
+            _load_env_once()
+            values = {}
+            for f in fields(Config):
+                values[f.name] = _parse_value(os.getenv(f.name), f.type, f.default)
+            _config_cache = Config(**values)
+        return _config_cache
 
 if __name__ == "__main__":
     # 動作テスト
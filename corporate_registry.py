@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+法人番号公表サイト（国税庁）の全件データによるオフライン法人登記インデックス
+
+全件データ（CSV・zip、Unicode版/Shift-JIS版）を読み込み、正規化した法人名・所在地をキーにした
+SQLiteのインデックスを構築する。申請情報の法人名・所在地が登記と一致すれば、Web検索を行わずに
+実在性を確認できる（電話番号は公表データに含まれないため確認できない）。
+差分データも同じ形式のため、全件データの後に順に取り込めば最新の状態に更新される。
+
+使い方:
+  python corporate_registry.py import 00_zenkoku_all_20240329.zip [--db corporate_registry.db]
+  python corporate_registry.py lookup 会社名 住所 [--db corporate_registry.db]
+"""
+
+import argparse
+import csv
+import io
+import logging
+import os
+import sqlite3
+import time
+import zipfile
+from dataclasses import dataclass
+
+from address_normalizer import AddressMatcher, normalize_address, EXACT, BLOCK, CITY, PREFECTURE
+from company_name import CompanyNameMatcher, normalize_company_name, FULL
+
+# 全件データの列（0始まり。ヘッダー行なし）
+COL_CORPORATE_NUMBER = 1
+COL_NAME = 6
+COL_KIND = 8
+COL_PREFECTURE = 9
+COL_CITY = 10
+COL_STREET = 11
+COL_POST_CODE = 15
+COL_CLOSE_DATE = 18
+COL_LATEST = 23
+COL_EN_NAME = 24
+COL_FURIGANA = 28
+COL_HIHYOJI = 29
+
+# 法人番号公表サイトの個別ページ（判定結果の根拠URL）
+NTA_DETAIL_URL = "https://www.houjin-bangou.nta.go.jp/henkorireki-johoto.html?selHouzinNo={}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS corporations (
+    corporate_number TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    en_name TEXT NOT NULL,
+    en_name_key TEXT NOT NULL,
+    address TEXT NOT NULL,
+    address_key TEXT NOT NULL,
+    post_code TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    close_date TEXT NOT NULL
+)
+"""
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_corporations_name_key ON corporations (name_key)",
+    "CREATE INDEX IF NOT EXISTS idx_corporations_en_name_key ON corporations (en_name_key) WHERE en_name_key != ''",
+    "CREATE INDEX IF NOT EXISTS idx_corporations_address_key ON corporations (address_key)",
+)
+
+def _open_text(path: str):
+    """CSVまたはzip内のCSVを、Unicode版（UTF-8）/Shift-JIS版を判別して開く"""
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        member = next(name for name in archive.namelist() if name.lower().endswith(".csv"))
+        raw = archive.open(member)
+    else:
+        raw = open(path, "rb")
+    head = raw.peek(4096)[:4096] if hasattr(raw, "peek") else b""
+    try:
+        head.decode("utf-8")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # 先読みの末尾で文字が途切れた場合はUTF-8とみなす
+        encoding = "utf-8-sig" if e.start >= len(head) - 3 else "cp932"
+    return io.TextIOWrapper(raw, encoding=encoding, newline="")
+
+def iter_nta_rows(path: str):
+    """
+    全件データ・差分データの行を読み込む（最新でない履歴行・検索対象除外の行は除く）
+    :return: (法人番号, 法人名, 英語名, 所在地, 郵便番号, 法人種別, 登記記録の閉鎖日) のジェネレータ
+    """
+    with _open_text(path) as f:
+        for row in csv.reader(f):
+            if len(row) <= COL_HIHYOJI or row[COL_LATEST] == "0" or row[COL_HIHYOJI] == "1":
+                continue
+            address = row[COL_PREFECTURE] + row[COL_CITY] + row[COL_STREET]
+            yield (row[COL_CORPORATE_NUMBER], row[COL_NAME], row[COL_EN_NAME], address,
+                   row[COL_POST_CODE], row[COL_KIND], row[COL_CLOSE_DATE])
+
+def build_registry(paths, db_path: str, batch_size: int = 20000) -> int:
+    """
+    全件データ（および差分データ）からインデックスを構築・更新する
+    :param paths: CSV/zipファイルのリスト（差分データは日付順に指定）
+    :param db_path: SQLiteファイル
+    :return: 取り込んだ行数
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        # 取り込み中はジャーナルを書かない（失敗時は作り直す前提）
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(_SCHEMA)
+        count = 0
+        for path in paths:
+            batch = []
+            for number, name, en_name, address, post_code, kind, close_date in iter_nta_rows(path):
+                batch.append((number, name, normalize_company_name(name), en_name, normalize_company_name(en_name),
+                              address, normalize_address(address), post_code, kind, close_date))
+                if len(batch) >= batch_size:
+                    conn.executemany("INSERT OR REPLACE INTO corporations VALUES (?,?,?,?,?,?,?,?,?,?)", batch)
+                    count += len(batch)
+                    batch.clear()
+            conn.executemany("INSERT OR REPLACE INTO corporations VALUES (?,?,?,?,?,?,?,?,?,?)", batch)
+            count += len(batch)
+            conn.commit()
+            logging.info(f"法人番号データを取り込み: {path}（累計{count}件）")
+        # 索引は取り込み後にまとめて作成する（全件データの初回取り込みを速くする）
+        for statement in _INDEXES:
+            conn.execute(statement)
+        conn.commit()
+        return count
+    finally:
+        conn.close()
+
+# 配点（AI解析・スニペット判定と同じ）
+_NAME_POINTS = {FULL: 0.5, None: 0.0}
+_ADDRESS_POINTS = {EXACT: 0.25, BLOCK: 0.15, CITY: 0.15, PREFECTURE: 0.05}
+
+@dataclass
+class RegistryMatch:
+    """登記との照合結果"""
+    corporate_number: str
+    name: str
+    address: str
+    closed: bool
+    name_kind: str       # company_nameの一致種別（FULL/CORE/ALIAS/FUZZY）
+    address_level: str   # address_normalizerの一致段階（EXACT/BLOCK/CITY/PREFECTURE/None）
+    score: float
+
+    @property
+    def url(self) -> str:
+        return NTA_DETAIL_URL.format(self.corporate_number)
+
+    @property
+    def resolved(self) -> bool:
+        """法人名（法人格を含む）と所在地（番地まで）が登記と一致し、登記記録が閉鎖されていない"""
+        return self.name_kind == FULL and self.address_level == EXACT and not self.closed
+
+class CorporateRegistry:
+    """法人登記インデックスの検索（読み取り専用）"""
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: build_registryで構築したSQLiteファイル
+        """
+        self.db_path = db_path
+        self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def lookup(self, company: str, address: str, other_info=None, limit: int = 50) -> list:
+        """
+        法人名（英文社名・旧社名を含む）または所在地が一致する登記を探し、一致度の高い順に返す
+        会社名の配点はAI解析と同じ（会社名0.5/0.2、住所0.25/0.15/0.05。電話番号は公表データにないため0）
+        :param company: 申請会社名
+        :param address: 申請住所
+        :param other_info: その他情報
+        :param limit: 候補の上限件数
+        :return: RegistryMatchのリスト
+        """
+        name_matcher = CompanyNameMatcher(company, other_info)
+        address_matcher = AddressMatcher(address)
+        keys = name_matcher.names
+        if not keys and not address_matcher.normalized:
+            return []
+        # 索引を使う検索の和集合（ORで結合すると全件走査になる）
+        # 同名の法人・同じ所在地の法人が多くても法人名と所在地の両方が一致する登記を落とさないよう、
+        # 両方が一致する登記を別に探し、上限は検索ごとに適用する
+        placeholders = ",".join("?" * len(keys)) or "NULL"
+        columns = "SELECT corporate_number, name, en_name, address, close_date FROM corporations"
+        rows = self._conn.execute(
+            f"SELECT * FROM ({columns} WHERE address_key = ?"
+            f" AND (name_key IN ({placeholders}) OR en_name_key IN ({placeholders})) LIMIT ?)"
+            f" UNION SELECT * FROM ({columns} WHERE name_key IN ({placeholders}) LIMIT ?)"
+            f" UNION SELECT * FROM ({columns} WHERE en_name_key IN ({placeholders}) AND en_name_key != '' LIMIT ?)"
+            f" UNION SELECT * FROM ({columns} WHERE address_key = ? LIMIT ?)",
+            (address_matcher.normalized, *keys, *keys, limit, *keys, limit, *keys, limit,
+             address_matcher.normalized, limit)
+        ).fetchall()
+
+        matches = []
+        for number, name, en_name, registered_address, close_date in rows:
+            # 英文社名で申請された場合は登記の英語表記とも照合する
+            name_match = name_matcher.match(name) or (name_matcher.match(en_name) if en_name else None)
+            name_kind = name_match.kind if name_match else None
+            level = address_matcher.match(registered_address)
+            score = _NAME_POINTS.get(name_kind, 0.2) + _ADDRESS_POINTS.get(level, 0.0)
+            matches.append(RegistryMatch(number, name, registered_address, bool(close_date), name_kind, level, score))
+        matches.sort(key=lambda m: (m.resolved, m.score), reverse=True)
+        return matches[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description="法人番号公表データによる法人登記インデックス")
+    parser.add_argument("--db", default="corporate_registry.db", help="SQLiteファイル")
+    sub = parser.add_subparsers(dest="command", required=True)
+    importer = sub.add_parser("import", help="全件データ・差分データ（CSV/zip）を取り込む")
+    importer.add_argument("files", nargs="+")
+    finder = sub.add_parser("lookup", help="会社名・住所で登記を検索する")
+    finder.add_argument("company")
+    finder.add_argument("address", nargs="?", default="")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "import":
+        t0 = time.perf_counter()
+        count = build_registry(args.files, args.db)
+        print(f"{count}件を取り込み（{time.perf_counter() - t0:.1f}秒, {os.path.getsize(args.db) / 1024 / 1024:.1f} MiB）")
+    else:
+        with CorporateRegistry(args.db) as registry:
+            t0 = time.perf_counter()
+            matches = registry.lookup(args.company, args.address)
+            elapsed = time.perf_counter() - t0
+            for m in matches:
+                print(f"{'◎' if m.resolved else '・'} {m.score:.2f} {m.corporate_number} {m.name} {m.address}"
+                      f"{' (閉鎖)' if m.closed else ''} [{m.name_kind}/{m.address_level}]")
+            print(f"{len(matches)}件（{elapsed * 1000:.2f} ms）")
+
+if __name__ == "__main__":
+    main()
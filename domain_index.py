@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import re
+import threading
+from urllib.parse import urlparse
+from company_name import CompanyNameMatcher
+
+# 分類
+ALLOW = "allow"      # 常に取得対象（学習による降格もしない）
+DENY = "deny"        # 取得しない
+BOOST = "boost"      # 優先して取得
+NEUTRAL = "neutral"  # 通常
+
+# 既定のドメインルール（サフィックス一致。サブドメインにも適用）
+DEFAULT_DOMAIN_RULES = {
+    DENY: [
+        # 政府機関・自治体（消防計画・記載例などの無関係な文書が多い）
+        "go.jp", "lg.jp",
+        # 信用調査・企業データベース・求人・地図・SNS等の集約サイト
+        "tsr-net.co.jp", "tdb.co.jp", "baseconnect.in", "salesnow.jp", "houjin.info",
+        "indeed.com", "townwork.net", "doda.jp", "mynavi.jp", "rikunabi.com", "en-japan.com",
+        "mapion.co.jp", "navitime.co.jp", "itp.ne.jp",
+        "facebook.com", "twitter.com", "x.com", "instagram.com", "youtube.com", "linkedin.com",
+    ],
+    ALLOW: [],
+    BOOST: [
+        # 日本の法人向けドメイン（公式サイトである可能性が高い）
+        "co.jp",
+    ],
+}
+
+# 既定のURLパスルール（正規表現。ドメインルールより後に評価）
+DEFAULT_PATH_RULES = [
+    (DENY, r"\.(pdf|jpe?g|png|gif|svg|zip|xlsx?|docx?|pptx?|mp4|mp3)(\?|$)"),
+    (DENY, r"/(login|signin|cart|search)(/|\?|$)"),
+    (BOOST, r"/(company|corporate|about|profile|outline|overview|gaiyo|gaiyou|access|info)([/_\-.]|\?|$)"),
+    (BOOST, r"(会社概要|企業情報|会社案内|アクセス)"),
+]
+
+_CLASS_KEY = "$"
+
+class DomainReputationIndex:
+    """
+    ドメイン・URLパターンの評価インデックス（1ジョブにつき1インスタンス）
+    ホスト名のラベルを逆順にしたサフィックストライで allow/deny/boost を判定し、
+    過去の解析スコアから一度も閾値を超えないドメインを学習して降格（deny）する。
+    降格には別々のジョブでの実績を必要とし（1回の巡回で同じサイトの多数のページを解析しても1件）、
+    申請会社自身のドメイン（会社名・その他情報のURLと一致するもの）は降格しない
+    """
+
+    # 同一プロセス内の並行ジョブによる評価ファイルの同時更新を防ぐ
+    _lock = threading.Lock()
+
+    def __init__(self, stats_file: str = "domain_reputation.json", demote_score: float = 0.3,
+                 demote_min_samples: int = 5, domain_rules: dict = None, path_rules: list = None,
+                 application_info=None):
+        """
+        :param stats_file: ドメイン評価（過去スコア）の記録ファイル
+        :param demote_score: この値を一度も超えないドメインを降格する
+        :param demote_min_samples: 降格判定に必要なジョブ数（ドメインのページを解析したジョブの数）
+        :param domain_rules: {分類: [ドメインサフィックス]}（Noneの場合は既定ルール）
+        :param path_rules: [(分類, 正規表現)]（Noneの場合は既定ルール）
+        :param application_info: 申請情報リスト [会社名, 住所, 電話番号, その他...]（申請会社のドメインを降格しない）
+        """
+        self.stats_file = stats_file
+        self.demote_score = demote_score
+        self.demote_min_samples = demote_min_samples
+        self._trie = {}
+        for cls, suffixes in (domain_rules if domain_rules is not None else DEFAULT_DOMAIN_RULES).items():
+            for suffix in suffixes:
+                self.add_domain(suffix, cls)
+        self._path_rules = [
+            (cls, re.compile(pattern, re.IGNORECASE))
+            for cls, pattern in (path_rules if path_rules is not None else DEFAULT_PATH_RULES)
+        ]
+        self._stats = self._load_stats()
+        self._pending = {}
+        # このジョブでスコアを記録したドメイン（ジョブ数はドメインごとに1回だけ数える）
+        self._recorded = set()
+        self._applicant_names, self._applicant_domains = _applicant_keys(application_info)
+
+    def add_domain(self, suffix: str, cls: str):
+        """
+        ドメインサフィックスのルールを追加（例: "go.jp" は "www.city.example.lg.jp" 等にも一致）
+        :param suffix: ドメインサフィックス
+        :param cls: 分類（allow/deny/boost）
+        """
+        node = self._trie
+        for label in reversed(suffix.lower().strip(".").split(".")):
+            node = node.setdefault(label, {})
+        node[_CLASS_KEY] = cls
+
+    def lookup_host(self, host: str):
+        """
+        ホスト名に最も長く一致するドメインルールの分類を返す
+        :param host: ホスト名
+        :return: 分類（一致なしの場合はNone）
+        """
+        node = self._trie
+        found = None
+        for label in reversed(host.lower().strip(".").split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            found = node.get(_CLASS_KEY, found)
+        return found
+
+    @staticmethod
+    def domain_key(url: str) -> str:
+        """学習用のドメインキー（ホスト名。先頭のwww.は除去）"""
+        host = (urlparse(url).hostname or "").lower()
+        return host[4:] if host.startswith("www.") else host
+
+    def is_applicant_domain(self, key: str) -> bool:
+        """
+        申請会社自身のドメインかどうか
+        （その他情報のURLのドメイン・サブドメイン、またはラベルが英字の会社名と一致するドメイン）
+        :param key: ドメインキー（domain_key）
+        """
+        if any(key == domain or key.endswith("." + domain) for domain in self._applicant_domains):
+            return True
+        labels = [label.replace("-", "") for label in key.split(".")]
+        return any(label == name or (len(label) >= 4 and label in name) or (len(name) >= 4 and name in label)
+                   for label in labels for name in self._applicant_names)
+
+    def is_demoted(self, url: str) -> bool:
+        """過去スコアから降格されたドメインかどうか"""
+        key = self.domain_key(url)
+        entry = self._stats.get(key)
+        if not entry or self.is_applicant_domain(key):
+            return False
+        return entry.get("jobs", 0) >= self.demote_min_samples and entry.get("max_score", 0.0) <= self.demote_score
+
+    def classify(self, url: str):
+        """
+        URLを分類する（取得前に判定するため通信は行わない）
+        :param url: 判定対象URL
+        :return: (分類, 理由)
+        """
+        host = urlparse(url).hostname or ""
+        domain_cls = self.lookup_host(host)
+        if domain_cls == DENY:
+            return DENY, f"除外ドメイン: {host}"
+
+        path_cls = None
+        for cls, pattern in self._path_rules:
+            if pattern.search(url):
+                path_cls = cls
+                break
+        if path_cls == DENY:
+            return DENY, f"除外URLパターン: {url}"
+
+        if domain_cls != ALLOW and self.is_demoted(url):
+            return DENY, f"過去スコアが{self.demote_score}以下のドメイン: {host}"
+
+        if domain_cls == ALLOW:
+            return ALLOW, f"許可ドメイン: {host}"
+        if domain_cls == BOOST or path_cls == BOOST:
+            return BOOST, "優先URL"
+        return NEUTRAL, ""
+
+    def filter_urls(self, urls):
+        """
+        URLリストから除外対象を取り除き、優先URLを先頭に並べる（同分類内は元の順序を維持）
+        :param urls: URLのリスト
+        :return: 取得対象URLのリスト
+        """
+        kept = []
+        for order, url in enumerate(urls):
+            cls, reason = self.classify(url)
+            if cls == DENY:
+                logging.info(f"ドメイン評価によりスキップ: {reason}")
+                continue
+            kept.append((0 if cls in (ALLOW, BOOST) else 1, order, url))
+        kept.sort()
+        return [url for _, _, url in kept]
+
+    def filter_search_results(self, search_results: list) -> list:
+        """
+        Google検索結果から除外対象を取り除き、優先URLを先頭に並べる
+        :param search_results: google_searchの結果 [{"title", "link", "snippet"}]
+        :return: 取得対象の検索結果
+        """
+        by_link = {}
+        for item in search_results:
+            by_link.setdefault(item.get("link"), item)
+        return [by_link[link] for link in self.filter_urls([item.get("link") for item in search_results])
+                if link in by_link]
+
+    def record_score(self, url: str, score: float):
+        """
+        解析スコアを記録する（save()で評価ファイルに反映）
+        :param url: 解析したページのURL
+        :param score: 解析スコア
+        """
+        key = self.domain_key(url)
+        if not key:
+            return
+        first = key not in self._recorded
+        self._recorded.add(key)
+        for target in (self._stats, self._pending):
+            entry = target.setdefault(key, {"count": 0, "jobs": 0, "max_score": 0.0})
+            entry["count"] += 1
+            entry["jobs"] = entry.get("jobs", 0) + first
+            entry["max_score"] = max(entry["max_score"], float(score))
+
+    def _load_stats(self) -> dict:
+        """ドメイン評価データを読み込む"""
+        if self.stats_file and os.path.exists(self.stats_file):
+            try:
+                with open(self.stats_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (ValueError, IOError) as e:
+                logging.warning(f"ドメイン評価ファイルの読み込みに失敗: {e}")
+        return {}
+
+    def save(self):
+        """記録したスコアを評価ファイルにマージして書き込む"""
+        if not self._pending or not self.stats_file:
+            return
+        with self._lock:
+            stats = self._load_stats()
+            for key, pending in self._pending.items():
+                entry = stats.setdefault(key, {"count": 0, "jobs": 0, "max_score": 0.0})
+                entry["count"] += pending["count"]
+                entry["jobs"] = entry.get("jobs", 0) + pending["jobs"]
+                entry["max_score"] = max(entry["max_score"], pending["max_score"])
+            try:
+                with open(self.stats_file, "w", encoding="utf-8") as f:
+                    json.dump(stats, f, ensure_ascii=False, indent=2)
+            except IOError as e:
+                logging.error(f"ドメイン評価ファイルの書き込みに失敗: {e}")
+                return
+        self._stats = stats
+        self._pending = {}
+
+def _applicant_keys(application_info) -> tuple:
+    """
+    申請会社のドメインを判定するためのキー
+    :return: (英数字の会社名・別名のリスト, その他情報のURLのドメインキーのリスト)
+    """
+    if not application_info:
+        return [], []
+    matcher = CompanyNameMatcher(application_info[0], application_info[3:])
+    names = [name for name in (re.sub(r"[^0-9a-z]", "", name) for name in matcher.names) if len(name) >= 3]
+    domains = []
+    for entry in application_info[3:]:
+        for url in re.findall(r"https?://[^\s、，,）)]+", str(entry)):
+            key = DomainReputationIndex.domain_key(url)
+            if key:
+                domains.append(key)
+    return names, domains
+
+def build_domain_index(config, application_info=None) -> DomainReputationIndex:
+    """
+    設定からドメイン評価インデックスを生成する（追加のallow/deny/boostドメインはカンマ区切り）
+    :param config: 設定情報
+    :param application_info: 申請情報リスト（申請会社のドメインを降格しない）
+    """
+    rules = {cls: list(suffixes) for cls, suffixes in DEFAULT_DOMAIN_RULES.items()}
+    for cls, key in ((DENY, "DOMAIN_DENY_LIST"), (ALLOW, "DOMAIN_ALLOW_LIST"), (BOOST, "DOMAIN_BOOST_LIST")):
+        rules[cls].extend(d.strip() for d in (config.get(key) or "").split(",") if d.strip())
+    return DomainReputationIndex(
+        stats_file=config.get("DOMAIN_REPUTATION_FILE", "domain_reputation.json"),
+        demote_score=float(config.get("DOMAIN_DEMOTE_SCORE", 0.3)),
+        demote_min_samples=int(config.get("DOMAIN_DEMOTE_MIN_SAMPLES", 5)),
+        domain_rules=rules,
+        application_info=application_info
+    )
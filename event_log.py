@@ -0,0 +1,145 @@
+import atexit
+import contextvars
+import json
+import logging
+import sys
+import threading
+from datetime import datetime, timezone
+
+# 生のLLM応答など大きなペイロード用のログレベル（DEBUGより詳細。LOG_LEVEL=PAYLOADで出力）
+PAYLOAD = 5
+logging.addLevelName(PAYLOAD, "PAYLOAD")
+
+# 実行中ジョブの相関ID（ジョブを処理するスレッド・コンテキストごとに保持）
+current_job_id = contextvars.ContextVar("current_job_id", default=None)
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+class JobIdFilter(logging.Filter):
+    """ログレコードに実行中ジョブの相関ID（job_id）を付与する"""
+
+    def filter(self, record):
+        if not hasattr(record, "job_id"):
+            record.job_id = current_job_id.get() or "-"
+        return True
+
+class JsonLineFormatter(logging.Formatter):
+    """ログレコードを1行1イベントのJSON（JSONL）に整形する"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "job_id": getattr(record, "job_id", "-"),
+            "event": getattr(record, "event", None),
+            "msg": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data:
+            entry["data"] = data
+        exc = getattr(record, "exc", None)
+        if exc is None and record.exc_info:
+            exc = self.formatException(record.exc_info)
+        if exc:
+            entry["exc"] = exc
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _QueueRecordFormatter(logging.Formatter):
+    """
+    キューに積む前の整形（QueueHandler.prepareがmsgに使う）
+    prepareはexc_infoを破棄するため、例外のトレースバックはmsgに連結せず文字列としてexc属性に残す
+    """
+
+    def format(self, record):
+        if record.exc_info and getattr(record, "exc", None) is None:
+            record.exc = self.formatException(record.exc_info)
+        return record.getMessage()
+
+class _ConsoleFormatter(logging.Formatter):
+    """コンソール向けの可読形式（構造化フィールドは付与しない）"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(job_id)s] %(message)s", "%H:%M:%S")
+
+    def format(self, record):
+        text = super().format(record)
+        exc = getattr(record, "exc", None)
+        return f"{text}\n{exc}" if exc else text
+
+def setup_event_logger(log_level: str = "INFO", log_file: str = "app.jsonl", max_bytes: int = 10 * 1024 * 1024,
+                       backup_count: int = 5, console: bool = True) -> logging.Logger:
+    """
+    キュー経由の非同期構造化ログ（JSONL・サイズローテーション）を初期化する
+    ログ出力元はキューに積むだけでディスク書き込みを待たない。2回目以降の呼び出しではハンドラを再構築せず、
+    ログレベルのみ更新する
+    :param log_level: ログレベル（DEBUG/INFO/.../PAYLOAD）
+    :param log_file: JSONLログファイル名
+    :param max_bytes: ローテーションするファイルサイズ（バイト）
+    :param backup_count: 保持する世代数
+    :param console: コンソールにも可読形式で出力するか
+    :return: ルートロガー
+    """
+    global _listener, _queue_handler
+    # logging.handlersはsocket/pickle等を読み込むため、ログ初期化時にimport
+    import logging.handlers
+    import queue
+    level_name = str(log_level).upper()
+    level = PAYLOAD if level_name == "PAYLOAD" else getattr(logging, level_name, logging.INFO)
+    logger = logging.getLogger()
+
+    with _setup_lock:
+        if _listener is None:
+            handlers = []
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            file_handler.setFormatter(JsonLineFormatter())
+            handlers.append(file_handler)
+            if console:
+                console_handler = logging.StreamHandler(sys.stdout)
+                console_handler.setFormatter(_ConsoleFormatter())
+                console_handler.setLevel(max(level, logging.DEBUG))
+                handlers.append(console_handler)
+
+            log_queue = queue.SimpleQueue()
+            _queue_handler = logging.handlers.QueueHandler(log_queue)
+            _queue_handler.setFormatter(_QueueRecordFormatter())
+            _queue_handler.addFilter(JobIdFilter())
+            _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+            _listener.start()
+            atexit.register(shutdown_event_logger)
+
+            # 既存ハンドラ（basicConfig等）と重複しないようキューハンドラのみにする
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            logger.addHandler(_queue_handler)
+
+        logger.setLevel(level)
+    return logger
+
+def shutdown_event_logger():
+    """キューに残ったログを書き出してリスナーを停止する"""
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            logging.getLogger().removeHandler(_queue_handler)
+            _listener = None
+            _queue_handler = None
+
+def log_event(logger, event: str, message: str, level: int = logging.INFO, **data):
+    """
+    構造化イベントを1件記録する（無効なレベルの場合は何もしない）
+    :param logger: ロガー
+    :param event: イベント名（例: "search.done", "page.scored"）
+    :param message: 可読メッセージ
+    :param level: ログレベル
+    :param data: JSONLに出力する構造化フィールド
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"event": event, "data": data})
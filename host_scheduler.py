@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from event_log import log_event
+
+# サーバー側の過負荷を示すステータス（間隔を広げ、同時接続数を減らす）
+BACKOFF_STATUS = (429, 503)
+
+class _HostState:
+    """ホストごとのアクセス制御の状態"""
+    __slots__ = ("next_allowed", "interval", "crawl_delay", "limit", "in_flight", "base_latency", "latency")
+
+    def __init__(self, interval: float):
+        self.next_allowed = 0.0
+        self.interval = interval
+        self.crawl_delay = 0.0
+        self.limit = 1.0
+        self.in_flight = 0
+        self.base_latency = None  # 観測した最小の応答時間
+        self.latency = None       # 応答時間の指数移動平均
+
+class Ticket:
+    """1リクエスト分のアクセス枠（呼び出し側が応答のステータスを設定する）"""
+    __slots__ = ("host", "started", "status", "retry_after")
+
+    def __init__(self, host: str):
+        self.host = host
+        self.started = time.monotonic()
+        self.status = None
+        self.retry_after = None
+
+    def observe(self, response):
+        """応答のステータスとRetry-After（秒数指定のみ）を記録する"""
+        self.status = response.status_code
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.strip().isdigit():
+            self.retry_after = float(retry_after)
+
+class HostScheduler:
+    """
+    ホストごとのアクセス間隔・同時接続数の制御（プロセス内で共有）
+    ・ホストごとに次にアクセスしてよい時刻を持ち、別ホストへのアクセスは待たせない
+    ・robots.txtのCrawl-delayがあれば、その間隔以上・同時接続1で取得する
+    ・同時接続数と間隔をAIMDで調整する
+      成功：同時接続数を1/limitずつ増やし（上限max_concurrency）、広げた間隔を少しずつ最小間隔まで戻す
+      429/503・接続エラー：同時接続数を半分、間隔を2倍（Retry-Afterがあればそれ以上待つ）
+      応答時間が最小値のslow_factor倍を超えた場合：同時接続数を半分にする
+    """
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 60.0, max_concurrency: int = 4,
+                 slow_factor: float = 3.0):
+        """
+        :param min_interval: 同一ホストへのアクセス間隔の最小値（秒）
+        :param max_interval: バックオフ時の間隔の上限（秒）
+        :param max_concurrency: 同一ホストへの同時接続数の上限
+        :param slow_factor: 混雑とみなす応答時間（最小応答時間に対する倍率）
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_concurrency = max_concurrency
+        self.slow_factor = slow_factor
+        self._hosts = {}
+        self._cond = threading.Condition()
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.min_interval)
+        return state
+
+    def _floor(self, state: _HostState, min_interval: float = None) -> float:
+        return max(self.min_interval if min_interval is None else min_interval, state.crawl_delay)
+
+    def set_crawl_delay(self, host: str, delay: float):
+        """robots.txtのCrawl-delayを設定する（Noneや0は指定なし）"""
+        with self._cond:
+            state = self._state(host)
+            state.crawl_delay = float(delay or 0.0)
+            state.interval = max(state.interval, state.crawl_delay)
+        if delay:
+            logging.info(f"Crawl-delay {delay}秒を適用: {host}")
+
+    def _wait_time(self, state: _HostState, now: float) -> float:
+        """アクセスできるまでの待ち時間（同時接続数の上限に達している場合はNone）"""
+        # Crawl-delayが指定されたホストには同時に1接続まで
+        limit = 1 if state.crawl_delay else int(state.limit)
+        if state.in_flight >= limit:
+            return None
+        return max(0.0, state.next_allowed - now)
+
+    def acquire(self, host: str, job=None, min_interval: float = None) -> Ticket:
+        """
+        ホストへのアクセス枠を取得する（間隔・同時接続数の制約を満たすまで待機）
+        :param host: ホスト名（netloc）
+        :param job: ジョブコンテキスト（キャンセル・期限切れの場合は待機を打ち切って例外）
+        :param min_interval: このアクセスの最小間隔（Noneの場合はスケジューラの既定値）
+        """
+        deadline = job.deadline if job is not None else None
+        with self._cond:
+            while True:
+                if deadline is not None:
+                    deadline.check()
+                state = self._state(host)
+                now = time.monotonic()
+                wait = self._wait_time(state, now)
+                if wait == 0.0:
+                    interval = max(state.interval, self._floor(state, min_interval))
+                    state.next_allowed = now + interval
+                    state.in_flight += 1
+                    return Ticket(host)
+                # 解放の通知か次のアクセス可能時刻まで待つ（キャンセル確認のため最大0.5秒ごとに起きる）
+                timeout = 0.5 if wait is None else min(wait, 0.5)
+                if deadline is not None and deadline.remaining() is not None:
+                    timeout = min(timeout, max(deadline.remaining(), 0.01))
+                self._cond.wait(timeout)
+
+    def release(self, ticket: Ticket, error: bool = False, min_interval: float = None):
+        """
+        アクセス枠を返し、結果に応じて間隔・同時接続数を調整する
+        :param error: 接続エラー・タイムアウトの場合True
+        """
+        now = time.monotonic()
+        latency = now - ticket.started
+        with self._cond:
+            state = self._state(ticket.host)
+            state.in_flight = max(0, state.in_flight - 1)
+            floor = self._floor(state, min_interval)
+            if error or ticket.status in BACKOFF_STATUS:
+                # 乗算的減少：同時接続数を半分、間隔を2倍
+                state.limit = max(1.0, state.limit / 2)
+                state.interval = min(self.max_interval, max(state.interval, floor) * 2)
+                backoff_until = now + max(state.interval, ticket.retry_after or 0.0)
+                state.next_allowed = max(state.next_allowed, backoff_until)
+                log_event(logging.getLogger(), "host.backoff",
+                          f"アクセス間隔を拡大: {ticket.host} 間隔={state.interval:.1f}秒 同時接続={int(state.limit)}"
+                          f"（{'接続エラー' if error else ticket.status}）",
+                          host=ticket.host, status=ticket.status, interval=state.interval, limit=state.limit,
+                          retry_after=ticket.retry_after)
+            elif ticket.status is not None and ticket.status < 500:
+                state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+                state.base_latency = latency if state.base_latency is None else min(state.base_latency, latency)
+                if state.latency > state.base_latency * self.slow_factor and state.latency > 0.5:
+                    # 応答が遅くなっている：同時接続数のみ半分にする
+                    state.limit = max(1.0, state.limit / 2)
+                else:
+                    # 加算的増加：同時接続数を1往復ごとに+1、間隔は最小値に向けて1割ずつ戻す
+                    state.limit = min(float(self.max_concurrency), state.limit + 1.0 / state.limit)
+                    state.interval = max(floor, state.interval * 0.9)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, host: str, job=None, min_interval: float = None):
+        """
+        acquire/releaseのコンテキストマネージャ（例外時は接続エラーとして扱う。ジョブの打ち切りは除く）
+        使い方: with scheduler.slot(host, job) as ticket: res = http_request(...); ticket.observe(res)
+        """
+        from utils import JobInterruptedException
+        ticket = self.acquire(host, job=job, min_interval=min_interval)
+        error = False
+        try:
+            yield ticket
+        except JobInterruptedException:
+            raise
+        except Exception:
+            error = ticket.status is None
+            raise
+        finally:
+            self.release(ticket, error=error, min_interval=min_interval)
+
+    def snapshot(self) -> dict:
+        """ホストごとの現在の間隔・同時接続数（ログ・デバッグ用）"""
+        with self._cond:
+            return {host: {"interval": s.interval, "limit": s.limit, "in_flight": s.in_flight,
+                           "crawl_delay": s.crawl_delay, "latency": s.latency}
+                    for host, s in self._hosts.items()}
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_host_scheduler(config=None) -> HostScheduler:
+    """
+    プロセス内で共有するHostScheduler（初回のみ設定から生成）
+    :param config: 設定情報（Noneの場合はload_config()）
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            if config is None:
+                from config import load_config
+                config = load_config()
+            _scheduler = HostScheduler(
+                min_interval=float(config.get("SCRAPER_INTERVAL", 1.0)),
+                max_interval=float(config.get("HOST_MAX_INTERVAL", 60.0)),
+                max_concurrency=int(config.get("HOST_MAX_CONCURRENCY", 4)),
+                slow_factor=float(config.get("HOST_SLOW_FACTOR", 3.0))
+            )
+        return _scheduler
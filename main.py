@@ -7,30 +7,42 @@
 関連性の低いコンテンツの事前フィルタリング機能を追加
 """
 
-import os
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
-from dotenv import load_dotenv
 from config import load_config
 from utils import (
     setup_logger, 
     write_result_json, 
     write_result_markdown, 
     get_current_api_usage,
-    enhanced_check_api_limit,
     check_api_usage_warning,
-    reset_early_termination,
-    set_early_termination,
-    check_early_termination,
-    standardize_output_format
+    standardize_output_format,
+    JobContext,
+    JobInterruptedException,
+    EarlyTerminationException,
+    TimeoutException,
+    QuotaExhaustedError
 )
 import argparse
 from analyzer import ai_generate_query
-from search import google_search
-from scraper import scrape_page, scrape_recursive
-import sys
-import logging
+from query_planner import QueryPlanner, LLM_TEMPLATE_ID
+from domain_index import build_domain_index
+from triage import SnippetTriage, ACCEPT, FETCH, CRAWL
+from address_normalizer import get_default_index
+from event_log import log_event
+from profiler import profile_job, should_profile
+from result_store import get_result_store
+from search import google_search, google_search_concurrent, merge_search_results, concurrent_query_allowance
+from scraper import iter_scrape_recursive
+from host_scheduler import get_host_scheduler
+from quota_scheduler import get_quota_scheduler, REGISTRY_ONLY
+from stopping import (
+    build_stopping_policy, STOP_THRESHOLD, STOP_REGISTRY, STOP_QUOTA, STOP_LOW_PROBABILITY, STOP_TIMED_OUT,
+    STOP_EXHAUSTED
+)
+import os
 import time
+from urllib.parse import urlparse
 
 @dataclass
 class TestCompanyInfo:
@@ -39,6 +51,7 @@ class TestCompanyInfo:
     address: str  # 住所
     tel: str      # 電話番号
     other: Optional[List[str]] = None  # その他情報（旧社名、支店名など）
+    priority: int = 0  # 優先度（API使用枠が少ない場合は優先度の高いジョブから検索する）
     
     def __post_init__(self):
         """初期化後処理：otherがNoneの場合は空リストに設定"""
@@ -51,32 +64,43 @@ def parse_args():
     parser.add_argument('--address', type=str, required=True, help='住所')
     parser.add_argument('--tel', type=str, required=True, help='電話番号')
     parser.add_argument('--other', nargs='*', default=[], help='その他情報（旧社名、支店名など）')
+    parser.add_argument('--priority', type=int, default=0, help='優先度（API使用枠が少ない場合は優先度の高いジョブから検索）')
+    parser.add_argument('--profile', action='store_true', help='処理段階ごとのプロファイルを出力')
     return parser.parse_args()
 
-def process_single_page(application_info, scraped_result, config, search_rank, page_rank, logger):
-    """単一ページのAI解析処理（早期終了チェック付き）"""
+def record_page_result(job, analysis_result):
+    """解析結果（ページ・スニペット・登記・サイト単位）を判定結果ストアに追記する"""
+    store = get_result_store(job.config)
+    if store is not None:
+        store.record_page(job.job_id, analysis_result)
+
+def process_single_page(application_info, scraped_result, job, search_rank, page_rank, domain_index=None,
+                        triage_score=None):
+    """単一ページのAI解析処理（ジョブ単位の早期終了チェック付き、スコアはドメイン評価に記録）"""
+    config = job.config
+    logger = job.logger
     # 早期終了フラグチェック
-    if check_early_termination():
+    if job.check_early_termination():
         logger.info(f"[{search_rank}-{page_rank}] 早期終了フラグにより処理スキップ")
         return None
     
     # コンテンツの関連性事前チェック
     title = scraped_result.get('title', '')
     url = scraped_result.get('url', '')
-    company_name = application_info[0] if len(application_info) > 0 else ""
 
     
-    print(f"[{search_rank}-{page_rank}] AI解析開始: {title[:50]}...")
     logger.info(f"[{search_rank}-{page_rank}] AI解析開始: {url}")
     
     try:
-        print(f"ollama model: {config['OLLAMA_MODEL']}")
+        logger.debug(f"ollama model: {config['OLLAMA_MODEL']}")
         from analyzer import ai_analyze_content
+        started = time.perf_counter()
         analysis_result = ai_analyze_content(
             application_info,
             scraped_result,
             config["OLLAMA_API_URL"],
-            config["OLLAMA_MODEL"]
+            config["OLLAMA_MODEL"],
+            job=job
         )
         
         # 解析結果を追加
@@ -85,78 +109,287 @@ def process_single_page(application_info, scraped_result, config, search_rank, p
             "page_rank": page_rank,
             "url": url,
             "title": title,
-            "scraped_content_length": len(scraped_result.get('content', ''))
+            "scraped_content_length": scraped_result.content_length,
+            "analysis_ms": round((time.perf_counter() - started) * 1000, 1),
+            "triage_score": triage_score
         })
+        record_page_result(job, analysis_result)
         score = analysis_result.get("score", 0.0)
         reasoning = analysis_result.get('reasoning', '')
-        print(f"[{search_rank}-{page_rank}] AI解析完了: スコア={score:.3f}, 判定理由={reasoning}")
-        logger.info(f"[{search_rank}-{page_rank}] AI解析結果: スコア={score:.3f}")
+        if domain_index is not None:
+            domain_index.record_score(url, score)
+        log_event(logger, "page.scored", f"[{search_rank}-{page_rank}] AI解析結果: スコア={score:.3f}, 判定理由={reasoning}",
+                  url=url, score=score, search_rank=search_rank, page_rank=page_rank)
         
         return analysis_result
         
+    except JobInterruptedException:
+        raise
     except Exception as e:
         logger.error(f"[{search_rank}-{page_rank}] AI解析エラー: {e}")
         return None
 
-def main_fixed(test_company_info: Optional[TestCompanyInfo] = None) -> Dict[str, Any]:
-    """効率化版メイン処理（早期終了問題を解決 + 事前フィルタリング機能）"""
-    # 環境変数を明示的にクリア（キャッシュ回避）
-    if 'OLLAMA_API_URL' in os.environ:
-        del os.environ['OLLAMA_API_URL']
-    
-    load_dotenv()
+def process_site(application_info, retriever, job, search_rank, site_url, domain_index=None, triage_score=None):
+    """サイト単位のAI解析（巡回した全ページから申請情報に関連の深い断片を選び、1回のAI解析で判定する）"""
+    config = job.config
+    logger = job.logger
+    if job.check_early_termination():
+        logger.info(f"[{search_rank}] 早期終了フラグによりサイト解析をスキップ")
+        return None
+
+    chunks = retriever.top_chunks()
+    if not chunks:
+        logger.info(f"[{search_rank}] 解析対象の本文なし: {site_url}")
+        return None
+    evidence_urls = list(dict.fromkeys(chunk.url for chunk in chunks))
+    site_content = {
+        "title": f"サイト内の関連箇所（{len(retriever.urls)}ページ中{len(evidence_urls)}ページ）",
+        "url": site_url,
+        "content": retriever.build_context(chunks)
+    }
+    logger.info(f"[{search_rank}] サイト単位AI解析開始: {site_url}"
+                f"（{len(retriever.urls)}ページ・{len(retriever.chunks)}断片から{len(chunks)}断片）")
+
+    try:
+        from analyzer import ai_analyze_content
+        started = time.perf_counter()
+        analysis_result = ai_analyze_content(
+            application_info,
+            site_content,
+            config["OLLAMA_API_URL"],
+            config["OLLAMA_MODEL"],
+            job=job,
+            max_content_chars=None
+        )
+        # 最も関連の深い断片のページを根拠URLとする
+        analysis_result.update({
+            "search_rank": search_rank,
+            "page_rank": 0,
+            "url": chunks[0].url,
+            "title": chunks[0].title,
+            "evidence": "site",
+            "evidence_urls": evidence_urls,
+            "scraped_content_length": len(site_content["content"]),
+            "analysis_ms": round((time.perf_counter() - started) * 1000, 1),
+            "triage_score": triage_score
+        })
+        record_page_result(job, analysis_result)
+        score = analysis_result.get("score", 0.0)
+        if domain_index is not None:
+            domain_index.record_score(site_url, score)
+        log_event(logger, "site.scored", f"[{search_rank}] サイト単位AI解析結果: スコア={score:.3f}, 判定理由={analysis_result.get('reasoning', '')}",
+                  url=site_url, score=score, search_rank=search_rank, pages=len(retriever.urls),
+                  chunks=len(retriever.chunks), evidence_urls=evidence_urls)
+        return analysis_result
+
+    except JobInterruptedException:
+        raise
+    except Exception as e:
+        logger.error(f"[{search_rank}] サイト単位AI解析エラー: {e}")
+        return None
+
+def build_site_retriever_factory(config, job, address_index=None):
+    """
+    サイト単位解析（ANALYSIS_MODE=site）で検索結果ごとにSiteRetrieverを作る関数を返す
+    :return: (application_infoを受け取りSiteRetrieverを返す関数, 埋め込みキャッシュ（終了時にclose）)
+    """
+    from retrieval import SiteRetriever, OllamaEmbedder, EmbeddingCache
+
+    embedder = None
+    cache = None
+    embed_model = config.get("OLLAMA_EMBED_MODEL", "")
+    if embed_model:
+        embed_url = config.get("OLLAMA_EMBED_URL", "") or str(config.get("OLLAMA_API_URL") or "").replace("/api/chat", "/api/embed")
+        if config.get("EMBEDDING_CACHE_ENABLED", True):
+            cache = EmbeddingCache(config.get("EMBEDDING_CACHE_FILE", "embedding_cache.db"))
+        embedder = OllamaEmbedder(embed_url, embed_model, cache=cache, job=job)
+    top_k = int(config.get("RETRIEVAL_TOP_K", 8))
+    chunk_chars = int(config.get("RETRIEVAL_CHUNK_CHARS", 400))
+
+    def factory(application_info):
+        return SiteRetriever(application_info, embedder, top_k=top_k, chunk_chars=chunk_chars,
+                             address_index=address_index)
+    return factory, cache
+
+def _split_query_batches(queries, config, concurrent):
+    """
+    クエリを検索単位（バッチ）に分割する
+    並行発行時も、同時に発行するのは日次クォータに余裕がある件数まで（残りは後続のバッチに回す）
+    """
+    queries = list(queries)
+    while queries:
+        size = concurrent_query_allowance(len(queries), config) if concurrent else 1
+        yield queries[:size]
+        queries = queries[size:]
+
+def iter_query_batches(application_info, planner, job, max_queries, concurrent=False):
+    """
+    実績順のテンプレートクエリを検索単位（バッチ）で返し、すべて不発だった場合のみLLMで追加クエリを生成する
+    concurrent=Trueの場合は計画済みクエリを1バッチにまとめて並行発行し、Falseの場合は1クエリずつ返す
+    （呼び出し側が高スコア検出でループを抜けた場合、LLMは呼び出されない）
+    :return: [(テンプレートID, クエリ)] のイテレータ
+    """
+    config = job.config
+    logger = job.logger
+    planned = planner.plan(application_info, max_queries)
+    logger.info(f"計画済み検索クエリリスト: {planned}")
+    yield from _split_query_batches(planned, config, concurrent)
+
+    remaining = max_queries - len(planned)
+    if remaining <= 0:
+        return
+
+    # テンプレートで見つからなかった場合のみ、残りのクエリ枠をLLMの提案で補う
+    try:
+        llm_queries = ai_generate_query(
+            application_info,
+            config["OLLAMA_API_URL"],
+            config["OLLAMA_MODEL"],
+            max_queries=remaining,
+            job=job,
+            include_templates=False
+        )
+    except JobInterruptedException:
+        raise
+    except Exception as e:
+        logger.error(f"AIによる追加検索クエリ生成に失敗: {e}", exc_info=True)
+        return
+
+    planned_queries = {query for _, query in planned}
+    llm_queries = [query for query in llm_queries if query not in planned_queries]
+    logger.info(f"AI生成追加検索クエリリスト: {llm_queries}")
+    yield from _split_query_batches([(LLM_TEMPLATE_ID, query) for query in llm_queries], config, concurrent)
+
+def lookup_registry(application_info, config, logger):
+    """
+    法人番号公表データのインデックス（REGISTRY_DB）で申請の法人名・所在地を照合する
+    :param application_info: 申請情報リスト [会社名, 住所, 電話番号, その他...]
+    :return: (判定結果に加える照合結果のリスト, Web検索が不要か)
+    """
+    db_path = config.get("REGISTRY_DB", "")
+    if not db_path:
+        return [], False
+    if not os.path.exists(db_path):
+        logger.warning(f"法人登記インデックスが見つかりません: {db_path}")
+        return [], False
+    from corporate_registry import CorporateRegistry
+    from company_name import FULL
+    from address_normalizer import EXACT, PREFECTURE
+
+    t0 = time.perf_counter()
+    with CorporateRegistry(db_path) as registry:
+        matches = registry.lookup(application_info[0], application_info[1], application_info[3:])
+    matches = [m for m in matches if m.name_kind is not None]
+    if not matches:
+        log_event(logger, "registry.miss", "法人登記に一致する法人なし（Web検索で確認）",
+                  elapsed_ms=round((time.perf_counter() - t0) * 1000, 3))
+        return [], False
+
+    best = matches[0]
+    matched = ["会社名" if best.name_kind == FULL else "会社名(部分)"]
+    if best.address_level == EXACT:
+        matched.append("住所")
+    elif best.address_level == PREFECTURE:
+        matched.append("住所(都道府県)")
+    elif best.address_level is not None:
+        matched.append("住所(市区町村)")
+    reason = f"法人番号{best.corporate_number}: {best.name} {best.address}"
+    if best.closed:
+        reason += "（登記記録閉鎖）"
+    result = {
+        "score": best.score,
+        "reasoning": f"法人登記と照合（{reason}。電話番号は公表データに含まれないため未確認）",
+        "matched_info": matched,
+        "confidence": best.score,
+        "search_rank": 0,
+        "page_rank": 0,
+        "url": best.url,
+        "title": best.name,
+        "evidence": "registry",
+        "scraped_content_length": 0
+    }
+    resolved = best.resolved and bool(config.get("REGISTRY_SKIP_WEB_SEARCH", True))
+    log_event(logger, "registry.hit" if resolved else "registry.partial",
+              f"法人登記と照合: {reason} 会社名={best.name_kind} 住所={best.address_level}"
+              + ("（Web検索を省略）" if resolved else "（Web検索で確認）"),
+              corporate_number=best.corporate_number, name_kind=best.name_kind, address_level=best.address_level,
+              closed=best.closed, resolved=resolved, elapsed_ms=round((time.perf_counter() - t0) * 1000, 3))
+    return [result], resolved
+
+def lookup_cached_verdict(application_info, config):
+    """
+    判定結果ストアから同じ申請情報で実在を確認できた直近の判定を探す（API使用枠がない場合の代替）
+    :param application_info: 申請情報リスト [会社名, 住所, 電話番号, その他...]
+    :return: 判定結果に加える結果のリスト（該当なしの場合は空）
+    """
+    store = get_result_store(config)
+    if store is None:
+        return []
+    max_age = float(config.get("QUOTA_CACHE_MAX_AGE_DAYS", 30)) * 86400
+    cached = store.latest_verdict(
+        application_info[0], application_info[1], application_info[2], since=time.time() - max_age)
+    if cached is None:
+        return []
+    finished = time.strftime("%Y-%m-%d", time.localtime(cached["finished_at"]))
+    return [{
+        "score": item.get("score", 0.0),
+        "reasoning": f"過去の判定（{finished}、ジョブ{cached['job_id']}）: {item.get('reason', '')}",
+        "search_rank": 0,
+        "page_rank": 0,
+        "url": item.get("url"),
+        "evidence": "cache",
+        "scraped_content_length": 0
+    } for item in cached["result"].get("results", [])]
+
+def main_fixed(test_company_info: Optional[TestCompanyInfo] = None, profile: bool = False,
+               can_defer: bool = False) -> Dict[str, Any]:
+    """
+    効率化版メイン処理（早期終了問題を解決 + 事前フィルタリング機能）
+    :param test_company_info: テスト用企業情報（Noneの場合はコマンドライン引数）
+    :param profile: Trueの場合は処理段階ごとのプロファイルを出力（PROFILE_SAMPLE_RATEの割合でも自動的に有効）
+    :param can_defer: 後で実行できる場合True（一括処理のワーカー）。検索中に日次上限に達した場合、
+                      法人登記・過去の判定のみで判定せずにQuotaExhaustedErrorを送出する
+    """
+    # 設定は初回のみ.envを解析し、以降は同じConfigを再利用する
     config = load_config()
     
     # 新しいロガー設定を適用
     logger = setup_logger(
         log_level=config.get('LOG_LEVEL', 'INFO'),
-        log_file=config.get('LOG_FILE', 'app.log')
+        log_file=config.get('LOG_FILE', 'app.jsonl'),
+        max_bytes=int(config.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backup_count=int(config.get('LOG_BACKUP_COUNT', 5)),
+        console=config.get('LOG_CONSOLE', True)
     )
     
-    logger.info("=" * 60)
-    logger.info("取引先申請情報確認システム 開始")
-    logger.info("=" * 60)
-    
-    # 早期終了フラグをリセット
-    reset_early_termination()
+    # ジョブ単位のコンテキスト（早期終了シグナル・処理時間上限・ログの相関ID）を生成し、各処理に引き回す
+    with JobContext(config, logger) as job:
+        log_event(logger, "job.start", "取引先申請情報確認システム 開始", job_id=job.job_id)
+        with profile_job(job, should_profile(config, profile)):
+            return _run_verification(test_company_info, job, can_defer)
+
+def _run_verification(test_company_info, job, can_defer=False):
+    """検証処理本体（ジョブ単位の早期終了・処理時間上限付き）"""
+    config = job.config
+    logger = job.logger
     
     # 設定値の取得
     max_queries = int(config.get("MAX_GOOGLE_SEARCH", 3))
     num_results = int(config.get("GOOGLE_SEARCH_NUM_RESULTS", 3))
     max_scrape_depth = int(config.get("MAX_SCRAPE_DEPTH", 3))
+    max_crawl_pages = int(config.get("MAX_CRAWL_PAGES", 100)) or None
+    compress_page_body = bool(config.get("PAGE_BODY_COMPRESSION", False))
     score_threshold = float(config.get("SCORE_THRESHOLD", 0.95))
+    prefetch_results = int(config.get("PREFETCH_RESULTS", 0))
+    concurrent_queries = bool(config.get("CONCURRENT_QUERIES", False))
 
-    # API使用状況を確認
-    current_usage = get_current_api_usage()
-    daily_limit = int(config.get('GOOGLE_API_DAILY_LIMIT', '100'))
-    warning_level = check_api_usage_warning(current_usage, daily_limit, config)
-    
-    logger.info(f"本日のGoogle Search API使用状況: {current_usage}/{daily_limit}")
-    
-    # 警告レベルに応じたメッセージ表示
-    if warning_level == 2:
-        print(f"⚠️  危険: API使用量が危険レベルです ({current_usage}/{daily_limit})")
-        logger.warning(f"API使用量が危険レベル: {current_usage}/{daily_limit}")
-    elif warning_level == 1:
-        print(f"⚠️  警告: API使用量が警告レベルです ({current_usage}/{daily_limit})")
-        logger.warning(f"API使用量が警告レベル: {current_usage}/{daily_limit}")
-    
-    # 強化されたAPI制限チェック
-    can_execute, error_msg, wait_time = enhanced_check_api_limit(required_calls=max_queries, config=config)
-    if not can_execute:
-        print(f"❌ API制限エラー: {error_msg}")
-        logger.error(f"API制限により実行停止: {error_msg}")
-        sys.exit(1)
-    
-    if wait_time > 0:
-        print(f"⏱️  レート制限により{wait_time:.1f}秒待機します...")
-        time.sleep(wait_time)
-      # 企業情報の取得
+    # 企業情報の取得
     if test_company_info:
         company = test_company_info.company
         address = test_company_info.address
         tel = test_company_info.tel
         other = test_company_info.other or []
+        priority = test_company_info.priority
         logger.info("テストモードで実行中")
     else:
         args = parse_args()
@@ -164,201 +397,434 @@ def main_fixed(test_company_info: Optional[TestCompanyInfo] = None) -> Dict[str,
         address = args.address
         tel = args.tel
         other = args.other
+        priority = args.priority
         logger.info("コマンドラインモードで実行中")
     
     logger.info(f"受け取った申請情報: 会社名={company}, 住所={address}, 電話番号={tel}, その他={other}")
     application_info = [company, address, tel] + other
+
+    # 外部HTTP通信の記録・再生（CASSETTE_MODE=record/replay。同じ申請情報の通信を同じカセットに保存する）
+    if config.get("CASSETTE_MODE"):
+        from cassette import open_cassette
+        cassette = open_cassette(config, application_info)
+        if cassette is not None:
+            job.deadline.use_cassette(cassette)
+
+    # 判定結果ストアにジョブの開始を記録（以降、解析結果はその都度追記する）
+    result_store = get_result_store(config)
+    if result_store is not None:
+        result_store.begin_job(job.job_id, company, address, tel, other)
+
+    # 法人登記インデックスで法人名・所在地を確認（一致すればGoogle検索・スクレイピングを行わない）
+    registry_results, registry_resolved = lookup_registry(application_info, config, logger)
+    for registry_result in registry_results:
+        record_page_result(job, registry_result)
+
+    # API使用枠が少ない場合は検索を行わず、法人登記・過去の判定のみで確認する（レート制限の待機は検索ごとに行う）
+    quota_limited = False
+    cached_results = []
+    if not registry_resolved:
+        # API使用状況を確認
+        current_usage = get_current_api_usage()
+        daily_limit = int(config.get('GOOGLE_API_DAILY_LIMIT', '100'))
+        warning_level = check_api_usage_warning(current_usage, daily_limit, config)
+    
+        logger.info(f"本日のGoogle Search API使用状況: {current_usage}/{daily_limit}")
     
-    print("受け取った申請情報:")
-    print(f"会社名: {company}")
-    print(f"住所: {address}")
-    print(f"電話番号: {tel}")
-    print(f"その他: {other}")
-    print(f"本日のAPI使用状況: {current_usage}/{daily_limit}")
+        # 警告レベルに応じたメッセージ表示
+        if warning_level == 2:
+            logger.warning(f"API使用量が危険レベル: {current_usage}/{daily_limit}")
+        elif warning_level == 1:
+            logger.warning(f"API使用量が警告レベル: {current_usage}/{daily_limit}")
+    
+        decision = get_quota_scheduler(config).decide(current_usage, priority)
+        if decision.mode == REGISTRY_ONLY:
+            quota_limited = True
+            cached_results = lookup_cached_verdict(application_info, config)
+        else:
+            max_queries = decision.max_queries
+        log_event(logger, "quota.decision",
+                  f"API使用枠による実行方法: {decision.mode}" + (f"（{decision.reason}）" if decision.reason else ""),
+                  mode=decision.mode, reason=decision.reason, usage=current_usage, daily_limit=daily_limit,
+                  expected_cost=round(decision.expected_cost, 2), max_queries=decision.max_queries,
+                  priority=priority, cached=bool(cached_results))
     
     # 全結果を蓄積するためのグローバル変数
-    all_query_results = []
+    all_query_results = list(registry_results) + cached_results
     total_searched_urls = 0
     overall_found_match = False
-    
-    # AIによる検索クエリ生成
-    try:
-        queries = ai_generate_query(
+    timed_out = False
+
+    # 検索クエリの計画（テンプレートを実績順に使用し、LLMは不発時のみ）
+    planner = QueryPlanner(
+        stats_file=config.get("QUERY_PLANNER_STATS_FILE", "query_planner_stats.json"),
+        min_trials=int(config.get("QUERY_PLANNER_MIN_TRIALS", 5)),
+        min_success_rate=float(config.get("QUERY_PLANNER_MIN_SUCCESS_RATE", 0.05))
+    )
+    completed_templates = []
+    winning_template = None
+
+    # ドメイン評価インデックス（無関係サイトは取得前に除外）
+    domain_index = build_domain_index(config, application_info) if config.get("DOMAIN_INDEX_ENABLED", True) else None
+
+    # ホストごとのアクセス間隔制御（プロセス内の全ジョブで共有。初回のみ設定から生成）
+    get_host_scheduler(config)
+
+    # サイトマップから会社概要ページの候補を探し、メインページの次に巡回する
+    sitemap_seeds = int(config.get("SITEMAP_SEEDS", 3)) if config.get("SITEMAP_DISCOVERY_ENABLED", True) else 0
+    if sitemap_seeds > 0:
+        from sitemap import get_sitemap_discovery
+        get_sitemap_discovery(config)
+
+    # スニペット判定（検索結果のタイトル・スニペットで取得の要否を判定）
+    snippet_triage = None
+    if config.get("TRIAGE_ENABLED", True):
+        snippet_triage = SnippetTriage(
             application_info,
-            config["OLLAMA_API_URL"],
-            config["OLLAMA_MODEL"],
-            max_queries=max_queries
+            accept_threshold=score_threshold,
+            accept_enabled=config.get("TRIAGE_ACCEPT_FROM_SNIPPET", True),
+            address_index=get_default_index(config)
         )
-        logger.info(f"AI生成検索クエリリスト: {queries}")
-        print(f"AI生成検索クエリリスト: {queries}")
-    except Exception as e:
-        logger.error(f"AIによる検索クエリ生成に失敗: {e}", exc_info=True)
-        print("AIによる検索クエリ生成に失敗しました")
-        return
-      # 各クエリごとにGoogle検索とスクレイピング・AI解析
-    for idx, query in enumerate(queries, 1):
-        if check_early_termination():
-            logger.info(f"早期終了フラグによりクエリ{idx}以降をスキップ")
-            break
-        logger.info(f"[{idx}] 検索クエリ: {query}")
-        print(f"[{idx}] 検索クエリ: {query}")
-        try:
-            # Google検索実行
-            search_results = google_search(
-                query,
-                config["GOOGLE_API_KEY"],
-                config["GOOGLE_CSE_ID"],
-                num=num_results,
-                config=config
-            )
-            logger.info(f"Google検索結果件数: {len(search_results)}件")
-            print(f"Google検索結果: {len(search_results)}件")
+
+    # サイト単位解析：検索結果1件ごとに巡回した全ページの関連箇所をまとめて1回だけAI解析する
+    site_retriever_factory = None
+    embedding_cache = None
+    if str(config.get("ANALYSIS_MODE", "page")).lower() == "site":
+        site_retriever_factory, embedding_cache = build_site_retriever_factory(config, job, get_default_index(config))
+
+    # 見込みによる打ち切り：残りの候補で閾値に達する確率が下限を下回ったら検証を終える（実績が十分な場合のみ）
+    stopping_policy = None
+    if not registry_resolved and not quota_limited:
+        stopping_policy = build_stopping_policy(
+            config, planner.query_success_rates(application_info, max_queries))
+    stopped_by_policy = False
+    queries_done = 0
+    quota_error = None
+
+    # 各クエリごとにGoogle検索とスクレイピング・AI解析
+    try:
+        query_batches = [] if registry_resolved or quota_limited else iter_query_batches(
+            application_info, planner, job, max_queries, concurrent=concurrent_queries)
+        for idx, batch in enumerate(query_batches, 1):
+            if job.check_early_termination():
+                logger.info(f"早期終了フラグによりクエリ{idx}以降をスキップ")
+                break
+            logger.info(f"[{idx}] 検索クエリ: {' / '.join(query for _, query in batch)}")
+            queries_done += len(batch)
+            all_analysis_results = []
+            prefetcher = None
+            searched_templates = []
+            matched_template = None
+            try:
+                # Google検索実行
+                if len(batch) == 1:
+                    template_id, query = batch[0]
+                    search_results = google_search(
+                        query,
+                        config["GOOGLE_API_KEY"],
+                        config["GOOGLE_CSE_ID"],
+                        num=num_results,
+                        config=config,
+                        job=job
+                    )
+                    log_event(logger, "search.done", f"Google検索結果件数: {len(search_results)}件",
+                              query=query, template=template_id, result_count=len(search_results))
+                    searched_templates.append(template_id)
+                else:
+                    # 計画済みクエリを並行発行し、重複を除いた1つの順位付き候補リストにしてから解析する
+                    per_query = []
+                    exhausted = None
+                    for template_id, query, outcome in google_search_concurrent(
+                        batch, config["GOOGLE_API_KEY"], config["GOOGLE_CSE_ID"], num=num_results, config=config, job=job
+                    ):
+                        if isinstance(outcome, QuotaExhaustedError):
+                            exhausted = outcome
+                            continue
+                        if isinstance(outcome, Exception):
+                            logger.error(f"Google検索APIエラー: クエリ='{query}' - {outcome}")
+                            continue
+                        log_event(logger, "search.done", f"Google検索結果件数: {len(outcome)}件",
+                                  query=query, template=template_id, result_count=len(outcome))
+                        per_query.append((template_id, query, outcome))
+                        searched_templates.append(template_id)
+                    if exhausted is not None and not per_query:
+                        raise exhausted
+                    search_results = merge_search_results(per_query)
+                    logger.info(f"並行検索の統合結果件数: {len(search_results)}件（{len(per_query)}/{len(batch)}クエリ）")
+
+                # 除外ドメインの結果は取得せずに捨て、優先ドメインを先に解析する
+                if domain_index is not None:
+                    search_results = domain_index.filter_search_results(search_results)
+                    logger.info(f"ドメイン評価後の検索結果件数: {len(search_results)}件")
             
-            for i, item in enumerate(search_results, 1):
-                logger.info(f"[{i}] {item['title']} {item['link']}")
-                print(f"[{i}] {item['title']} {item['link']}")
+                for i, item in enumerate(search_results, 1):
+                    logger.info(f"[{i}] {item['title']} {item['link']}")
             
-            # スクレイピング・AI解析
-            all_analysis_results = []
-            found_match = False
+                # スクレイピング・AI解析
+                all_analysis_results = []
+                found_match = False
+                user_agent = config.get("SCRAPER_USER_AGENT", "Mozilla/5.0 (compatible; CompanyVerificationBot/1.0)")
+                scrape_interval = float(config.get("SCRAPER_INTERVAL", 1.0))
             
-            for i, item in enumerate(search_results, 1):
-                if check_early_termination() or found_match:
-                    logger.info(f"早期終了フラグまたは高スコア検出により検索{i}以降をスキップ")
-                    break
+                # スニペット判定：スニペットだけで一致が確認できる結果はページを取得せずに採用し、
+                # 連絡先が一致する結果はメインページのみ、無関係な結果は取得しない
+                crawl_depths = {}
+                triage_scores = {}
+                if snippet_triage is not None:
+                    kept_results = []
+                    for rank, (item, verdict) in enumerate(snippet_triage.triage_results(search_results), 1):
+                        if verdict.decision == ACCEPT and not found_match:
+                            all_analysis_results.append({
+                                "score": verdict.score,
+                                "reasoning": f"{verdict.reason}（{', '.join(verdict.matched)}）",
+                                "matched_info": verdict.matched,
+                                "confidence": verdict.score,
+                                "search_rank": rank,
+                                "page_rank": 0,
+                                "url": item['link'],
+                                "title": item.get('title') or '',
+                                "snippet": item.get('snippet') or '',
+                                "evidence": "snippet",
+                                "scraped_content_length": 0
+                            })
+                            record_page_result(job, all_analysis_results[-1])
+                            if domain_index is not None:
+                                domain_index.record_score(item['link'], verdict.score)
+                            log_event(logger, "triage.accept", f"スニペットで一致を確認（ページ取得なし）: {item['link']}",
+                                      url=item['link'], score=verdict.score, matched=verdict.matched)
+                            job.set_early_termination()
+                            found_match = True
+                            matched_template = item.get("template", batch[0][0])
+                        elif verdict.decision in (FETCH, CRAWL):
+                            kept_results.append(item)
+                            crawl_depths[item['link']] = 1 if verdict.decision == FETCH else max_scrape_depth
+                            triage_scores[item['link']] = verdict.score
+                    search_results = [] if found_match else kept_results
+                    logger.info(f"スニペット判定後の取得対象件数: {len(search_results)}件")
+            
+                # 先読みモード：現在の検索結果を解析している間に後続の検索結果のメインページを取得しておく
+                if prefetch_results > 0 and len(search_results) > 1:
+                    from prefetch import MainPagePrefetcher
+                    prefetcher = MainPagePrefetcher(job, max_ahead=prefetch_results, timeout=10, user_agent=user_agent,
+                                                    compress_body=compress_page_body)
+            
+                for i, item in enumerate(search_results, 1):
+                    if job.check_early_termination() or found_match:
+                        logger.info(f"早期終了フラグまたは高スコア検出により検索{i}以降をスキップ")
+                        break
+                    if stopping_policy is not None:
+                        stop, probability = stopping_policy.should_stop_job(
+                            [triage_scores.get(r['link']) for r in search_results[i - 1:]], queries_done)
+                        if stop:
+                            log_event(logger, "job.stop", f"残りの候補で閾値に達する見込みが低いため検証を終了: 確率={probability:.3f}",
+                                      probability=round(probability, 4), remaining_results=len(search_results) - i + 1,
+                                      queries_done=queries_done)
+                            stopped_by_policy = True
+                            break
                 
-                print(f"\n[{i}] ページ解析開始: {item['title']}")
-                logger.info(f"[{i}] ページ解析開始: {item['link']}")
+                    logger.info(f"[{i}] ページ解析開始: {item['link']}")
+                    first_page = None
+                    if prefetcher is not None:
+                        first_page = prefetcher.take(item['link'])
+                        prefetcher.schedule([r['link'] for r in search_results[i:i + prefetch_results]],
+                                            busy_host=urlparse(item['link']).netloc)
                 
-                try:                    # メインページをスクレイピング・AI解析
-                    print(f"[{i}] メインページスクレイピング開始: {item['link']}")
-                    logger.info(f"[{i}] メインページスクレイピング開始: {item['link']}")
-                    
-                    user_agent = config.get("SCRAPER_USER_AGENT", "Mozilla/5.0 (compatible; CompanyVerificationBot/1.0)")
-                    main_scraped = scrape_page(item['link'], timeout=10, user_agent=user_agent)
-                    if main_scraped and 'error' not in main_scraped:
-                        # メインページのAI解析
-                        total_searched_urls += 1
-                        main_analysis = process_single_page(
-                            application_info, main_scraped, config, i, 0, logger
-                        )
-                        
-                        if main_analysis:
-                            all_analysis_results.append(main_analysis)
-                            main_score = main_analysis.get("score", 0.0)
-                            
-                            # メインページで閾値チェック
-                            if main_score >= score_threshold:
-                                print(f"\n★★★ メインページで高スコア検出! (スコア={main_score:.3f} >= {score_threshold}) ★★★")
-                                logger.info(f"メインページで高スコア検出により処理早期終了: スコア={main_score:.3f}")
-                                set_early_termination()
-                                found_match = True
-                                break
-                          # 早期終了していない場合のみ関連ページをスクレイピング
-                        if not check_early_termination() and not found_match:
-                            print(f"[{i}] 関連ページスクレイピング開始")
-                            logger.info(f"[{i}] 関連ページスクレイピング開始: {item['link']}")
-                            
-                            user_agent = config.get("SCRAPER_USER_AGENT", "Mozilla/5.0 (compatible; CompanyVerificationBot/1.0)")
-                            scrape_interval = float(config.get("SCRAPER_INTERVAL", 1.0))
-                            
-                            scraped_pages = scrape_recursive(
-                                item['link'], 
-                                depth=1, 
-                                max_depth=max_scrape_depth,
-                                timeout=10,
-                                user_agent=user_agent,
-                                scrape_interval=scrape_interval
-                            )
-                    else:
-                        print(f"[{i}] メインページスクレイピング失敗")
-                        logger.warning(f"[{i}] メインページスクレイピング失敗: {item['link']}")
-                        continue  # 次のURLへ
-                        
-                    # 関連ページスクレイピング結果の処理
-                    if not scraped_pages:
-                        print(f"[{i}] 関連ページスクレイピング結果なし")
-                        logger.warning(f"[{i}] 関連ページスクレイピング結果なし: {item['link']}")
-                    else:
-                        print(f"[{i}] 関連ページスクレイピング完了: {len(scraped_pages)}ページ")
-                        logger.info(f"[{i}] 関連ページスクレイピング完了: {len(scraped_pages)}ページ")
-                        
-                        # 関連ページのAI解析                        
-                        for page_idx, scraped_result in enumerate(scraped_pages, 1):
-                            if check_early_termination():
+                    # メインページ（深度1）から関連ページまで1ページずつ取得し、取得した順にAI解析する
+                    pages = iter_scrape_recursive(
+                        item['link'],
+                        max_depth=crawl_depths.get(item['link'], max_scrape_depth),
+                        timeout=10,
+                        user_agent=user_agent,
+                        scrape_interval=scrape_interval,
+                        job=job,
+                        url_index=domain_index,
+                        max_pages=max_crawl_pages,
+                        compress_body=compress_page_body,
+                        first_page=first_page,
+                        sitemap_seeds=sitemap_seeds
+                    )
+                    retriever = site_retriever_factory(application_info) if site_retriever_factory else None
+                    site_best = 0.0
+                    try:
+                        for page_idx, scraped_result in enumerate(pages):
+                            if job.check_early_termination():
                                 logger.info(f"[{i}-{page_idx}] 早期終了フラグにより残りのページ解析をスキップ")
                                 break
-                                
+                        
                             if 'error' in scraped_result:
                                 error_msg = scraped_result.get('error', '不明なエラー')
+                                if page_idx == 0:
+                                    # メインページが取得できない場合は次のURLへ
+                                    logger.warning(f"[{i}] メインページスクレイピング失敗: {item['link']} - {error_msg}")
+                                    break
                                 if error_msg == 'robots.txt disallowed':
-                                    print(f"[{i}-{page_idx}] robots.txtによりスキップ: {scraped_result.get('url', '')}")
                                     logger.info(f"[{i}-{page_idx}] robots.txtによりスキップ: {scraped_result.get('url', '')}")
                                 else:
-                                    print(f"[{i}-{page_idx}] スクレイピングエラーによりスキップ: {error_msg}")
                                     logger.warning(f"[{i}-{page_idx}] スクレイピングエラー: {scraped_result.get('url', '')} - {error_msg}")
                                 continue
-                            
-                            # 関連ページのAI解析
+                        
                             total_searched_urls += 1
+                            if retriever is not None:
+                                # サイト単位解析：本文は断片にして保持し、巡回を終えてからまとめて解析する
+                                retriever.add_page(scraped_result)
+                                scraped_result.release()
+                                continue
                             analysis_result = process_single_page(
-                                application_info, scraped_result, config, i, page_idx, logger
+                                application_info, scraped_result, job, i, page_idx, domain_index,
+                                triage_score=triage_scores.get(item['link'])
                             )
+                            # 解析済みページの本文・リンクは保持しない（ジョブあたりのメモリを抑える）
+                            scraped_result.release()
+                        
                             if analysis_result:
                                 all_analysis_results.append(analysis_result)
                                 score = analysis_result.get("score", 0.0)
-                                
-                                # 関連ページでの閾値チェック
+                            
+                                # 閾値チェック：達した時点で巡回を止める
                                 if score >= score_threshold:
-                                    print(f"\n★★★ 関連ページで高スコア検出! (スコア={score:.3f} >= {score_threshold}) ★★★")
-                                    logger.info(f"関連ページで高スコア検出により処理早期終了: スコア={score:.3f}")
-                                    set_early_termination()
+                                    page_kind = "メインページ" if page_idx == 0 else "関連ページ"
+                                    logger.info(f"{page_kind}で高スコア検出により処理早期終了: スコア={score:.3f}")
+                                    job.set_early_termination()
                                     found_match = True
+                                    matched_template = item.get("template", batch[0][0])
                                     break
+
+                                # 解析済みページのスコアから、このサイトの残りのページで閾値に達する見込みが低ければ巡回を止める
+                                site_best = max(site_best, score)
+                                if stopping_policy is not None:
+                                    stop, probability = stopping_policy.should_stop_site(site_best)
+                                    if stop:
+                                        log_event(logger, "site.stop",
+                                                  f"[{i}-{page_idx}] 残りのページで閾値に達する見込みが低いため巡回を終了: 確率={probability:.3f}",
+                                                  url=item['link'], probability=round(probability, 4), site_best=site_best,
+                                                  pages=page_idx + 1)
+                                        break
                     
-                    # 4. 現在のURLの解析結果統計を表示
-                    current_url_results = [r for r in all_analysis_results if r.get("search_rank") == i]
-                    if current_url_results:
-                        max_score = max(r.get("score", 0.0) for r in current_url_results)
-                        print(f"[{i}] ページ解析完了: 解析件数={len(current_url_results)}, 最高スコア={max_score:.3f}")
-                        logger.info(f"[{i}] ページ解析結果: 解析件数={len(current_url_results)}, 最高スコア={max_score:.3f}")
-                    else:
-                        print(f"[{i}] ページ解析完了: 有効な解析結果なし")
-                        logger.info(f"[{i}] ページ解析結果: 有効な解析結果なし")
+                        if retriever is not None:
+                            analysis_result = process_site(application_info, retriever, job, i, item['link'], domain_index,
+                                                           triage_score=triage_scores.get(item['link']))
+                            if analysis_result:
+                                all_analysis_results.append(analysis_result)
+                                score = analysis_result.get("score", 0.0)
+                                if score >= score_threshold:
+                                    logger.info(f"サイト単位解析で高スコア検出により処理早期終了: スコア={score:.3f}")
+                                    job.set_early_termination()
+                                    found_match = True
+                                    matched_template = item.get("template", batch[0][0])
+
+                        # 現在のURLの解析結果統計を表示
+                        current_url_results = [r for r in all_analysis_results if r.get("search_rank") == i]
+                        if current_url_results:
+                            max_score = max(r.get("score", 0.0) for r in current_url_results)
+                            logger.info(f"[{i}] ページ解析結果: 解析件数={len(current_url_results)}, 最高スコア={max_score:.3f}")
+                        else:
+                            logger.info(f"[{i}] ページ解析結果: 有効な解析結果なし")
                         
-                    if found_match:
-                        break
+                        if found_match:
+                            break
                     
-                except Exception as e:
-                    print(f"[{i}] スクレイピング/解析エラー: {str(e)}")
-                    logger.error(f"[{i}] スクレイピング/解析エラー: {item['link']} {e}", exc_info=True)
+                    except JobInterruptedException:
+                        raise
+                    except Exception as e:
+                        logger.error(f"[{i}] スクレイピング/解析エラー: {item['link']} {e}", exc_info=True)
+                    finally:
+                        # 未取得の巡回予定ページは取得しない
+                        pages.close()
+
             
-            # クエリ結果の表示と蓄積
-            print(f"\nクエリ[{idx}]の解析結果: {len(all_analysis_results)}件")
-            all_analysis_results.sort(key=lambda x: x.get("score", 0.0), reverse=True)
-            for i, result in enumerate(all_analysis_results, 1):
-                print(f"  [{i}] スコア={result.get('score', 0.0):.3f} - {result.get('title', '')[:50]} - {result.get('url', '')}")
+                # クエリ結果の表示と蓄積
+                logger.info(f"クエリ[{idx}]の解析結果: {len(all_analysis_results)}件")
+                all_analysis_results.sort(key=lambda x: x.get("score", 0.0), reverse=True)
+                for i, result in enumerate(all_analysis_results, 1):
+                    logger.debug(f"  [{i}] スコア={result.get('score', 0.0):.3f} - {result.get('title', '')[:50]} - {result.get('url', '')}")
             
-            # 結果をグローバルリストに追加
-            all_query_results.extend(all_analysis_results)
-            # total_searched_urls += len(search_results)
+                # 結果をグローバルリストに追加
+                all_query_results.extend(all_analysis_results)
+                # total_searched_urls += len(search_results)
             
-            # 高スコアが見つかった場合は全体のクエリ処理も終了
-            if found_match:
-                overall_found_match = True
-                logger.info(f"高スコア検出により全クエリ処理を早期終了")
-                break
+                # 検索結果を最後まで評価したクエリとして実績に記録
+                # （並行発行で見つかった場合、採用URLを返したクエリ以外は評価途中のため記録しない）
+                if found_match:
+                    completed_templates.append(matched_template)
+                else:
+                    completed_templates.extend(searched_templates)
+
+                # 高スコアが見つかった場合は全体のクエリ処理も終了
+                if found_match:
+                    overall_found_match = True
+                    winning_template = matched_template
+                    logger.info("高スコア検出により全クエリ処理を早期終了")
+                    break
+                if stopped_by_policy:
+                    break
+                if stopping_policy is not None and queries_done < len(stopping_policy.query_rates):
+                    # 次のクエリを発行する前にも見込みを確認する（検索APIの使用件数を抑える）
+                    stop, probability = stopping_policy.should_stop_job([], queries_done)
+                    if stop:
+                        log_event(logger, "job.stop", f"残りのクエリで閾値に達する見込みが低いため検証を終了: 確率={probability:.3f}",
+                                  probability=round(probability, 4), remaining_results=0, queries_done=queries_done)
+                        stopped_by_policy = True
+                        break
                 
-        except Exception as e:
-            logger.error(f"Google検索APIエラー: {e}", exc_info=True)
-            print("Google検索APIでエラーが発生しました")
+            except (JobInterruptedException, QuotaExhaustedError):
+                # 打ち切り前に解析済みの結果は判定に含める
+                all_query_results.extend(all_analysis_results)
+                raise
+            except Exception as e:
+                logger.error(f"Google検索APIエラー: {e}", exc_info=True)
+            finally:
+                if prefetcher is not None:
+                    # 高スコア検出・打ち切り等で使われなかった先読みは破棄する
+                    prefetcher.close()
+    except TimeoutException as e:
+        # 処理時間上限に到達：それまでの解析結果で判定する
+        timed_out = True
+        logger.warning(f"処理時間上限により検証を打ち切り: {e}")
+    except EarlyTerminationException:
+        # 高スコア検出による早期終了（判定は解析済みの結果で行う）
+        logger.info("早期終了により残りの処理を打ち切り")
+    except QuotaExhaustedError as e:
+        # 検索中に日次上限に到達：一括処理では後で実行し直し、それ以外は法人登記・過去の判定のみで確認する
+        if can_defer:
+            quota_error = e
+        else:
+            quota_limited = True
+            cached_results = lookup_cached_verdict(application_info, config)
+            all_query_results.extend(cached_results)
+        log_event(logger, "quota.exhausted", f"検索中にAPI使用枠が不足したため以降の検索を中止: {e}",
+                  queries_done=queries_done, deferred=can_defer, cached=bool(cached_results))
+
+    # クエリテンプレートの実績を記録（次回以降のクエリ順序に反映）
+    planner.record(application_info, completed_templates, winning_template)
+    if domain_index is not None:
+        domain_index.save()
+    if embedding_cache is not None:
+        embedding_cache.close()
+    if quota_error is not None:
+        # 判定は記録せず、呼び出し元（ワーカー）がジョブを後に回す
+        raise quota_error
 
     # 全クエリからのすべての結果を統合し、スコア順でソート
     all_query_results.sort(key=lambda x: x.get("score", 0.0), reverse=True)
     
     # マッチング判定（最高スコアで判定）
     best_score = all_query_results[0].get("score", 0.0) if all_query_results else 0.0
-    found = best_score >= score_threshold
+    # 法人登記で法人名・所在地が一致した場合は、電話番号の確認がなくても実在を確認できたものとする
+    found = best_score >= score_threshold or registry_resolved
+
+    # 検証を終えた理由
+    if registry_resolved:
+        stop_reason = STOP_REGISTRY
+    elif quota_limited:
+        stop_reason = STOP_QUOTA
+    elif overall_found_match or best_score >= score_threshold:
+        stop_reason = STOP_THRESHOLD
+    elif timed_out:
+        stop_reason = STOP_TIMED_OUT
+    elif stopped_by_policy:
+        stop_reason = STOP_LOW_PROBABILITY
+    else:
+        stop_reason = STOP_EXHAUSTED
     
     # 判定結果のJSON/Markdown出力（標準化フォーマット適用）
     raw_result = {
@@ -369,27 +835,43 @@ def main_fixed(test_company_info: Optional[TestCompanyInfo] = None) -> Dict[str,
         "results": all_query_results,
         "searched_url_count": total_searched_urls,
         "found": found,
-        "early_terminated": overall_found_match
+        "early_terminated": overall_found_match,
+        "timed_out": timed_out,
+        "quota_limited": quota_limited,
+        "stop_reason": stop_reason
     }
     
     # 設計書準拠の標準化フォーマットに変換
     standardized_result = standardize_output_format(raw_result)
     
-    # ファイル出力
+    # ファイル出力（判定結果ストアには全ジョブを追記、result.json/result.mdは直近1件）
+    # ストアへの記録を先に行い、結果ファイルの出力に失敗しても判定（検索APIの使用分）を失わないようにする
+    if result_store is not None:
+        result_store.finish_job(job.job_id, standardized_result, best_score=best_score,
+                                elapsed_seconds=round(job.deadline.elapsed(), 3),
+                                status="timed_out" if timed_out else "finished", api_calls=job.deadline.api_calls,
+                                stop_policy=stopping_policy is not None)
     write_result_json(standardized_result)
     write_result_markdown(standardized_result)
     
     # ログ出力
-    logger.info(f"判定結果出力完了: found={standardized_result['found']}, searched_urls={standardized_result['searched_url_count']}, early_terminated={standardized_result['early_terminated']}")
-    print(f"✅ 判定結果をresult.jsonとresult.mdに出力しました")
-    print(f"📊 最終結果: found={standardized_result['found']}, URLs={standardized_result['searched_url_count']}, 早期終了={standardized_result['early_terminated']}")
+    log_event(logger, "job.verdict",
+              f"判定結果出力完了: found={standardized_result['found']}, searched_urls={standardized_result['searched_url_count']}, early_terminated={standardized_result['early_terminated']}, stop_reason={stop_reason}",
+              found=standardized_result['found'], best_score=best_score,
+              searched_url_count=standardized_result['searched_url_count'],
+              early_terminated=standardized_result['early_terminated'], timed_out=timed_out, stop_reason=stop_reason,
+              elapsed_seconds=round(job.deadline.elapsed(), 3))
     
     return standardized_result
 
-def main(test_company_info: Optional[TestCompanyInfo] = None) -> Dict[str, Any]:
-    return main_fixed(test_company_info)
+def main(test_company_info: Optional[TestCompanyInfo] = None, profile: bool = False) -> Dict[str, Any]:
+    return main_fixed(test_company_info, profile=profile)
 
 if __name__ == "__main__":
+    # --profile: 処理段階ごとの集計とcollapsed形式のスタック（フレームグラフ用）を結果ファイルと同じ場所に出力
+    profile_parser = argparse.ArgumentParser(add_help=False)
+    profile_parser.add_argument('--profile', action='store_true')
+    profile_requested = profile_parser.parse_known_args()[0].profile
     
     testCompany01: TestCompanyInfo = TestCompanyInfo(
         company="トヨタ自動車株式会社",
@@ -398,4 +880,4 @@ if __name__ == "__main__":
         # other=["旧社名: テスト商事", "支店名: 新宿支店"]
     )
 
-    main(testCompany01)
+    main(testCompany01, profile=profile_requested)
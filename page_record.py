@@ -0,0 +1,103 @@
+import zlib
+
+# この文字数以上の本文のみ圧縮する（短い本文は圧縮しても効果が小さい）
+COMPRESS_MIN_CHARS = 2048
+
+_FIELDS = ("url", "title", "content", "links", "error")
+
+def intern_url(url: str, pool: dict = None) -> str:
+    """
+    同じURL文字列を1つのオブジェクトに共有する
+    sys.internはプロセス全体の表に残るため使わず、巡回単位の辞書（巡回終了で解放）を使う
+    :param url: URL
+    :param pool: 巡回単位のURL共有辞書（Noneの場合は共有しない）
+    :return: 共有済みのURL文字列
+    """
+    if pool is None:
+        return url
+    return pool.setdefault(url, url)
+
+class PageRecord:
+    """
+    スクレイピング結果の省メモリ表現
+    __slots__で属性辞書を持たず、リンクは重複除去して巡回内で共有したURLのタプル、本文は任意でzlib圧縮して保持する。
+    従来のdict形式のページ（{'url', 'title', 'content', 'links', 'error'}）と同じ参照方法
+    （page.get('content')、page['url']、'error' in page）をサポートする
+    """
+
+    __slots__ = ("url", "title", "links", "error", "_body", "_compressed", "_length")
+
+    def __init__(self, url: str, title: str = "", content: str = "", links=(), error: str = None, compress: bool = False,
+                 url_pool: dict = None):
+        """
+        :param url: ページURL
+        :param title: ページタイトル
+        :param content: 本文テキスト
+        :param links: リンクURLのイテラブル（重複は出現順を保って除去）
+        :param error: 取得エラー（正常時はNone）
+        :param compress: 本文をzlib圧縮して保持するか
+        :param url_pool: 巡回単位のURL共有辞書（同じリンクを複数ページで1つの文字列として保持）
+        """
+        self.url = intern_url(url, url_pool)
+        self.title = title
+        self.links = tuple(intern_url(link, url_pool) for link in dict.fromkeys(links))
+        self.error = error
+        self._set_body(content, compress)
+
+    def _set_body(self, content: str, compress: bool):
+        """本文を保持する（compress=Trueかつ一定以上の長さの場合は圧縮。文字数は展開せずに参照できるよう保持する）"""
+        self._length = len(content) if content else 0
+        if compress and content and len(content) >= COMPRESS_MIN_CHARS:
+            self._body = zlib.compress(content.encode("utf-8"), 1)
+            self._compressed = True
+        else:
+            self._body = content or ""
+            self._compressed = False
+
+    @property
+    def content(self) -> str:
+        """本文テキスト（圧縮保持の場合は参照時に展開）"""
+        if self._compressed:
+            return zlib.decompress(self._body).decode("utf-8")
+        return self._body
+
+    @property
+    def content_length(self) -> int:
+        """本文の文字数（解析後に本文を破棄した場合は0）"""
+        return self._length
+
+    def release(self):
+        """解析済みページの本文とリンクを破棄する（URL・タイトル・エラーは残す）"""
+        self._body = ""
+        self._compressed = False
+        self._length = 0
+        self.links = ()
+
+    # --- dict互換の参照 ---
+
+    def get(self, key, default=None):
+        if key == "error":
+            return self.error if self.error is not None else default
+        if key in _FIELDS:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        if key == "error":
+            return self.error is not None
+        return key in _FIELDS
+
+    def to_dict(self) -> dict:
+        """従来のdict形式に変換する"""
+        page = {"url": self.url, "title": self.title, "content": self.content, "links": list(self.links)}
+        if self.error is not None:
+            page["error"] = self.error
+        return page
+
+    def __repr__(self):
+        return f"PageRecord(url={self.url!r}, title={self.title[:30]!r}, content_length={self.content_length}, links={len(self.links)}, error={self.error!r})"
@@ -0,0 +1,97 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from urllib.parse import urlparse
+from scraper import scrape_page
+
+class MainPagePrefetcher:
+    """
+    後続の検索結果のメインページ（深度1）を先読みする
+    現在の検索結果をAI解析している間に、次のmax_ahead件のメインページを別スレッドで取得・解析しておく。
+    ・同時に先読みするのはmax_ahead件まで（取得済みで未使用のページもこの件数に含む）
+    ・現在巡回中のホスト、および先読み中のホストへは同時にアクセスしない（アクセス間隔の遵守）
+    ・robots.txtのチェックはscrape_pageが行う
+    ・close()（早期終了・クエリ終了時）で未着手の先読みを取り消し、取得済みのページを破棄する
+    """
+
+    def __init__(self, job, max_ahead: int = 2, timeout: int = 10, user_agent: str = None, compress_body: bool = False):
+        """
+        :param job: ジョブコンテキスト（キャンセル・期限切れ時は先読みを行わない）
+        :param max_ahead: 先読みする検索結果の件数
+        :param timeout: HTTPリクエストのタイムアウト秒数
+        :param user_agent: User-Agent文字列
+        :param compress_body: 本文をzlib圧縮して保持するか
+        """
+        self.job = job
+        self.max_ahead = max_ahead
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.compress_body = compress_body
+        self._executor = ThreadPoolExecutor(max_workers=max_ahead, thread_name_prefix="prefetch")
+        # URL -> (ホスト, Future)
+        self._futures = {}
+        self._closed = False
+
+    def _fetch(self, url):
+        """先読みスレッドでメインページを取得する（ジョブ終了後に着手した場合は取得しない）"""
+        self.job.check()
+        return scrape_page(url, timeout=self.timeout, user_agent=self.user_agent, job=self.job,
+                           compress_body=self.compress_body)
+
+    def schedule(self, urls, busy_host: str = None):
+        """
+        URLの先読みを登録する（上限件数・同一ホストの制約を満たすものだけ）
+        :param urls: 先読み候補のURL（優先順）
+        :param busy_host: 現在巡回中のホスト（先読みしない）
+        """
+        if self._closed or self.job.check_early_termination():
+            return
+        for url in urls:
+            if len(self._futures) >= self.max_ahead:
+                break
+            host = urlparse(url).netloc
+            if url in self._futures or host == busy_host or any(h == host for h, _ in self._futures.values()):
+                continue
+            # ログの相関ID（contextvars）を先読みスレッドに引き継ぐ
+            context = contextvars.copy_context()
+            self._futures[url] = (host, self._executor.submit(context.run, self._fetch, url))
+            logging.debug(f"メインページ先読み開始: {url}")
+
+    def take(self, url):
+        """
+        先読み済みのページを取り出す（取得中の場合は完了を待つ）
+        :param url: メインページのURL
+        :return: PageRecord（先読みしていない場合はNone）
+        """
+        entry = self._futures.pop(url, None)
+        if entry is None:
+            return None
+        _, future = entry
+        try:
+            page = future.result(timeout=self.job.deadline.remaining())
+        except FutureTimeoutError:
+            future.cancel()
+            self.job.check()
+            return None
+        logging.info(f"先読み済みメインページを使用: {url}")
+        return page
+
+    def close(self):
+        """未着手の先読みを取り消し、取得済みのページを破棄する（取得中のリクエストは待たない）"""
+        if self._closed:
+            return
+        self._closed = True
+        dropped = len(self._futures)
+        for _, future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if dropped:
+            logging.info(f"未使用の先読み{dropped}件を破棄")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from event_log import log_event
+
+# 処理段階の判定規則：関数名（クラス名.メソッド名）→ 段階
+# スタックを外側から順に見て最後に一致した段階とする（内側の一致が優先）。
+# ただしLOCKED_STAGESに一致した後は内側を見ない（クエリ生成中のLLM呼び出しはクエリ生成に含める）
+STAGE_RULES = {
+    "iter_query_batches": "query",
+    "ai_generate_query": "query",
+    "QueryPlanner.plan": "query",
+    "lookup_registry": "registry",
+    "google_search": "search",
+    "google_search_concurrent": "search",
+    "SnippetTriage.triage_results": "triage",
+    "scrape_page": "fetch",
+    "check_robots_txt": "fetch",
+    "SitemapDiscovery.discover": "fetch",
+    "MainPagePrefetcher._fetch": "fetch",
+    "BeautifulSoup.__init__": "parse",
+    "PageRecord.__init__": "parse",
+    "SiteRetriever.add_page": "parse",
+    "ai_analyze_content": "llm",
+    "ollama_chat": "llm",
+    "OllamaEmbedder.embed": "llm",
+    "standardize_output_format": "output",
+    "write_result_json": "output",
+    "write_result_markdown": "output",
+    "ResultStore.finish_job": "output",
+}
+LOCKED_STAGES = ("query", "output")
+OTHER_STAGE = "other"
+
+# 本システムのモジュールの配置ディレクトリ（このディレクトリのコードを通るスタックのみ採取する）
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+def _frame_label(code) -> str:
+    """フレームの表示名（モジュール名:関数名）"""
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+class SamplingProfiler:
+    """
+    サンプリング方式のプロファイラ
+    別スレッドから一定間隔で全スレッドのスタック（sys._current_frames）を採取し、
+    処理段階（クエリ生成・検索・取得・解析・LLM・出力）ごとの集計とcollapsed形式のスタックを作る。
+    計測対象のコードには手を入れず、採取間隔ごとにスタックを辿るだけなので本番のジョブでも有効にできる
+    （待ち時間も含む実時間の内訳となる。スレッドごとに採取するため、並行処理中は合計が経過時間を超える。
+    同一プロセスで並行実行中の別ジョブのスレッドも採取される）
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        """
+        :param interval: 採取間隔（秒）
+        :param max_depth: 採取するスタックの深さの上限
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = {}   # {(段階, フレーム名...): 採取回数}
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self._sample(frame)
+            self.samples += 1
+
+    def _sample(self, frame):
+        labels = []
+        in_project = False
+        while frame is not None and len(labels) < self.max_depth:
+            code = frame.f_code
+            in_project = in_project or code.co_filename.startswith(_PROJECT_DIR)
+            labels.append(_frame_label(code))
+            frame = frame.f_back
+        # 本システムのコードを通らないスレッド（ログ出力・アイドル状態のワーカー等）は数えない
+        if not in_project:
+            return
+        labels.reverse()
+        key = (self.stage_of(labels),) + tuple(labels)
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    @staticmethod
+    def stage_of(labels) -> str:
+        """スタック（外側から順のフレーム名）の処理段階"""
+        stage = OTHER_STAGE
+        for label in labels:
+            matched = STAGE_RULES.get(label.split(":", 1)[-1])
+            if matched is not None:
+                stage = matched
+                if stage in LOCKED_STAGES:
+                    break
+        return stage
+
+    def stage_summary(self) -> dict:
+        """
+        処理段階ごとの集計
+        :return: {段階: {"samples": 採取数, "seconds": 推定時間, "ratio": 全採取に対する割合}}（推定時間の降順）
+        """
+        totals = {}
+        for key, count in self.stacks.items():
+            totals[key[0]] = totals.get(key[0], 0) + count
+        all_samples = sum(totals.values()) or 1
+        return {
+            stage: {"samples": count, "seconds": round(count * self.interval, 3), "ratio": round(count / all_samples, 3)}
+            for stage, count in sorted(totals.items(), key=lambda item: item[1], reverse=True)
+        }
+
+    def collapsed(self) -> str:
+        """collapsed形式のスタック（1行に「段階;外側;…;内側 採取数」。flamegraph.pl・speedscope等で描画できる）"""
+        lines = [f"{';'.join(key)} {count}" for key, count in sorted(self.stacks.items())]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def write(self, directory: str, name: str) -> tuple:
+        """
+        collapsed形式のスタックと段階別の集計をファイルに出力する
+        :param directory: 出力先ディレクトリ
+        :param name: ファイル名（拡張子なし）
+        :return: (collapsedファイルのパス, 集計ファイルのパス)
+        """
+        os.makedirs(directory or ".", exist_ok=True)
+        folded_path = os.path.join(directory, f"{name}.folded")
+        summary_path = os.path.join(directory, f"{name}.json")
+        with open(folded_path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump({"elapsed_seconds": round(self.elapsed, 3), "interval": self.interval, "samples": self.samples,
+                       "stages": self.stage_summary()}, f, ensure_ascii=False, indent=2)
+        return folded_path, summary_path
+
+def should_profile(config, requested: bool = False) -> bool:
+    """
+    このジョブをプロファイルするか（--profile指定、またはPROFILE_SAMPLE_RATEの割合で抽出）
+    :param config: 設定情報
+    :param requested: --profileが指定された場合True
+    """
+    if requested:
+        return True
+    rate = float(config.get("PROFILE_SAMPLE_RATE", 0.0))
+    return rate > 0 and random.random() < rate
+
+@contextmanager
+def profile_job(job, enabled: bool = True):
+    """
+    ジョブの処理をプロファイルし、終了時に段階別の集計をログ出力してファイルに書き出す
+    :param job: ジョブコンテキスト
+    :param enabled: Falseの場合は何もしない
+    """
+    if not enabled:
+        yield None
+        return
+    config = job.config
+    profiler = SamplingProfiler(interval=float(config.get("PROFILE_INTERVAL_MS", 10)) / 1000)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        try:
+            folded_path, summary_path = profiler.write(config.get("PROFILE_DIR", "."), f"profile_{job.job_id}")
+            summary = profiler.stage_summary()
+            log_event(job.logger, "job.profile",
+                      "プロファイル: " + ", ".join(f"{stage}={s['seconds']:.2f}秒({s['ratio']:.0%})"
+                                                  for stage, s in summary.items())
+                      + f" → {folded_path}",
+                      stages=summary, samples=profiler.samples, folded_file=folded_path, summary_file=summary_path)
+        except OSError as e:
+            logging.warning(f"プロファイル結果の出力に失敗: {e}")
@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import threading
+
+# 検索クエリテンプレート（ID, 生成関数）。並び順は実績がない場合の既定順
+QUERY_TEMPLATES = [
+    ("name_address_tel", lambda company, address, tel, other: f"{company} {address.split()[0] if address else ''} {tel.split()[0] if tel else ''}"),
+    ("name_address", lambda company, address, tel, other: f"{company} {address}" if address else ""),
+    ("name_tel", lambda company, address, tel, other: f"{company} {tel}" if tel else ""),
+    ("name_other", lambda company, address, tel, other: f"{company} {other[0]}" if other else ""),
+    ("name", lambda company, address, tel, other: f"{company}"),
+]
+
+# LLMが生成したクエリの実績記録用ID
+LLM_TEMPLATE_ID = "llm"
+
+# 会社種別の判定に使用する法人格表記（前株・後株・略記を含む）
+_COMPANY_TYPES = [
+    ("株式会社", ["株式会社", "（株）", "(株)", "㈱"]),
+    ("有限会社", ["有限会社", "（有）", "(有)", "㈲"]),
+    ("合同会社", ["合同会社", "（合）", "(合)"]),
+]
+
+def classify_company_type(company_name: str) -> str:
+    """
+    会社名から会社種別（法人格）を判定する
+    :param company_name: 会社名
+    :return: "株式会社" / "有限会社" / "合同会社" / "その他"
+    """
+    for company_type, markers in _COMPANY_TYPES:
+        if any(marker in company_name for marker in markers):
+            return company_type
+    return "その他"
+
+def build_template_queries(application_info) -> list:
+    """
+    申請情報からテンプレート検索クエリを生成する（LLM呼び出しなし）
+    :param application_info: 申請情報リスト [会社名, 住所, 電話番号, その他...]
+    :return: [(テンプレートID, クエリ)] のリスト（空クエリ・重複は除外、既定順）
+    """
+    company_name = application_info[0] if len(application_info) > 0 else ""
+    address = application_info[1] if len(application_info) > 1 else ""
+    tel = application_info[2] if len(application_info) > 2 else ""
+    other_info = application_info[3:] if len(application_info) > 3 else []
+
+    queries = []
+    seen = set()
+    for template_id, build in QUERY_TEMPLATES:
+        query = " ".join(build(company_name, address, tel, other_info).split())
+        if query and query not in seen:
+            seen.add(query)
+            queries.append((template_id, query))
+    return queries
+
+class QueryPlanner:
+    """
+    検索クエリテンプレートの実績（どのテンプレートが採用URLを見つけたか）を会社種別ごとに記録し、
+    成功率の高い順にクエリを並べ、実績上ほぼ成功しないテンプレートを除外する
+    """
+
+    # 同一プロセス内の並行ジョブによる実績ファイルの同時更新を防ぐ
+    _lock = threading.Lock()
+
+    def __init__(self, stats_file: str = "query_planner_stats.json", min_trials: int = 5, min_success_rate: float = 0.05):
+        """
+        :param stats_file: 実績記録ファイルのパス
+        :param min_trials: 除外判定を行うまでに必要な試行回数
+        :param min_success_rate: この成功率未満のテンプレートは除外（min_trials回以上試行済みの場合）
+        """
+        self.stats_file = stats_file
+        self.min_trials = min_trials
+        self.min_success_rate = min_success_rate
+
+    def _load_stats(self) -> dict:
+        """実績データを読み込む"""
+        if os.path.exists(self.stats_file):
+            try:
+                with open(self.stats_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (ValueError, IOError) as e:
+                logging.warning(f"クエリ実績ファイルの読み込みに失敗: {e}")
+        return {}
+
+    def _save_stats(self, stats: dict):
+        """実績データを書き込む"""
+        try:
+            with open(self.stats_file, "w", encoding="utf-8") as f:
+                json.dump(stats, f, ensure_ascii=False, indent=2)
+        except IOError as e:
+            logging.error(f"クエリ実績ファイルの書き込みに失敗: {e}")
+
+    @staticmethod
+    def success_rate(entry: dict) -> float:
+        """
+        テンプレートの成功率（ラプラス平滑化済み。未試行は0.5）
+        :param entry: {"tried": 試行回数, "won": 採用URL発見回数}
+        """
+        return (entry.get("won", 0) + 1) / (entry.get("tried", 0) + 2)
+
+    def plan(self, application_info, max_queries: int) -> list:
+        """
+        テンプレートクエリを会社種別ごとの成功率順に並べ、低成功率のものを除外して返す
+        :param application_info: 申請情報リスト
+        :param max_queries: 最大クエリ数
+        :return: [(テンプレートID, クエリ)] のリスト
+        """
+        company_type = classify_company_type(application_info[0] if application_info else "")
+        with self._lock:
+            type_stats = self._load_stats().get(company_type, {})
+
+        candidates = build_template_queries(application_info)
+        planned = []
+        for order, (template_id, query) in enumerate(candidates):
+            entry = type_stats.get(template_id, {})
+            rate = self.success_rate(entry)
+            if entry.get("tried", 0) >= self.min_trials and rate < self.min_success_rate:
+                logging.info(f"低成功率のため検索テンプレートを除外: {template_id} (種別={company_type}, 成功率={rate:.3f})")
+                continue
+            planned.append((rate, order, template_id, query))
+
+        # 成功率の高い順（同率の場合は既定順）
+        planned.sort(key=lambda p: (-p[0], p[1]))
+        return [(template_id, query) for _, _, template_id, query in planned[:max_queries]]
+
+    def record(self, application_info, tried_templates: list, winning_template=None):
+        """
+        検索結果の実績を記録する
+        :param application_info: 申請情報リスト
+        :param tried_templates: 検索結果を最後まで評価したテンプレートIDのリスト
+        :param winning_template: 採用URL（閾値以上のページ）を見つけたテンプレートID（なければNone）
+        """
+        if not tried_templates:
+            return
+        company_type = classify_company_type(application_info[0] if application_info else "")
+        with self._lock:
+            stats = self._load_stats()
+            type_stats = stats.setdefault(company_type, {})
+            for template_id in dict.fromkeys(tried_templates):
+                entry = type_stats.setdefault(template_id, {"tried": 0, "won": 0})
+                entry["tried"] += 1
+                if template_id == winning_template:
+                    entry["won"] += 1
+            self._save_stats(stats)
+        logging.info(f"検索クエリ実績を記録: 種別={company_type}, 試行={tried_templates}, 採用={winning_template}")
+
+    def query_success_rates(self, application_info, max_queries: int) -> list:
+        """
+        計画するクエリの順に、各クエリで採用URLが見つかる確率（成功率）を返す
+        テンプレートで足りない分はLLM生成クエリの成功率とする
+        :param application_info: 申請情報リスト
+        :param max_queries: 最大クエリ数
+        """
+        company_type = classify_company_type(application_info[0] if application_info else "")
+        with self._lock:
+            type_stats = self._load_stats().get(company_type, {})
+        rates = [self.success_rate(type_stats.get(template_id, {}))
+                 for template_id, _ in self.plan(application_info, max_queries)]
+        llm_rate = self.success_rate(type_stats.get(LLM_TEMPLATE_ID, {}))
+        return rates + [llm_rate] * max(0, max_queries - len(rates))
@@ -0,0 +1,156 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+SEARCH = "search"
+REGISTRY_ONLY = "registry_only"
+DEFER = "defer"
+
+@dataclass
+class QuotaDecision:
+    """ジョブの実行方法の判定結果"""
+    mode: str               # search / registry_only（法人登記・過去の判定のみで確認）/ defer（後で実行）
+    max_queries: int = 0    # Google検索のクエリ数の上限（searchの場合）
+    wait_seconds: float = 0.0  # deferの場合の待ち時間（秒）
+    expected_cost: float = 0.0  # 1ジョブあたりの推定API使用件数
+    reason: str = ""
+
+class QuotaScheduler:
+    """
+    Google Search APIの日次上限の配分
+    ・1ジョブあたりの使用件数を判定結果ストアの実績（直近の検索を行ったジョブの平均）から推定する
+    ・使用可能な件数を時間帯に比例して増やし（QUOTA_DAY_START_HOUR〜QUOTA_DAY_END_HOUR）、
+      一括処理の序盤で上限を使い切らないよう、超える分のジョブは後に回す
+      （後に回せないジョブ（CLI・main_fixedの直接呼び出し）は検索せず、法人登記・過去の判定のみで確認する）
+    ・残りが少なくなったら優先度の低いジョブは検索せず、法人登記・過去の判定のみで確認する
+    """
+
+    # 推定値の再計算間隔（秒）
+    STATS_TTL = 60.0
+
+    def __init__(self, daily_limit: int, max_queries: int, pages_per_query: int = 1, start_hour: int = 0,
+                 end_hour: int = 24, burst_ratio: float = 0.2, low_ratio: float = 0.1, low_priority: int = 1,
+                 history=None, history_days: float = 7, min_history: int = 5):
+        """
+        :param daily_limit: 1日のAPI使用件数の上限
+        :param max_queries: 1ジョブの検索クエリ数の上限（MAX_GOOGLE_SEARCH）
+        :param pages_per_query: 1クエリあたりの検索結果ページ数（10件ごとに1回のAPI呼び出し）
+        :param start_hour: 配分の開始時刻（時）
+        :param end_hour: 配分の終了時刻（時）。この時刻に上限の全量を使用可能になる
+        :param burst_ratio: 開始時刻から使用可能な割合
+        :param low_ratio: 優先度の高いジョブのために残す割合
+        :param low_priority: 残りが少ない場合にも検索を行う優先度の下限
+        :param history: 実績の参照先（result_store.ResultStore。Noneの場合は上限どおりの使用件数と推定）
+        :param history_days: 参照する実績の期間（日）
+        :param min_history: 実績から推定するのに必要なジョブ数
+        """
+        self.daily_limit = daily_limit
+        self.max_queries = max_queries
+        self.pages_per_query = max(1, pages_per_query)
+        self.start_hour = start_hour
+        self.end_hour = max(end_hour, start_hour + 1)
+        self.burst_ratio = min(max(burst_ratio, 0.0), 1.0)
+        self.low_ratio = low_ratio
+        self.low_priority = low_priority
+        self.history = history
+        self.history_days = history_days
+        self.min_history = min_history
+        self._lock = threading.Lock()
+        self._cost = None
+        self._cost_at = 0.0
+
+    def worst_cost(self) -> int:
+        """1ジョブの最大使用件数（全クエリで全ページを取得した場合）"""
+        return self.max_queries * self.pages_per_query
+
+    def expected_cost(self) -> float:
+        """1ジョブあたりの推定使用件数（実績が少ない場合は最大使用件数）"""
+        with self._lock:
+            if self._cost is not None and time.monotonic() - self._cost_at < self.STATS_TTL:
+                return self._cost
+            cost = float(self.worst_cost())
+            if self.history is not None:
+                stats = self.history.api_call_stats(since=time.time() - self.history_days * 86400)
+                if stats["jobs"] >= self.min_history and stats["mean"]:
+                    cost = min(cost, stats["mean"])
+            self._cost, self._cost_at = cost, time.monotonic()
+            return cost
+
+    def _window(self, now: float) -> tuple:
+        """当日の配分期間（開始・終了のUNIX時刻）"""
+        start = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        start += timedelta(hours=self.start_hour)
+        return start.timestamp(), (start + timedelta(hours=self.end_hour - self.start_hour)).timestamp()
+
+    def allowance(self, now: float = None) -> float:
+        """nowの時点までに使用可能な件数"""
+        now = time.time() if now is None else now
+        start, end = self._window(now)
+        elapsed = min(max((now - start) / (end - start), 0.0), 1.0)
+        return self.daily_limit * (self.burst_ratio + (1 - self.burst_ratio) * elapsed)
+
+    def wait_seconds(self, target: float, now: float = None) -> float:
+        """使用可能な件数がtargetに達するまでの秒数"""
+        now = time.time() if now is None else now
+        if target <= self.allowance(now) or self.burst_ratio >= 1:
+            return 0.0
+        start, end = self._window(now)
+        needed = (target / self.daily_limit - self.burst_ratio) / (1 - self.burst_ratio)
+        return max(0.0, start + min(needed, 1.0) * (end - start) - now)
+
+    def decide(self, usage: int, priority: int = 0, can_defer: bool = False, now: float = None) -> QuotaDecision:
+        """
+        ジョブの実行方法を判定する
+        :param usage: 当日の使用件数
+        :param priority: ジョブの優先度（大きいほど優先）
+        :param can_defer: 後で実行できる場合True（一括処理のワーカー）。Falseの場合、配分を超える分は
+                          待たずに法人登記・過去の判定のみで確認する
+        """
+        remaining = self.daily_limit - usage
+        cost = self.expected_cost()
+        if remaining < self.pages_per_query:
+            return QuotaDecision(REGISTRY_ONLY, expected_cost=cost,
+                                 reason=f"日次上限に到達（{usage}/{self.daily_limit}）")
+        reserve = math.ceil(self.daily_limit * self.low_ratio)
+        if priority < self.low_priority and remaining - cost < reserve:
+            return QuotaDecision(REGISTRY_ONLY, expected_cost=cost,
+                                 reason=f"残り{remaining}件（推定使用{cost:.1f}件）は優先度{self.low_priority}以上のジョブに残す")
+        wait = self.wait_seconds(usage + cost, now)
+        if wait > 0:
+            reason = f"時間帯の配分を超過（使用{usage}件 + 推定{cost:.1f}件 > {self.allowance(now):.0f}件）"
+            if can_defer:
+                return QuotaDecision(DEFER, wait_seconds=wait, expected_cost=cost, reason=reason)
+            return QuotaDecision(REGISTRY_ONLY, expected_cost=cost, reason=reason)
+        max_queries = min(self.max_queries, remaining // self.pages_per_query)
+        reason = "" if max_queries == self.max_queries else f"残り{remaining}件に合わせてクエリ数を{max_queries}件に制限"
+        return QuotaDecision(SEARCH, max_queries=max_queries, expected_cost=cost, reason=reason)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_quota_scheduler(config=None) -> QuotaScheduler:
+    """
+    プロセス内で共有するQuotaScheduler（初回のみ設定から生成）
+    :param config: 設定情報（Noneの場合はload_config()）
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            if config is None:
+                from config import load_config
+                config = load_config()
+            from result_store import get_result_store
+            _scheduler = QuotaScheduler(
+                daily_limit=int(config.get("GOOGLE_API_DAILY_LIMIT", 100)),
+                max_queries=int(config.get("MAX_GOOGLE_SEARCH", 3)),
+                pages_per_query=math.ceil(int(config.get("GOOGLE_SEARCH_NUM_RESULTS", 3)) / 10),
+                start_hour=int(config.get("QUOTA_DAY_START_HOUR", 0)),
+                end_hour=int(config.get("QUOTA_DAY_END_HOUR", 24)),
+                burst_ratio=float(config.get("QUOTA_BURST_RATIO", 0.2)),
+                low_ratio=float(config.get("QUOTA_LOW_RATIO", 0.1)),
+                low_priority=int(config.get("QUOTA_LOW_PRIORITY", 1)),
+                history=get_result_store(config)
+            )
+        return _scheduler
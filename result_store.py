@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+追記型の判定結果ストア（JSONL + SQLite）
+
+ジョブの開始・解析したページ（スコア・所要時間）・ジョブの判定をその都度追記する。
+・JSONL（RESULT_STORE_JSONL）：1行1レコードの追記のみ。正本として保持し、SQLiteはここから再構築できる
+・SQLite（RESULT_STORE_DB）：jobs/pagesテーブルと索引。未確認の会社・ドメイン別の高スコアページ等を検索する
+result.json/result.mdは直近1件の判定結果として従来どおり出力する。
+
+使い方:
+  python result_store.py unverified [--days 7]          # 期間内に実在を確認できなかった会社
+  python result_store.py domains [--min-score 0.9]      # スコアが閾値を超えたページのドメイン別件数
+  python result_store.py job <ジョブID>                  # ジョブの判定と解析したページ
+  python result_store.py rebuild                        # JSONLからSQLiteを再構築
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        started_at REAL NOT NULL,
+        finished_at REAL,
+        status TEXT NOT NULL,
+        company TEXT,
+        address TEXT,
+        tel TEXT,
+        other TEXT,
+        found INTEGER,
+        best_score REAL,
+        early_terminated INTEGER,
+        timed_out INTEGER,
+        searched_url_count INTEGER,
+        elapsed_seconds REAL,
+        api_calls INTEGER,
+        stop_reason TEXT,
+        stop_policy INTEGER,
+        result TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS pages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        scored_at REAL NOT NULL,
+        url TEXT,
+        domain TEXT,
+        score REAL,
+        confidence REAL,
+        evidence TEXT,
+        search_rank INTEGER,
+        page_rank INTEGER,
+        title TEXT,
+        reasoning TEXT,
+        matched_info TEXT,
+        content_length INTEGER,
+        analysis_ms REAL,
+        triage_score REAL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_started_at ON jobs (started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_found_started_at ON jobs (found, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_company ON jobs (company)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_application ON jobs (company, address, tel, finished_at)",
+    "CREATE INDEX IF NOT EXISTS idx_pages_job_id ON pages (job_id)",
+    "CREATE INDEX IF NOT EXISTS idx_pages_domain_score ON pages (domain, score)",
+    "CREATE INDEX IF NOT EXISTS idx_pages_score ON pages (score)",
+)
+
+def page_domain(url: str) -> str:
+    """集計用のドメイン（ホスト名。先頭のwww.は除去）"""
+    host = (urlparse(url or "").hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+class ResultStore:
+    """
+    判定結果の追記型ストア
+    1プロセス内では共有して使う（スレッドセーフ）。複数プロセスからの追記はJSONLの1行単位の追記と
+    SQLiteのWAL・ロック待ちで直列化する
+    """
+
+    def __init__(self, jsonl_path: str = "results.jsonl", db_path: str = "results.db"):
+        """
+        :param jsonl_path: JSONLファイル（空の場合はJSONLに書かない）
+        :param db_path: SQLiteファイル（空の場合はSQLiteに書かない）
+        設定（RESULT_STORE_JSONL/RESULT_STORE_DB）の空欄は既定のファイル名になるため、
+        空のパスはrebuild等でこのクラスを直接使う場合のみ指定できる
+        """
+        self.jsonl_path = jsonl_path
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _append_jsonl(self, record: dict):
+        """1レコードを1回のwriteで追記する（O_APPENDにより他プロセスの行と混ざらない）"""
+        if not self.jsonl_path:
+            return
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        fd = os.open(self.jsonl_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _apply(self, record: dict):
+        """レコードをSQLiteに反映する（レコード単位のトランザクション）"""
+        if self._conn is None:
+            return
+        kind = record["type"]
+        with self._conn:
+            if kind == "job.start":
+                application = record.get("application", {})
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, started_at, status, company, address, tel, other)"
+                    " VALUES (?, ?, 'running', ?, ?, ?, ?)",
+                    (record["job_id"], record["ts"], application.get("company"), application.get("address"),
+                     application.get("tel"), json.dumps(application.get("other") or [], ensure_ascii=False))
+                )
+            elif kind == "page":
+                page = record["page"]
+                self._conn.execute(
+                    "INSERT INTO pages (job_id, scored_at, url, domain, score, confidence, evidence, search_rank,"
+                    " page_rank, title, reasoning, matched_info, content_length, analysis_ms, triage_score)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record["job_id"], record["ts"], page.get("url"), page_domain(page.get("url")),
+                     page.get("score"), page.get("confidence"), page.get("evidence") or "page",
+                     page.get("search_rank"), page.get("page_rank"), page.get("title"), page.get("reasoning"),
+                     json.dumps(page.get("matched_info") or [], ensure_ascii=False),
+                     page.get("scraped_content_length"), page.get("analysis_ms"), page.get("triage_score"))
+                )
+            elif kind == "job.finish":
+                result = record["result"]
+                # 開始レコードがない場合（JSONLの途中から再構築した場合等）も判定を残す
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO jobs (job_id, started_at, status, company, address, tel)"
+                    " VALUES (?, ?, 'running', ?, ?, ?)",
+                    (record["job_id"], record["ts"], result.get("company"), result.get("address"), result.get("tel"))
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET finished_at = ?, status = ?, found = ?, best_score = ?, early_terminated = ?,"
+                    " timed_out = ?, searched_url_count = ?, elapsed_seconds = ?, api_calls = ?, stop_reason = ?,"
+                    " stop_policy = ?, result = ? WHERE job_id = ?",
+                    (record["ts"], record.get("status", "finished"), int(bool(result.get("found"))),
+                     record.get("best_score"), int(bool(result.get("early_terminated"))),
+                     int(bool(result.get("timed_out"))), result.get("searched_url_count"),
+                     record.get("elapsed_seconds"), record.get("api_calls"), result.get("stop_reason"),
+                     None if record.get("stop_policy") is None else int(bool(record["stop_policy"])),
+                     json.dumps(result, ensure_ascii=False), record["job_id"])
+                )
+
+    def _write(self, record: dict):
+        record.setdefault("ts", time.time())
+        with self._lock:
+            self._append_jsonl(record)
+            try:
+                self._apply(record)
+            except sqlite3.Error as e:
+                # JSONLには記録済みのため、rebuildで復元できる
+                logging.error(f"判定結果ストア(SQLite)への書き込みに失敗: {e}")
+
+    def begin_job(self, job_id: str, company: str, address: str, tel: str, other=None):
+        """ジョブの開始を記録する"""
+        self._write({"type": "job.start", "job_id": job_id,
+                     "application": {"company": company, "address": address, "tel": tel, "other": other or []}})
+
+    def record_page(self, job_id: str, analysis_result: dict):
+        """解析したページ（スニペット・登記・サイト単位の判定を含む）を記録する"""
+        self._write({"type": "page", "job_id": job_id, "page": analysis_result})
+
+    def finish_job(self, job_id: str, result: dict, best_score: float = None, elapsed_seconds: float = None,
+                   status: str = "finished", api_calls: int = None, stop_policy: bool = None):
+        """
+        ジョブの判定を記録する
+        :param result: 標準化済みの判定結果
+        :param status: finished / timed_out / failed
+        :param api_calls: ジョブで使用したGoogle Search APIの呼び出し回数
+        :param stop_policy: 見込みによる打ち切りを適用した場合True（打ち切りの実績の集計から除く）
+        """
+        self._write({"type": "job.finish", "job_id": job_id, "status": status, "result": result,
+                     "best_score": best_score, "elapsed_seconds": elapsed_seconds, "api_calls": api_calls,
+                     "stop_policy": stop_policy})
+
+    def rebuild(self) -> int:
+        """JSONLからSQLiteを作り直す"""
+        if self._conn is None or not self.jsonl_path or not os.path.exists(self.jsonl_path):
+            return 0
+        count = 0
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM pages")
+                self._conn.execute("DELETE FROM jobs")
+            with open(self.jsonl_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError) as e:
+                        # 書き込み途中で中断した行は読み飛ばす
+                        logging.warning(f"判定結果ストアの不正な行を読み飛ばし: {e}")
+                        continue
+                    count += 1
+        return count
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def unverified_jobs(self, since: float = None, until: float = None) -> list:
+        """
+        実在を確認できなかったジョブ（found=0）を新しい順に返す
+        :param since: 開始時刻（UNIX時刻）の下限
+        :param until: 開始時刻の上限
+        """
+        return self._query(
+            "SELECT job_id, started_at, company, address, tel, best_score, timed_out, elapsed_seconds FROM jobs"
+            " WHERE found = 0 AND started_at >= ? AND started_at < ? ORDER BY started_at DESC",
+            (since or 0, until or float("inf"))
+        )
+
+    def pages_by_domain(self, min_score: float = 0.9, since: float = None) -> list:
+        """
+        スコアがmin_scoreを超えたページのドメイン別の件数・最高スコアを件数順に返す
+        """
+        return self._query(
+            "SELECT domain, COUNT(*) AS pages, COUNT(DISTINCT job_id) AS jobs, MAX(score) AS max_score FROM pages"
+            " WHERE score > ? AND scored_at >= ? GROUP BY domain ORDER BY pages DESC, max_score DESC",
+            (min_score, since or 0)
+        )
+
+    def job_pages(self, job_id: str) -> list:
+        """ジョブで解析したページを記録順に返す"""
+        return self._query(
+            "SELECT scored_at, url, score, evidence, search_rank, page_rank, analysis_ms, reasoning FROM pages"
+            " WHERE job_id = ? ORDER BY id", (job_id,)
+        )
+
+    def api_call_stats(self, since: float = None) -> dict:
+        """
+        Google検索を行ったジョブ（api_calls > 0）の1件あたりの呼び出し回数
+        :param since: 開始時刻（UNIX時刻）の下限
+        :return: {"jobs": 件数, "mean": 平均, "found_mean": 実在を確認できたジョブの平均}
+        """
+        rows = self._query(
+            "SELECT COUNT(*) AS jobs, AVG(api_calls) AS mean,"
+            " AVG(CASE WHEN found = 1 THEN api_calls END) AS found_mean FROM jobs"
+            " WHERE api_calls > 0 AND started_at >= ?", (since or 0,)
+        )
+        return rows[0]
+
+    def site_outcomes(self, since: float = None) -> list:
+        """
+        検索結果1件（サイト）ごとのスニペット判定スコア・メインページのスコア・最高スコア
+        見込みによる打ち切りを適用したジョブは巡回が途中までのため含めない
+        :param since: 解析時刻（UNIX時刻）の下限
+        :return: [{"triage_score", "main_score", "best_score"}]
+        """
+        return self._query(
+            "SELECT MAX(p.triage_score) AS triage_score, MAX(CASE WHEN p.page_rank = 0 THEN p.score END) AS main_score,"
+            " MAX(p.score) AS best_score FROM pages p JOIN jobs j ON j.job_id = p.job_id"
+            " WHERE p.search_rank > 0 AND p.evidence IN ('page', 'site') AND p.scored_at >= ?"
+            " AND j.finished_at IS NOT NULL AND COALESCE(j.stop_policy, 0) = 0"
+            " GROUP BY p.job_id, p.search_rank, p.domain", (since or 0,)
+        )
+
+    def latest_verdict(self, company: str, address: str, tel: str, since: float = None):
+        """
+        同じ申請情報（会社名・住所・電話番号）で実在を確認できた直近の判定
+        :param since: 完了時刻（UNIX時刻）の下限
+        :return: {"job_id", "finished_at", "result"（標準化済みの判定結果）}（該当なしの場合はNone）
+        """
+        rows = self._query(
+            "SELECT job_id, finished_at, result FROM jobs WHERE company = ? AND address = ? AND tel = ?"
+            " AND found = 1 AND finished_at >= ? ORDER BY finished_at DESC LIMIT 1",
+            (company, address, tel, since or 0)
+        )
+        if not rows:
+            return None
+        rows[0]["result"] = json.loads(rows[0]["result"])
+        return rows[0]
+
+    def job(self, job_id: str):
+        rows = self._query("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        return rows[0] if rows else None
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_result_store(config):
+    """
+    設定に応じたプロセス内共有のResultStore（RESULT_STORE_ENABLED=falseの場合はNone）
+    :param config: 設定情報
+    """
+    if not config.get("RESULT_STORE_ENABLED", True):
+        return None
+    key = (config.get("RESULT_STORE_JSONL", "results.jsonl"), config.get("RESULT_STORE_DB", "results.db"))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ResultStore(*key)
+        return _stores[key]
+
+def main():
+    parser = argparse.ArgumentParser(description="判定結果ストアの検索")
+    parser.add_argument("--jsonl", default="results.jsonl", help="JSONLファイル")
+    parser.add_argument("--db", default="results.db", help="SQLiteファイル")
+    sub = parser.add_subparsers(dest="command", required=True)
+    unverified = sub.add_parser("unverified", help="実在を確認できなかった会社")
+    unverified.add_argument("--days", type=float, default=7, help="直近の日数")
+    domains = sub.add_parser("domains", help="高スコアページのドメイン別件数")
+    domains.add_argument("--min-score", type=float, default=0.9)
+    domains.add_argument("--days", type=float, default=None, help="直近の日数（省略時は全期間）")
+    job = sub.add_parser("job", help="ジョブの判定と解析したページ")
+    job.add_argument("job_id")
+    sub.add_parser("rebuild", help="JSONLからSQLiteを再構築")
+    args = parser.parse_args()
+
+    store = ResultStore(args.jsonl, args.db)
+    try:
+        if args.command == "rebuild":
+            print(f"{store.rebuild()}件のレコードから再構築")
+        elif args.command == "unverified":
+            for row in store.unverified_jobs(since=time.time() - args.days * 86400):
+                started = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["started_at"]))
+                print(f"{started} {row['job_id']} {row['company']} {row['address']} {row['tel']}"
+                      f" 最高スコア={row['best_score']}{' (時間切れ)' if row['timed_out'] else ''}")
+        elif args.command == "domains":
+            since = time.time() - args.days * 86400 if args.days else None
+            for row in store.pages_by_domain(args.min_score, since=since):
+                print(f"{row['domain']}\t{row['pages']}ページ\t{row['jobs']}ジョブ\t最高{row['max_score']:.3f}")
+        else:
+            print(json.dumps({"job": store.job(args.job_id), "pages": store.job_pages(args.job_id)},
+                             ensure_ascii=False, indent=2))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
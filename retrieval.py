@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from address_normalizer import AddressMatcher, EXACT, BLOCK
+from company_name import CompanyNameMatcher
+from triage import extract_phone_numbers
+from utils import http_request, JobInterruptedException
+
+# 文の区切り（改行・句点）
+_SENTENCE_END = re.compile(r"(?<=[。！？!?])|\n+")
+_SPACES = re.compile(r"[ \t　]+")
+
+@dataclass
+class Chunk:
+    """サイト内のページ本文の断片"""
+    url: str
+    title: str
+    text: str
+    score: float = 0.0
+
+def chunk_text(text: str, chunk_chars: int = 400, overlap: int = 80) -> list:
+    """
+    本文を文単位でまとめてchunk_chars文字程度の断片に分割する（前の断片の末尾overlap文字を重ねる）
+    :return: 断片の文字列のリスト
+    """
+    chunks = []
+    current = ""
+    overlap = min(overlap, chunk_chars // 2)
+    for sentence in _SENTENCE_END.split(text or ""):
+        sentence = _SPACES.sub(" ", sentence).strip()
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) > chunk_chars:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else ""
+        # 1文がchunk_charsを超える場合は文の途中で区切る
+        while len(current) + len(sentence) > chunk_chars:
+            cut = chunk_chars - len(current)
+            chunks.append(current + sentence[:cut])
+            current = sentence[max(0, cut - overlap):cut] if overlap else ""
+            sentence = sentence[cut:]
+        current += sentence
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+class EmbeddingCache:
+    """
+    埋め込みベクトルのキャッシュ（SQLite、モデル名と本文のハッシュをキーにfloat32で保存）
+    ナビゲーション・フッター等、同じサイトで繰り返し現れる断片は再計算しない
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: SQLiteファイル
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha1(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts) -> dict:
+        """
+        :return: {本文: ベクトル(bytes)}（キャッシュにあるもののみ）
+        """
+        keys = {self.key(model, text): text for text in texts}
+        found = {}
+        with self._lock:
+            items = list(keys.items())
+            for start in range(0, len(items), 500):
+                batch = items[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    [k for k, _ in batch]
+                ).fetchall()
+                for key, vector in rows:
+                    found[keys[key]] = vector
+        return found
+
+    def put_many(self, model: str, vectors: dict):
+        """
+        :param vectors: {本文: ベクトル(bytes)}
+        """
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                                   [(self.key(model, text), vector) for text, vector in vectors.items()])
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+class OllamaEmbedder:
+    """Ollamaの埋め込みAPI（/api/embed）で本文をベクトル化する（キャッシュ・バッチ処理付き）"""
+
+    def __init__(self, url: str, model: str, cache: EmbeddingCache = None, job=None, batch_size: int = 32):
+        """
+        :param url: 埋め込みAPIのエンドポイント（例: http://localhost:11434/api/embed）
+        :param model: 埋め込みモデル名（例: nomic-embed-text）
+        :param cache: 埋め込みキャッシュ（Noneの場合はキャッシュしない）
+        :param job: ジョブコンテキスト（残り時間をタイムアウトの上限とする）
+        :param batch_size: 1回のAPI呼び出しでベクトル化する断片数
+        """
+        self.url = url
+        self.model = model
+        self.cache = cache
+        self.job = job
+        self.batch_size = batch_size
+
+    def _request(self, texts: list) -> list:
+        deadline = self.job.deadline if self.job is not None else None
+        response = http_request("POST", self.url, deadline=deadline, timeout=60,
+                                json={"model": self.model, "input": texts})
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def embed(self, texts: list):
+        """
+        本文のリストをL2正規化したベクトルの行列にする
+        :return: numpy.ndarray (len(texts), 次元数) float32
+        """
+        import numpy as np
+
+        cached = self.cache.get_many(self.model, texts) if self.cache is not None else {}
+        vectors = {text: np.frombuffer(vector, dtype=np.float32) for text, vector in cached.items()}
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        fresh = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            for text, embedding in zip(batch, self._request(batch)):
+                vector = np.asarray(embedding, dtype=np.float32)
+                vectors[text] = vector
+                fresh[text] = vector.tobytes()
+        if fresh and self.cache is not None:
+            self.cache.put_many(self.model, fresh)
+        logging.debug(f"埋め込み: {len(texts)}件（キャッシュ{len(cached)}件・新規{len(missing)}件）")
+
+        matrix = np.vstack([vectors[text] for text in texts]) if texts else np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+class SiteRetriever:
+    """
+    1サイト分の巡回ページを断片に分割し、申請情報に関連の深い断片を選ぶ
+    埋め込みのコサイン類似度（申請情報の各項目との最大値）に、会社名・住所・電話番号の一致による加点を加えて順位付けする
+    埋め込みAPIが使えない場合は加点のみで順位付けする
+    """
+
+    # 申請情報の項目が断片に現れた場合の加点
+    LEXICAL_BONUS = 0.2
+
+    def __init__(self, application_info, embedder: OllamaEmbedder = None, top_k: int = 8,
+                 chunk_chars: int = 400, address_index=None):
+        """
+        :param application_info: 申請情報リスト [会社名, 住所, 電話番号, その他...]
+        :param embedder: 埋め込み（Noneの場合は加点のみで順位付け）
+        :param top_k: 解析に使う断片数
+        :param chunk_chars: 断片の文字数
+        :param address_index: 住所照合に使う市区町村インデックス
+        """
+        self.application_info = application_info
+        self.embedder = embedder
+        self.top_k = top_k
+        self.chunk_chars = chunk_chars
+        company = application_info[0] if len(application_info) > 0 else ""
+        address = application_info[1] if len(application_info) > 1 else ""
+        tel = application_info[2] if len(application_info) > 2 else ""
+        self.name_matcher = CompanyNameMatcher(company, application_info[3:])
+        self.address_matcher = AddressMatcher(address, address_index)
+        self.tel = re.sub(r"\D", "", tel or "")
+        self.queries = [q for q in (company, address, f"電話番号 {tel}" if tel else "") if q]
+        self.chunks = []
+        self.urls = []
+
+    def add_page(self, page):
+        """巡回したページ（PageRecord）を断片にして保持する（本文は保持しない）"""
+        url = page.get("url", "")
+        title = page.get("title", "")
+        self.urls.append(url)
+        for text in chunk_text(page.get("content", ""), self.chunk_chars):
+            self.chunks.append(Chunk(url, title, text))
+
+    def _lexical_bonus(self, text: str) -> float:
+        bonus = 0.0
+        if self.name_matcher.match(text) is not None:
+            bonus += self.LEXICAL_BONUS
+        if self.address_matcher.match(text) in (EXACT, BLOCK):
+            bonus += self.LEXICAL_BONUS
+        if len(self.tel) >= 9 and self.tel in extract_phone_numbers(text):
+            bonus += self.LEXICAL_BONUS
+        return bonus
+
+    def top_chunks(self) -> list:
+        """
+        関連の深い断片を最大top_k件、スコア順に返す
+        :return: Chunkのリスト
+        """
+        if not self.chunks:
+            return []
+        for chunk in self.chunks:
+            chunk.score = self._lexical_bonus(chunk.text)
+        if self.embedder is not None and self.queries:
+            try:
+                similarity = self._similarity()
+                for chunk, value in zip(self.chunks, similarity):
+                    chunk.score += float(value)
+            except JobInterruptedException:
+                raise
+            except Exception as e:
+                logging.warning(f"埋め込みによる断片検索に失敗（会社名・住所・電話番号の一致のみで選択）: {e}")
+        # 複数ページに共通の断片（ヘッダー・フッター等）は1件だけ残す
+        selected = []
+        seen = set()
+        for chunk in sorted(self.chunks, key=lambda c: c.score, reverse=True):
+            if chunk.text in seen:
+                continue
+            seen.add(chunk.text)
+            selected.append(chunk)
+            if len(selected) >= self.top_k:
+                break
+        return selected
+
+    def _similarity(self):
+        """各断片と申請情報の各項目のコサイン類似度の最大値（断片数のベクトル）"""
+        import numpy as np
+
+        # 同じ本文の断片（共通ナビゲーション等）は1回だけベクトル化する
+        texts = list(dict.fromkeys(chunk.text for chunk in self.chunks))
+        matrix = self.embedder.embed(texts)
+        query = self.embedder.embed(self.queries)
+        best = (matrix @ query.T).max(axis=1)
+        position = {text: n for n, text in enumerate(texts)}
+        return best[np.fromiter((position[chunk.text] for chunk in self.chunks), dtype=np.intp, count=len(self.chunks))]
+
+    def build_context(self, chunks: list) -> str:
+        """選んだ断片をページ単位にまとめた解析用の本文にする（サイト内の出現順）"""
+        order = {url: n for n, url in enumerate(self.urls)}
+        by_url = {}
+        for chunk in sorted(chunks, key=lambda c: order.get(c.url, 0)):
+            by_url.setdefault((chunk.url, chunk.title), []).append(chunk.text)
+        return "\n\n".join(f"[{title} {url}]\n" + "\n…\n".join(texts) for (url, title), texts in by_url.items())
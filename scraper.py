@@ -1,14 +1,78 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from urllib.robotparser import RobotFileParser
+from urllib.parse import urljoin, urlparse, urldefrag
 import logging
-import time
+from utils import http_request, JobInterruptedException
+from host_scheduler import get_host_scheduler
+from page_record import PageRecord
 
 # robots.txtキャッシュ（ドメインごと）
 _robots_cache = {}
 
-def check_robots_txt(url, user_agent="*", timeout=5):
+def _fetch_robots_parser(robots_url, user_agent, timeout, deadline=None):
+    """
+    robots.txtを取得して解析済みのRobotFileParserを返す
+    RobotFileParser.read()はタイムアウト指定ができないため、http_requestで取得してparseする
+    （ステータスの扱いはRobotFileParser.read()と同等）
+    """
+    # urllib.robotparserはurllib.requestを読み込むため、初回のrobots.txt取得時にimport
+    from urllib.robotparser import RobotFileParser
+    rp = RobotFileParser()
+    rp.set_url(robots_url)
+    response = http_request("GET", robots_url, deadline=deadline, timeout=timeout,
+                            headers={'User-Agent': user_agent})
+    if response.status_code in (401, 403):
+        rp.disallow_all = True
+    elif 400 <= response.status_code < 500:
+        rp.allow_all = True
+    else:
+        response.raise_for_status()
+        lines = response.text.splitlines()
+        rp.parse(lines)
+        # Crawl-delayがあればホストごとのアクセス間隔の下限とする
+        crawl_delay = parse_crawl_delay(lines, user_agent)
+        if crawl_delay:
+            get_host_scheduler().set_crawl_delay(urlparse(robots_url).netloc, crawl_delay)
+    return rp
+
+def parse_crawl_delay(lines, user_agent):
+    """
+    robots.txtからUser-Agentに該当するCrawl-delay（秒）を取得する
+    RobotFileParser.crawl_delay()は整数しか解釈しないため、小数（例: 0.5）も扱えるよう自前で解析する
+    グループの選択はRobotFileParserと同じく、User-Agentの製品名を含む最初のグループ、なければ「*」のグループ
+    
+    Returns:
+        float: Crawl-delay（秒）。指定がない場合はNone
+    """
+    product = user_agent.split('/')[0].lower()
+    delays = {}
+    agents = []
+    in_rules = False
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if ':' not in line:
+            continue
+        key, value = (part.strip() for part in line.split(':', 1))
+        key = key.lower()
+        if key == 'user-agent':
+            # 規則行の後のUser-agentは新しいグループの開始
+            if in_rules:
+                agents = []
+                in_rules = False
+            agents.append(value.lower())
+        elif key in ('allow', 'disallow', 'crawl-delay', 'request-rate'):
+            in_rules = True
+            if key == 'crawl-delay':
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+                for agent in agents:
+                    delays.setdefault(agent, delay)
+    for agent, delay in delays.items():
+        if agent != '*' and agent in product:
+            return delay
+    return delays.get('*')
+
+def check_robots_txt(url, user_agent="*", timeout=5, job=None):
     """
     指定URLに対してrobots.txtをチェックし、スクレイピング許可を判定
     
@@ -16,6 +80,7 @@ def check_robots_txt(url, user_agent="*", timeout=5):
         url (str): チェック対象のURL
         user_agent (str): User-Agent文字列
         timeout (int): robots.txt取得のタイムアウト秒数
+        job (JobContext): ジョブコンテキスト（残り時間をタイムアウトの上限とする）
     
     Returns:
         bool: スクレイピング許可の場合True、禁止の場合False
@@ -30,13 +95,14 @@ def check_robots_txt(url, user_agent="*", timeout=5):
         else:
             # robots.txtを取得・解析
             robots_url = urljoin(domain, '/robots.txt')
-            rp = RobotFileParser()
-            rp.set_url(robots_url)
             
             try:
-                rp.read()
+                rp = _fetch_robots_parser(robots_url, user_agent, timeout,
+                                          job.deadline if job is not None else None)
                 _robots_cache[domain] = rp
                 logging.info(f"robots.txt取得成功: {robots_url}")
+            except JobInterruptedException:
+                raise
             except Exception as e:
                 # robots.txt取得失敗時は許可として扱う
                 logging.warning(f"robots.txt取得失敗: {robots_url} - {e}")
@@ -57,43 +123,64 @@ def check_robots_txt(url, user_agent="*", timeout=5):
             
         return can_fetch
         
+    except JobInterruptedException:
+        raise
     except Exception as e:
         # エラー時は許可として扱う
         logging.warning(f"robots.txtチェックエラー: {url} - {e}")
         return True
 
-def scrape_page(url, timeout=15, user_agent=None):
+def robots_sitemaps(url, user_agent="*", job=None):
+    """
+    robots.txtのSitemap行に記載されたサイトマップのURLを返す（robots.txtは取得済みのキャッシュを使う）
+    
+    Returns:
+        list[str]: サイトマップのURL（記載がない・robots.txtが取得できない場合は空）
+    """
+    check_robots_txt(url, user_agent, job=job)
+    parsed_url = urlparse(url)
+    domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    rp = _robots_cache.get(domain)
+    if rp is None:
+        return []
+    return [urljoin(domain, sitemap) for sitemap in (rp.site_maps() or [])]
+
+def scrape_page(url, timeout=15, user_agent=None, job=None, compress_body=False, url_pool=None, min_interval=None):
     """
     指定URLのHTMLからタイトル・本文テキスト・リンクを抽出して返す
-    robots.txtチェック機能付き
+    robots.txtチェックとホストごとのアクセス間隔制御機能付き
     
     Args:
         url (str): スクレイピング対象URL
         timeout (int): HTTPリクエストのタイムアウト秒数
         user_agent (str): User-Agent文字列
+        job (JobContext): ジョブコンテキスト（残り時間をタイムアウトの上限とする）
+        compress_body (bool): 本文をzlib圧縮して保持するか
+        url_pool (dict): 巡回単位のURL共有辞書（複数ページに現れる同じリンクを1つの文字列にまとめる）
+        min_interval (float): 同一ホストへのアクセス間隔の最小値（秒）。Noneの場合はSCRAPER_INTERVAL
     
     Returns:
-        dict: { 'url': url, 'title': title, 'content': content, 'links': links }
+        PageRecord: url, title, content, links（取得失敗時はerror）。dictと同じくpage.get('content')等で参照できる
     """
     # デフォルトUser-Agent設定
     if user_agent is None:
         user_agent = "Mozilla/5.0 (compatible; CompanyVerificationBot/1.0; +http://localhost/robots.txt)"
     
     # robots.txtチェック
-    if not check_robots_txt(url, user_agent):
+    if not check_robots_txt(url, user_agent, job=job):
         logging.warning(f"robots.txtによりスクレイピング禁止: {url}")
-        return {
-            'url': url, 
-            'title': '', 
-            'content': '', 
-            'links': [],
-            'error': 'robots.txt disallowed'
-        }
+        return PageRecord(url, error='robots.txt disallowed')
     
     try:
         headers = {'User-Agent': user_agent}
-        res = requests.get(url, timeout=timeout, headers=headers)
+        deadline = job.deadline if job is not None else None
+        # 同一ホストへのアクセスは間隔・同時接続数を制御し、429/503・接続エラーでは自動的に間隔を広げる
+        with get_host_scheduler().slot(urlparse(url).netloc, job=job, min_interval=min_interval) as ticket:
+            res = http_request("GET", url, deadline=deadline, timeout=timeout, headers=headers)
+            ticket.observe(res)
         res.raise_for_status()
+        # BeautifulSoupは初回のページ解析時にimport（起動時間短縮のため）
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(res.text, 'html.parser')
         title = soup.title.string.strip() if soup.title and soup.title.string else ''
         
@@ -102,46 +189,46 @@ def scrape_page(url, timeout=15, user_agent=None):
             s.decompose()
         content = ' '.join(soup.stripped_strings)
         
-        # リンク抽出
-        links = []
-        for a in soup.find_all('a', href=True):
-            link = urljoin(url, a['href'])
-            links.append(link)
+        # リンク抽出（フラグメントを除去し、同一ページへのリンクを1件にまとめる）
+        links = (urldefrag(urljoin(url, a['href']))[0] for a in soup.find_all('a', href=True))
+        page = PageRecord(url, title=title, content=content, links=links, compress=compress_body, url_pool=url_pool)
         
         logging.info(f"スクレイピング成功: {url} (タイトル: {title[:50]}...)")
         
-        return {
-            'url': url, 
-            'title': title, 
-            'content': content,
-            'links': links
-        }
+        return page
+    except JobInterruptedException:
+        raise
     except Exception as e:
         logging.error(f"スクレイピングエラー: {url} - {e}")
-        return {
-            'url': url, 
-            'title': '', 
-            'content': '', 
-            'links': [],
-            'error': str(e)
-        }
+        return PageRecord(url, error=str(e))
 
-def scrape_recursive(url, depth=1, max_depth=2, visited=None, timeout=15, user_agent=None, scrape_interval=1.0):
+def iter_scrape_recursive(url, max_depth=2, visited=None, timeout=15, user_agent=None, scrape_interval=1.0,
+                          job=None, url_index=None, max_pages=None, compress_body=False, first_page=None,
+                          sitemap_seeds=0):
     """
-    指定URLから深度max_depthまで再帰的にリンクをたどり、各ページのタイトル・本文を収集
-    robots.txtチェックとアクセス間隔制御機能付き
+    指定URLから深度max_depthまでリンクをたどり、取得したページを1件ずつ返すイテレータ
+    呼び出し側は取得済みのページから順に解析でき、close()（またはループ脱出）で巡回を即時停止できる。
+    返したページの本文・リンクはイテレータ側で保持しないため、解析後に破棄すればメモリは巡回予定のURL分のみとなる
+    robots.txtチェックとアクセス間隔制御機能付き（間隔はホストごとにHostSchedulerが管理し、別ホストへのアクセスは待たない）
     
     Args:
-        url (str): 開始URL
-        depth (int): 現在の深度
+        url (str): 開始URL（深度1）
         max_depth (int): 最大深度
-        visited (set): 巡回済みURL集合
+        visited (set): 巡回済みURL集合（呼び出し側と共有する場合に指定）
         timeout (int): HTTPリクエストのタイムアウト秒数
         user_agent (str): User-Agent文字列
-        scrape_interval (float): スクレイピング間隔（秒）
+        scrape_interval (float): 同一ホストへのスクレイピング間隔の最小値（秒）。robots.txtのCrawl-delayがあればそちらを優先
+        job (JobContext): ジョブコンテキスト（早期終了・期限切れ時は例外で打ち切り）
+        url_index (DomainReputationIndex): URL評価インデックス（除外URLは取得せず、優先URLから巡回）
+        max_pages (int): 取得する最大ページ数（Noneの場合は無制限）
+        compress_body (bool): 本文をzlib圧縮して保持するか
+        first_page (PageRecord): 取得済みの開始URLのページ（先読み済みの場合。再取得しない）
+        sitemap_seeds (int): 開始URLの次に巡回するサイトマップ上の会社概要ページ候補の数（0の場合はサイトマップを読まない）。
+            開始URLのページを解析した後に呼び出し側が巡回を続ける場合のみサイトマップを取得し、候補はリンクより先に深度2として巡回する。
+            max_depthが1（メインページのみ）の場合も候補は取得する（候補のリンクはたどらない）
         
-    Returns:
-        list[dict]: 各ページの{'url', 'title', 'content', 'links'}
+    Yields:
+        PageRecord: 各ページのurl, title, content, links（取得失敗時はerror）
     """
     if visited is None:
         visited = set()
@@ -149,43 +236,116 @@ def scrape_recursive(url, depth=1, max_depth=2, visited=None, timeout=15, user_a
     if user_agent is None:
         user_agent = "Mozilla/5.0 (compatible; CompanyVerificationBot/1.0; +http://localhost/robots.txt)"
     
-    results = []
+    # 深さ優先で巡回（スタックの末尾から取り出す）。queuedで巡回予定URLの重複を防ぐ
+    frontier = [(url, 1)]
+    queued = {url}
+    # 巡回中に複数ページで現れるリンク（ナビゲーション等）を1つの文字列として共有する
+    url_pool = {}
+    fetched = 0
     
-    if url in visited or depth > max_depth:
-        return results
-    
-    visited.add(url)
-    
-    # アクセス間隔制御（初回以外）
-    if len(visited) > 1:
-        time.sleep(scrape_interval)
-        logging.debug(f"スクレイピング間隔待機: {scrape_interval}秒")
-    
-    page = scrape_page(url, timeout=timeout, user_agent=user_agent)
-    results.append(page)
-    
-    # 深度制御: max_depthまで
-    if depth < max_depth and page.get('content') and 'error' not in page:
-        try:
-            # aタグのhrefから同一ドメインのリンクのみ抽出
-            base = urlparse(url).netloc
-            links = set()
-            for link in page.get('links', []):
-                if urlparse(link).netloc == base and link not in visited:
-                    # robots.txtチェック済みリンクのみ追加
-                    if check_robots_txt(link, user_agent):
-                        links.add(link)
-                    else:
-                        logging.info(f"robots.txtにより除外: {link}")
-            
-            for link in links:
-                results.extend(scrape_recursive(
-                    link, depth+1, max_depth, visited, timeout, user_agent, scrape_interval
-                ))
-        except Exception as e:
-            logging.error(f"再帰スクレイピングエラー: {url} - {e}")
+    while frontier:
+        if max_pages is not None and fetched >= max_pages:
+            logging.info(f"最大ページ数({max_pages})に達したため巡回を終了: {url}")
+            return
+        
+        page_url, depth = frontier.pop()
+        if page_url in visited or depth > max_depth:
+            continue
+        visited.add(page_url)
+        
+        if fetched == 0 and first_page is not None and page_url == url:
+            page = first_page
+        else:
+            page = scrape_page(page_url, timeout=timeout, user_agent=user_agent, job=job,
+                               compress_body=compress_body, url_pool=url_pool, min_interval=scrape_interval)
+        fetched += 1
+        
+        # 展開に必要なリンクだけを保持し、ページ本体は呼び出し側に渡す
+        expandable = depth < max_depth and page.content_length > 0 and 'error' not in page
+        page_links = page.links if expandable else ()
+        seed_sitemap = sitemap_seeds > 0 and fetched == 1 and 'error' not in page
+        yield page
+        
+        # 深度制御: max_depthまで（サイトマップの候補はリンクより先に巡回するよう後から積む）
+        if expandable:
+            _push_links(page_url, depth, page_links, frontier, visited, queued, url_index, user_agent, job)
+        if seed_sitemap:
+            _push_sitemap_seeds(url, min(2, max_depth), sitemap_seeds, frontier, visited, queued, url_index,
+                                user_agent, job)
+
+def _push_sitemap_seeds(url, depth, limit, frontier, visited, queued, url_index, user_agent, job):
+    """サイトマップ上の会社概要ページ候補を深度depthとして巡回予定の先頭に積む（リンクより先に巡回する）"""
+    try:
+        from sitemap import get_sitemap_discovery
+        seeds = [
+            link for link in get_sitemap_discovery().discover(url, limit=limit, job=job)
+            if link not in visited and link not in queued
+        ]
+        if url_index is not None:
+            seeds = url_index.filter_urls(seeds)
+        seeds = [link for link in seeds if check_robots_txt(link, user_agent, job=job)]
+        for link in reversed(seeds):
+            queued.add(link)
+            frontier.append((link, depth))
+        if seeds:
+            logging.info(f"サイトマップの会社概要ページ候補から巡回: {', '.join(seeds)}")
+    except JobInterruptedException:
+        raise
+    except Exception as e:
+        logging.warning(f"サイトマップからの候補取得エラー: {url} - {e}")
+
+def _push_links(page_url, depth, page_links, frontier, visited, queued, url_index, user_agent, job):
+    """ページ内の同一ドメインのリンクを深度depth+1として巡回予定に積む"""
+    try:
+        # aタグのhrefから同一ドメインのリンクのみ抽出
+        base = urlparse(page_url).netloc
+        candidates = [
+            link for link in page_links
+            if urlparse(link).netloc == base and link not in visited and link not in queued
+        ]
+        # 除外URLを取り除き、会社概要等の優先URLから巡回する
+        if url_index is not None:
+            candidates = url_index.filter_urls(candidates)
+        links = []
+        for link in candidates:
+            # robots.txtチェック済みリンクのみ追加
+            if check_robots_txt(link, user_agent, job=job):
+                links.append(link)
+            else:
+                logging.info(f"robots.txtにより除外: {link}")
+        
+        # 先頭のリンクから巡回するよう逆順に積む
+        for link in reversed(links):
+            queued.add(link)
+            frontier.append((link, depth + 1))
+    except JobInterruptedException:
+        raise
+    except Exception as e:
+        logging.error(f"再帰スクレイピングエラー: {page_url} - {e}")
+
+def scrape_recursive(url, depth=1, max_depth=2, visited=None, timeout=15, user_agent=None, scrape_interval=1.0, job=None, url_index=None):
+    """
+    指定URLから深度max_depthまで再帰的にリンクをたどり、各ページのタイトル・本文を収集
+    （iter_scrape_recursiveの結果をまとめて返す互換用関数）
     
-    return results
+    Args:
+        url (str): 開始URL
+        depth (int): 開始URLの深度
+        max_depth (int): 最大深度
+        visited (set): 巡回済みURL集合
+        timeout (int): HTTPリクエストのタイムアウト秒数
+        user_agent (str): User-Agent文字列
+        scrape_interval (float): スクレイピング間隔（秒）
+        job (JobContext): ジョブコンテキスト（早期終了・期限切れ時は例外で打ち切り）
+        url_index (DomainReputationIndex): URL評価インデックス（除外URLは取得せず、優先URLから巡回）
+        
+    Returns:
+        list[PageRecord]: 各ページのurl, title, content, links
+    """
+    return list(iter_scrape_recursive(
+        url, max_depth=max_depth - depth + 1, visited=visited, timeout=timeout, user_agent=user_agent,
+        scrape_interval=scrape_interval, job=job, url_index=url_index
+    ))
 
 if __name__ == "__main__":
     # テスト用
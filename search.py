@@ -1,64 +1,257 @@
-import requests
+import contextvars
+import math
 import os
-import time
 import logging
-from utils import enhanced_check_api_limit, record_api_call, update_api_usage
+import random
+import time
+from urllib.parse import urldefrag
+from utils import reserve_api_call, get_current_api_usage, http_request, JobInterruptedException, QuotaExhaustedError
 from config import load_config
+from event_log import log_event
+
+CSE_URL = "https://www.googleapis.com/customsearch/v1"
+# 使用するフィールドのみ取得する（部分レスポンス）。nextPageは続きのページの有無の判定に使う
+CSE_FIELDS = "items(title,link,snippet),queries(nextPage(startIndex))"
+# 1リクエストで取得できる最大件数と、start指定で取得できる結果の上限
+CSE_PAGE_SIZE = 10
+CSE_MAX_RESULTS = 100
+# 再試行するHTTPステータス（レート制限・一時的なサーバーエラー）
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+# 403のうち再試行するエラー理由（短時間のレート制限。日次上限のdailyLimitExceeded等は再試行しない）
+RETRYABLE_403_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# 403のうち日次上限の超過を示すエラー理由（ローカルの使用件数の記録とGoogle側の集計がずれた場合等）
+QUOTA_403_REASONS = ("dailyLimitExceeded", "quotaExceeded")
+
+def _error_reasons(response) -> list:
+    """エラーレスポンスのerror.errors[].reasonの一覧"""
+    try:
+        errors = response.json().get("error", {}).get("errors", [])
+    except (ValueError, AttributeError):
+        return []
+    return [err.get("reason") for err in errors if isinstance(err, dict)]
+
+def _is_retryable(response):
+    """一時的なエラーで再試行すべきレスポンスかどうか"""
+    if response.status_code in RETRYABLE_STATUS:
+        return True
+    if response.status_code == 403:
+        return any(reason in RETRYABLE_403_REASONS for reason in _error_reasons(response))
+    return False
+
+def _retry_allowed(config) -> bool:
+    """
+    再試行してよいか（再試行もAPI使用件数を消費するため、当日の残り件数が
+    GOOGLE_API_SPECULATIVE_RESERVE以下の場合は再試行せず、残りを新しいクエリに使う）
+    """
+    daily_limit = int(config.get("GOOGLE_API_DAILY_LIMIT", 100))
+    reserve = int(config.get("GOOGLE_API_SPECULATIVE_RESERVE", 10))
+    return daily_limit - get_current_api_usage() > reserve
+
+def _retry_after_seconds(response):
+    """
+    Retry-Afterヘッダーの待機秒数を返す（秒数・HTTP日付のどちらにも対応。なければNone）
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def _backoff_delay(retry, base_delay, retry_after=None):
+    """
+    再試行までの待機秒数（指数バックオフ + ジッター。Retry-Afterの指定があればそれ以上待つ）
+    :param retry: 再試行の回数（1始まり）
+    :param base_delay: 基準の待機秒数
+    :param retry_after: サーバーが指定した待機秒数
+    """
+    delay = base_delay * (2 ** (retry - 1)) * random.uniform(0.5, 1.5)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
 
-def google_search(query, api_key, cse_id, num=8, config=None):
+def _fetch_search_page(params, config, deadline, query):
+    """
+    検索結果を1ページ取得する（一時的なエラーは指数バックオフで再試行）
+    再試行も1回のAPI呼び出しとして使用件数に記録する。呼び出しごとの所要時間・受信バイト数をsearch.callイベントに記録
+    :return: レスポンスのJSON
+    :raises QuotaExhaustedError: Googleが日次上限の超過（403 dailyLimitExceeded/quotaExceeded）を返した場合
+    """
+    import requests
+    retries = int(config.get("GOOGLE_API_RETRY_ATTEMPTS", 3))
+    base_delay = float(config.get("GOOGLE_API_RETRY_DELAY", 1.0))
+    logger = logging.getLogger()
+
+    for attempt in range(retries + 1):
+        # API制限チェックと呼び出し記録（レート制限用およびAPI使用件数更新）
+        reserve_api_call(config, deadline)
+        response = None
+        error = None
+        started = time.monotonic()
+        try:
+            response = http_request("GET", CSE_URL, deadline=deadline, timeout=30, params=params)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        latency_ms = round((time.monotonic() - started) * 1000, 1)
+        status = response.status_code if response is not None else None
+        size = len(response.content) if response is not None else 0
+        log_event(logger, "search.call", f"Google検索API呼び出し: status={status}, {latency_ms}ms, {size}bytes",
+                  query=query, start=params.get("start", 1), num=params["num"], attempt=attempt + 1, status=status,
+                  latency_ms=latency_ms, bytes=size, error=str(error) if error is not None else None)
+
+        if response is not None and response.status_code == 403:
+            reasons = [reason for reason in _error_reasons(response) if reason in QUOTA_403_REASONS]
+            if reasons:
+                raise QuotaExhaustedError(f"Google Search API制限エラー: Googleが日次上限の超過を返しました（{reasons[0]}）")
+        if response is not None and not _is_retryable(response):
+            response.raise_for_status()
+            return response.json()
+        if attempt < retries and not _retry_allowed(config):
+            logging.warning(f"API使用件数の残りが少ないため再試行しません（{status or error}）")
+            retries = attempt
+        if attempt >= retries:
+            if response is not None:
+                response.raise_for_status()
+            raise error
+
+        delay = _backoff_delay(attempt + 1, base_delay, _retry_after_seconds(response))
+        logging.warning(f"Google検索APIの一時的なエラー（{status or error}）。{delay:.1f}秒後に再試行します ({attempt + 1}/{retries})")
+        if deadline is not None:
+            deadline.sleep(delay)
+        else:
+            time.sleep(delay)
+
+def google_search(query, api_key, cse_id, num=8, config=None, job=None):
     """
     Google Custom Search APIで検索し、結果URLリストを返す
     強化されたAPI使用件数管理とレート制限を実装
+    job（JobContext）指定時はジョブの残り時間をタイムアウトとし、レート制限待機もキャンセル可能とする
+    ・一時的なエラー（429・5xx・接続エラー）はGOOGLE_API_RETRY_ATTEMPTS回まで再試行（Retry-Afterを優先）
+    ・title/link/snippetのみの部分レスポンスを取得
+    ・numが10件を超える場合はstartを指定して複数ページ取得（最大100件。1ページごとにAPI使用件数1件）
     """
+    deadline = job.deadline if job is not None else None
     if config is None:
-        config = load_config()
-    
-    # 強化されたAPI制限チェック
-    can_execute, error_msg, wait_time = enhanced_check_api_limit(required_calls=1, config=config)
+        config = job.config if job is not None else load_config()
     
-    if not can_execute:
-        raise ValueError(f"Google Search API制限エラー: {error_msg}")
-    
-    # 待機が必要な場合
-    if wait_time > 0:
-        auto_pause = config.get("GOOGLE_API_AUTO_PAUSE", "true").lower() == "true"
-        if auto_pause:
-            logging.info(f"レート制限により{wait_time:.1f}秒待機します...")
-            time.sleep(wait_time)
-        else:
-            logging.warning(f"レート制限検出: {wait_time:.1f}秒の待機が推奨されます")
-      # API呼び出し記録（レート制限用およびAPI使用件数更新）
-    record_api_call(config)
-    
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": api_key,
-        "cx": cse_id,
-        "q": query,
-        "num": num
-    }
+    num = max(1, min(int(num), CSE_MAX_RESULTS))
+    results = []
+    start = 1
     
     try:
         logging.info(f"Google検索実行: クエリ='{query}', 最大件数={num}")
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
-        results = []
-        for item in data.get("items", []):
-            results.append({
-                "title": item.get("title"),
-                "link": item.get("link"),
-                "snippet": item.get("snippet")
-            })
+        while len(results) < num:
+            page_size = min(CSE_PAGE_SIZE, num - len(results), CSE_MAX_RESULTS - start + 1)
+            params = {
+                "key": api_key,
+                "cx": cse_id,
+                "q": query,
+                "num": page_size,
+                "fields": CSE_FIELDS
+            }
+            if start > 1:
+                params["start"] = start
+            data = _fetch_search_page(params, config, deadline, query)
+            
+            items = data.get("items", [])
+            for item in items:
+                results.append({
+                    "title": item.get("title"),
+                    "link": item.get("link"),
+                    "snippet": item.get("snippet")
+                })
+            
+            # 続きのページがない場合は終了
+            next_pages = data.get("queries", {}).get("nextPage")
+            if len(items) < page_size or not next_pages:
+                break
+            start = int(next_pages[0].get("startIndex", start + len(items)))
+            if start > CSE_MAX_RESULTS:
+                break
         
         logging.info(f"Google検索完了: {len(results)}件の結果を取得")
-        return results
+        return results[:num]
         
-    except requests.exceptions.RequestException as e:
+    except JobInterruptedException:
+        raise
+    except Exception as e:
         logging.error(f"Google検索でエラーが発生: {e}")
         raise
 
+def concurrent_query_allowance(requested, config):
+    """
+    同時に発行してよいクエリ数を返す
+    2件目以降のクエリは1件目で見つかれば不要になる投機的な発行のため、
+    発行後も当日の残り件数がGOOGLE_API_SPECULATIVE_RESERVE以上残る場合のみ許可する
+    （1クエリあたりの使用件数は検索結果10件ごとに1回のAPI呼び出しとして見積もる）
+    :param requested: 同時に発行したいクエリ数
+    :param config: 設定情報
+    :return: 同時に発行するクエリ数（1以上。requested以下）
+    """
+    if requested <= 1:
+        return requested
+    daily_limit = int(config.get("GOOGLE_API_DAILY_LIMIT", 100))
+    reserve = int(config.get("GOOGLE_API_SPECULATIVE_RESERVE", 10))
+    pages_per_query = max(1, math.ceil(int(config.get("GOOGLE_SEARCH_NUM_RESULTS", 3)) / 10))
+    remaining = daily_limit - get_current_api_usage()
+    allowed = max(1, min(requested, (remaining - reserve) // pages_per_query))
+    if allowed < requested:
+        logging.info(f"API残り件数({remaining})により並行発行を{requested}件から{allowed}件に制限")
+    return allowed
+
+def google_search_concurrent(queries, api_key, cse_id, num=8, config=None, job=None):
+    """
+    複数のクエリを並行して検索する（API制限は各呼び出しごとにreserve_api_callで適用）
+    :param queries: [(テンプレートID, クエリ)]
+    :return: [(テンプレートID, クエリ, 検索結果リストまたは例外)]（queriesと同じ順序）
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=max(1, len(queries)), thread_name_prefix="search") as executor:
+        # ログの相関ID（contextvars）を検索スレッドに引き継ぐ
+        futures = [
+            executor.submit(contextvars.copy_context().run, google_search, query, api_key, cse_id, num, config, job)
+            for _, query in queries
+        ]
+        for (template_id, query), future in zip(queries, futures):
+            try:
+                outcomes.append((template_id, query, future.result()))
+            except JobInterruptedException:
+                raise
+            except Exception as e:
+                outcomes.append((template_id, query, e))
+    return outcomes
+
+def merge_search_results(per_query, k=60):
+    """
+    クエリごとの検索結果を重複除去し、1つの順位付きリストにまとめる（Reciprocal Rank Fusion）
+    複数のクエリで上位に現れた結果ほど上位になり、同点の場合は計画順の早いクエリでの順位を優先する
+    :param per_query: [(テンプレートID, クエリ, 検索結果リスト)]（計画順）
+    :param k: 順位の重みの平滑化定数
+    :return: [{"title", "link", "snippet", "template", "query", "hits"}]（templateとqueryは最初に見つけたクエリ）
+    """
+    merged = {}
+    for order, (template_id, query, results) in enumerate(per_query):
+        for rank, item in enumerate(results, 1):
+            link = item.get("link")
+            if not link:
+                continue
+            key = urldefrag(link)[0]
+            if key not in merged:
+                merged[key] = [0.0, (order, rank), dict(item, template=template_id, query=query, hits=0)]
+            entry = merged[key]
+            entry[0] += 1.0 / (k + rank)
+            entry[2]["hits"] += 1
+    ranked = sorted(merged.values(), key=lambda e: (-e[0], e[1]))
+    return [item for _, _, item in ranked]
+
 if __name__ == "__main__":
     # テスト用
     api_key = os.getenv("GOOGLE_API_KEY")
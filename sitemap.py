@@ -0,0 +1,266 @@
+import heapq
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import urljoin, urlparse, unquote
+from utils import http_request, JobInterruptedException
+from host_scheduler import get_host_scheduler
+
+# 会社概要ページらしさの判定（パス・ファイル名に含まれる語と加点）
+PROFILE_KEYWORDS = [
+    (re.compile(r"(会社概要|企業情報|会社案内|企業概要|会社情報)"), 10),
+    (re.compile(r"(gaiyou?|outline|profile|overview)", re.IGNORECASE), 8),
+    (re.compile(r"(company|corporate|about|aboutus|about-us|corporation)", re.IGNORECASE), 5),
+    (re.compile(r"(access|map|アクセス|所在地)", re.IGNORECASE), 3),
+    (re.compile(r"(info|summary|data)", re.IGNORECASE), 1),
+]
+# 会社概要ではない可能性が高いページ（記事・商品・採用・IR資料等）
+NON_PROFILE_KEYWORDS = re.compile(
+    r"(news|topics|blog|column|article|press|release|event|product|item|shop|recruit|career|job|"
+    r"ir/|investor|faq|contact|privacy|policy|sitemap|tag/|category/|page/\d|\d{4}/\d{1,2}/|/\d{6,})",
+    re.IGNORECASE
+)
+# 取得しないファイル
+_NON_HTML = re.compile(r"\.(pdf|jpe?g|png|gif|svg|zip|xlsx?|docx?|pptx?|mp4|mp3|css|js|xml)(\?|$)", re.IGNORECASE)
+# 子サイトマップの優先度（固定ページ用のサイトマップを先に読む）
+_PAGE_SITEMAP = re.compile(r"(page|company|corporate|about|static|main|top)", re.IGNORECASE)
+_POST_SITEMAP = re.compile(r"(post|news|blog|product|item|tag|category|archive|image|video)", re.IGNORECASE)
+
+# 要素名から名前空間を除く
+_LOCAL_NAME = re.compile(r"^\{[^}]*\}")
+
+def profile_score(url: str) -> float:
+    """
+    URLの会社概要ページらしさ（0以下は候補外）
+    パス中の語による加点から記事・商品等の語による減点と階層の深さを差し引く
+    """
+    parsed = urlparse(url)
+    path = unquote(parsed.path or "/")
+    if _NON_HTML.search(path):
+        return 0.0
+    score = 0.0
+    for pattern, weight in PROFILE_KEYWORDS:
+        if pattern.search(path):
+            score += weight
+    if score <= 0:
+        return 0.0
+    if NON_PROFILE_KEYWORDS.search(path + ("?" + parsed.query if parsed.query else "")):
+        score -= 6
+    depth = len([segment for segment in path.split("/") if segment])
+    return score - 0.5 * max(0, depth - 1)
+
+def _child_sitemap_priority(url: str) -> int:
+    if _PAGE_SITEMAP.search(url):
+        return 0
+    if _POST_SITEMAP.search(url):
+        return 2
+    return 1
+
+def _iter_decoded(response, max_bytes: int, block_size: int = 64 * 1024):
+    """
+    レスポンス本文を展開後block_sizeバイト以下の塊で返す（合計max_bytesまで）
+    .xml.gz等、Content-Encodingではなくファイル自体がgzipの場合は先頭のマジックナンバーで判定して展開する
+    """
+    decompressor = None
+    total = 0
+    for block in response.iter_content(block_size):
+        if decompressor is None:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if block[:2] == b"\x1f\x8b" else False
+        while block and total < max_bytes:
+            if decompressor:
+                # 圧縮率の高いサイトマップでも一度に展開する量を抑える
+                chunk = decompressor.decompress(block, min(block_size, max_bytes - total))
+                block = decompressor.unconsumed_tail
+            else:
+                chunk, block = block[:max_bytes - total], b""
+            total += len(chunk)
+            if chunk:
+                yield chunk
+        if total >= max_bytes:
+            return
+
+def iter_sitemap_entries(sitemap_url: str, job=None, user_agent: str = None, timeout: float = 10,
+                         max_bytes: int = 50 * 1024 * 1024):
+    """
+    サイトマップを逐次取得・解析し、記載されたURLを1件ずつ返す（gzip圧縮にも対応）
+    本文全体をメモリに読み込まないため、5万件・50MB規模のサイトマップでも一定のメモリで処理できる
+    :param sitemap_url: サイトマップのURL
+    :param job: ジョブコンテキスト（残り時間をタイムアウトの上限とする）
+    :param user_agent: User-Agent文字列
+    :param timeout: HTTPリクエストのタイムアウト秒数
+    :param max_bytes: 展開後のサイズの上限（超えた分は読まない）
+    :return: ("url", ページURL) または ("sitemap", 子サイトマップURL) のイテレータ
+    """
+    # ElementTreeは初回のサイトマップ解析時にimport（起動時間短縮のため）
+    from xml.etree.ElementTree import XMLPullParser, ParseError
+
+    deadline = job.deadline if job is not None else None
+    headers = {"User-Agent": user_agent} if user_agent else {}
+    with get_host_scheduler().slot(urlparse(sitemap_url).netloc, job=job) as ticket:
+        response = http_request("GET", sitemap_url, deadline=deadline, timeout=timeout, headers=headers, stream=True)
+        ticket.observe(response)
+    try:
+        response.raise_for_status()
+        parser = XMLPullParser(events=("start", "end"))
+        root = None
+        total = 0
+        for block in _iter_decoded(response, max_bytes):
+            if deadline is not None:
+                deadline.check()
+            total += len(block)
+            parser.feed(block)
+            for event, element in parser.read_events():
+                if event == "start":
+                    if root is None:
+                        root = element
+                    continue
+                name = _LOCAL_NAME.sub("", element.tag)
+                if name not in ("url", "sitemap"):
+                    continue
+                loc = next((child.text for child in element if _LOCAL_NAME.sub("", child.tag) == "loc"), None)
+                # 解析済みの要素はルートから外してメモリを一定に保つ
+                root.clear()
+                if loc and loc.strip():
+                    yield ("url" if name == "url" else "sitemap"), urljoin(sitemap_url, loc.strip())
+        if total >= max_bytes:
+            logging.info(f"サイトマップが上限サイズ({max_bytes}バイト)を超えたため以降を省略: {sitemap_url}")
+    except ParseError as e:
+        logging.warning(f"サイトマップ解析エラー: {sitemap_url} - {e}")
+    finally:
+        response.close()
+
+class SitemapDiscovery:
+    """
+    サイトマップから会社概要ページの候補を探す
+    robots.txtのSitemap行（なければ/sitemap.xml）から順に読み、サイトマップインデックスの子サイトマップは
+    固定ページ用のものを優先して読む。同一ホストのURLだけを会社概要ページらしさで順位付けし、上位のみ保持する
+    """
+
+    def __init__(self, max_sitemaps: int = 5, max_urls: int = 50000, timeout: float = 10, user_agent: str = None,
+                 cache_size: int = 1000, cache_ttl: float = 3600):
+        """
+        :param max_sitemaps: 1サイトで読むサイトマップ数の上限（インデックスの子サイトマップを含む）
+        :param max_urls: 1サイトで評価するURL数の上限
+        :param timeout: HTTPリクエストのタイムアウト秒数
+        :param user_agent: User-Agent文字列
+        :param cache_size: 発見結果を保持するホスト数の上限（超えた場合は最も古く参照したホストから破棄）
+        :param cache_ttl: 発見結果の有効期間（秒）
+        """
+        self.max_sitemaps = max_sitemaps
+        self.max_urls = max_urls
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.cache_size = max(1, cache_size)
+        self.cache_ttl = cache_ttl
+        # ホストごとの発見結果（同じサイトが複数の検索結果に現れても読み直さない）。{ホスト: (発見時刻, URLリスト)}
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _cached(self, host: str):
+        """有効期間内の発見結果（なければNone）"""
+        with self._cache_lock:
+            entry = self._cache.get(host)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.cache_ttl:
+                del self._cache[host]
+                return None
+            self._cache.move_to_end(host)
+            return entry[1]
+
+    def _store(self, host: str, ranked: list):
+        with self._cache_lock:
+            self._cache[host] = (time.monotonic(), ranked)
+            self._cache.move_to_end(host)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def discover(self, site_url: str, limit: int = 3, job=None) -> list:
+        """
+        会社概要ページの候補URLを会社概要ページらしさの高い順に返す
+        :param site_url: サイト内のURL（検索結果のURL）
+        :param limit: 返す候補数
+        :param job: ジョブコンテキスト
+        :return: URLのリスト（サイトマップがない・候補がない場合は空）
+        """
+        # robots.txtの取得・Sitemap行の参照はscraperのキャッシュを使う
+        from scraper import robots_sitemaps
+
+        parsed = urlparse(site_url)
+        host = parsed.netloc
+        cached = self._cached(host)
+        if cached is not None:
+            return cached[:limit]
+
+        pending = [(0, 0, url) for url in robots_sitemaps(site_url, self.user_agent or "*", job=job)]
+        if not pending:
+            pending = [(0, 0, f"{parsed.scheme}://{host}/sitemap.xml")]
+        heapq.heapify(pending)
+        seen_sitemaps = {url for _, _, url in pending}
+        best = []  # (score, -order, url) の最小ヒープ（上位keep件を保持）
+        keep = max(limit, 10)
+        read_sitemaps = 0
+        evaluated = 0
+        order = 0
+        while pending and read_sitemaps < self.max_sitemaps and evaluated < self.max_urls:
+            _, _, sitemap_url = heapq.heappop(pending)
+            read_sitemaps += 1
+            try:
+                for kind, url in iter_sitemap_entries(sitemap_url, job=job, user_agent=self.user_agent,
+                                                      timeout=self.timeout):
+                    order += 1
+                    if kind == "sitemap":
+                        if url not in seen_sitemaps:
+                            seen_sitemaps.add(url)
+                            heapq.heappush(pending, (_child_sitemap_priority(url), order, url))
+                        continue
+                    evaluated += 1
+                    if evaluated > self.max_urls:
+                        break
+                    if urlparse(url).netloc != host:
+                        continue
+                    score = profile_score(url)
+                    if score <= 0:
+                        continue
+                    item = (score, -order, url)
+                    if len(best) < keep:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+            except JobInterruptedException:
+                raise
+            except Exception as e:
+                logging.info(f"サイトマップ取得失敗: {sitemap_url} - {e}")
+
+        ranked = [url for _, _, url in sorted(best, reverse=True)]
+        self._store(host, ranked)
+        logging.info(f"サイトマップから会社概要ページ候補{len(ranked)}件を発見: {host}"
+                     f"（サイトマップ{read_sitemaps}件・URL{min(evaluated, self.max_urls)}件を評価）"
+                     + (f" 最上位={ranked[0]}" if ranked else ""))
+        return ranked[:limit]
+
+_discovery = None
+_discovery_lock = threading.Lock()
+
+def get_sitemap_discovery(config=None) -> SitemapDiscovery:
+    """
+    プロセス内で共有するSitemapDiscovery（初回のみ設定から生成）
+    :param config: 設定情報（Noneの場合はload_config()）
+    """
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            if config is None:
+                from config import load_config
+                config = load_config()
+            _discovery = SitemapDiscovery(
+                max_sitemaps=int(config.get("SITEMAP_MAX_FILES", 5)),
+                max_urls=int(config.get("SITEMAP_MAX_URLS", 50000)),
+                user_agent=config.get("SCRAPER_USER_AGENT"),
+                cache_size=int(config.get("SITEMAP_CACHE_SIZE", 1000)),
+                cache_ttl=float(config.get("SITEMAP_CACHE_TTL", 3600))
+            )
+        return _discovery
@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+
+# 検証を終えた理由
+STOP_THRESHOLD = "threshold"              # 閾値以上のページ・スニペットを検出
+STOP_REGISTRY = "registry"                # 法人登記で法人名・所在地を確認
+STOP_QUOTA = "quota_limited"              # API使用枠の不足により検索を行わなかった
+STOP_LOW_PROBABILITY = "low_probability"  # 残りの候補で閾値に達する見込みが下限を下回った
+STOP_TIMED_OUT = "timed_out"              # 処理時間の上限に到達
+STOP_EXHAUSTED = "exhausted"              # 全クエリ・全候補を評価した
+
+# スコア帯の数（0.0〜1.0を等分）
+_BANDS = 5
+
+def _band(score: float) -> int:
+    return min(int(max(score, 0.0) * _BANDS), _BANDS - 1)
+
+class HitRateModel:
+    """
+    検索結果1件（サイト）に閾値以上のページが含まれる確率の推定（判定結果ストアの実績から集計）
+    ・未取得の候補：スニペット判定のスコア帯ごとの的中率
+    ・巡回中のサイト：解析済みページの最高スコア帯ごとの、以降のページでの的中率
+    全体の的中率を事前分布としてstrength件分の重みで平滑化し、件数の少ない帯を補う
+    """
+
+    def __init__(self, threshold: float, strength: float = 5.0):
+        """
+        :param threshold: 一致と判定するスコア（SCORE_THRESHOLD）
+        :param strength: 事前分布の重み（件数）
+        """
+        self.threshold = threshold
+        self.strength = strength
+        self.sites = 0
+        self.hits = 0
+        self.by_triage = [[0, 0] for _ in range(_BANDS)]    # [件数, 的中数]
+        self.by_observed = [[0, 0] for _ in range(_BANDS)]
+
+    def add_site(self, triage_score, main_score, best_score):
+        """
+        サイト1件の実績を加える
+        :param triage_score: スニペット判定のスコア（判定なしの場合はNone）
+        :param main_score: メインページのスコア（解析なしの場合はNone）
+        :param best_score: サイト内の最高スコア
+        """
+        hit = best_score is not None and best_score >= self.threshold
+        self.sites += 1
+        self.hits += hit
+        if triage_score is not None:
+            counts = self.by_triage[_band(triage_score)]
+            counts[0] += 1
+            counts[1] += hit
+        if main_score is not None and main_score < self.threshold:
+            counts = self.by_observed[_band(main_score)]
+            counts[0] += 1
+            counts[1] += hit
+
+    def base_rate(self) -> float:
+        """全体の的中率（ラプラス平滑化済み）"""
+        return (self.hits + 1) / (self.sites + 2)
+
+    def _smoothed(self, counts) -> float:
+        return (counts[1] + self.strength * self.base_rate()) / (counts[0] + self.strength)
+
+    def candidate(self, triage_score=None) -> float:
+        """未取得の候補が的中する確率"""
+        if triage_score is None:
+            return self.base_rate()
+        return self._smoothed(self.by_triage[_band(triage_score)])
+
+    def continuation(self, observed_score: float) -> float:
+        """解析済みページの最高スコアがobserved_scoreのサイトで、以降のページが的中する確率"""
+        return self._smoothed(self.by_observed[_band(observed_score)])
+
+def load_hit_rate_model(store, threshold: float, since: float = None) -> HitRateModel:
+    """
+    判定結果ストアの実績からHitRateModelを作る
+    :param store: result_store.ResultStore
+    :param threshold: 一致と判定するスコア
+    :param since: 集計対象の解析時刻（UNIX時刻）の下限
+    """
+    model = HitRateModel(threshold)
+    for row in store.site_outcomes(since=since):
+        model.add_site(row["triage_score"], row["main_score"], row["best_score"])
+    return model
+
+class StoppingPolicy:
+    """
+    見込みによる打ち切り（1ジョブ分）
+    残りの候補（未取得の検索結果・未実行のクエリ）のいずれかが閾値に達する確率を
+    1 - Π(1 - 各候補の的中率) として見積もり、下限を下回ったら検証を終える。
+    未実行のクエリの的中率はクエリテンプレートの成功率（QueryPlanner）を使う
+    """
+
+    def __init__(self, model: HitRateModel, min_probability: float, query_rates):
+        """
+        :param model: 的中率の推定
+        :param min_probability: 続行する確率の下限
+        :param query_rates: 計画したクエリの順の成功率
+        """
+        self.model = model
+        self.min_probability = min_probability
+        self.query_rates = list(query_rates)
+
+    def remaining_probability(self, candidate_scores, queries_done: int) -> float:
+        """
+        残りの候補のいずれかが的中する確率
+        :param candidate_scores: 未取得の検索結果のスニペット判定スコア（判定なしはNone）
+        :param queries_done: 実行済みのクエリ数
+        """
+        miss = 1.0
+        for score in candidate_scores:
+            miss *= 1 - self.model.candidate(score)
+        for rate in self.query_rates[queries_done:]:
+            miss *= 1 - rate
+        return 1 - miss
+
+    def should_stop_job(self, candidate_scores, queries_done: int) -> tuple:
+        """
+        :return: (打ち切るか, 残りの候補のいずれかが的中する確率)
+        """
+        probability = self.remaining_probability(candidate_scores, queries_done)
+        return probability < self.min_probability, probability
+
+    def should_stop_site(self, observed_score: float) -> tuple:
+        """
+        巡回中のサイトの残りのページを打ち切るか
+        :param observed_score: サイト内で解析済みのページの最高スコア
+        :return: (打ち切るか, 以降のページが的中する確率)
+        """
+        probability = self.model.continuation(observed_score)
+        return probability < self.min_probability, probability
+
+_model = None
+_model_at = 0.0
+_model_lock = threading.Lock()
+
+# 実績の再集計間隔（秒）
+MODEL_TTL = 300.0
+
+def build_stopping_policy(config, query_rates):
+    """
+    設定に従ってジョブの打ち切り方針を作る
+    STOP_POLICY_ENABLED=falseの場合、実績がSTOP_MIN_HISTORY件に満たない場合、
+    STOP_EXPLORE_RATEの割合で抽出したジョブ（打ち切らずに実績を集めるため）はNone
+    :param config: 設定情報
+    :param query_rates: 計画したクエリの順の成功率
+    :return: StoppingPolicy または None
+    """
+    global _model, _model_at
+    if not config.get("STOP_POLICY_ENABLED", True):
+        return None
+    from result_store import get_result_store
+    store = get_result_store(config)
+    if store is None or random.random() < float(config.get("STOP_EXPLORE_RATE", 0.1)):
+        return None
+    min_history = int(config.get("STOP_MIN_HISTORY", 30))
+    with _model_lock:
+        # 実績が足りない間はジョブごとに集計し直す
+        if _model is None or _model.sites < min_history or time.monotonic() - _model_at > MODEL_TTL:
+            since = time.time() - float(config.get("STOP_HISTORY_DAYS", 30)) * 86400
+            _model = load_hit_rate_model(store, float(config.get("SCORE_THRESHOLD", 0.95)), since=since)
+            _model_at = time.monotonic()
+        model = _model
+    if model.sites < min_history:
+        return None
+    return StoppingPolicy(model, float(config.get("STOP_MIN_PROBABILITY", 0.05)), query_rates)
@@ -0,0 +1,36 @@
+from domain_index import DomainReputationIndex
+
+def _index(tmp_path, application_info=None):
+    return DomainReputationIndex(stats_file=str(tmp_path / "domain_reputation.json"), demote_score=0.3,
+                                 demote_min_samples=3, application_info=application_info)
+
+def _crawl(index, host, pages):
+    for n in range(pages):
+        index.record_score(f"https://{host}/page{n}.html", 0.1)
+    index.save()
+
+def test_many_pages_in_one_job_do_not_demote(tmp_path):
+    _crawl(_index(tmp_path), "www.example-shoji.co.jp", 20)
+
+    index = _index(tmp_path)
+    assert not index.is_demoted("https://www.example-shoji.co.jp/company/")
+    assert index._stats["example-shoji.co.jp"] == {"count": 20, "jobs": 1, "max_score": 0.1}
+
+def test_demoted_after_separate_jobs(tmp_path):
+    for _ in range(3):
+        _crawl(_index(tmp_path), "www.example-shoji.co.jp", 2)
+
+    assert _index(tmp_path).is_demoted("https://www.example-shoji.co.jp/company/")
+
+def test_applicant_domain_is_never_demoted(tmp_path):
+    for _ in range(3):
+        _crawl(_index(tmp_path), "www.example-shoji.co.jp", 2)
+        _crawl(_index(tmp_path), "corp.sample-net.com", 2)
+
+    by_name = _index(tmp_path, ["Example Shoji株式会社", "東京都千代田区1-1-1", "03-0000-0000"])
+    assert not by_name.is_demoted("https://www.example-shoji.co.jp/company/")
+    assert by_name.is_demoted("https://corp.sample-net.com/")
+
+    by_url = _index(tmp_path, ["テスト商事株式会社", "東京都千代田区1-1-1", "03-0000-0000",
+                               "URL: https://corp.sample-net.com/"])
+    assert not by_url.is_demoted("https://corp.sample-net.com/about/")
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+import requests
+
+import search
+from utils import QuotaExhaustedError
+
+CONFIG = {"GOOGLE_API_RETRY_ATTEMPTS": 3, "GOOGLE_API_RETRY_DELAY": 0, "GOOGLE_API_DAILY_LIMIT": 100,
+          "GOOGLE_API_SPECULATIVE_RESERVE": 10}
+PARAMS = {"key": "k", "cx": "c", "q": "テスト商事", "num": 10}
+
+def _response(status, body):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode("utf-8")
+    response.url = search.CSE_URL
+    return response
+
+def _error_body(reason):
+    return {"error": {"code": 403, "message": reason, "errors": [{"reason": reason, "domain": "usageLimits"}]}}
+
+@pytest.fixture
+def api(monkeypatch):
+    """API呼び出しを記録し、responsesを順に返す"""
+    calls = []
+    responses = []
+    monkeypatch.setattr(search, "reserve_api_call", lambda config, deadline=None: calls.append("reserve"))
+    monkeypatch.setattr(search, "http_request", lambda *args, **kwargs: responses.pop(0))
+    monkeypatch.setattr(search, "get_current_api_usage", lambda: 0)
+    return calls, responses
+
+@pytest.mark.parametrize("reason", ["dailyLimitExceeded", "quotaExceeded"])
+def test_daily_limit_403_raises_quota_exhausted(api, reason):
+    calls, responses = api
+    responses.append(_response(403, _error_body(reason)))
+
+    with pytest.raises(QuotaExhaustedError):
+        search._fetch_search_page(PARAMS, CONFIG, None, PARAMS["q"])
+    assert len(calls) == 1
+
+def test_rate_limit_403_is_retried(api):
+    calls, responses = api
+    responses.extend([_response(403, _error_body("rateLimitExceeded")), _response(200, {"items": []})])
+
+    assert search._fetch_search_page(PARAMS, CONFIG, None, PARAMS["q"]) == {"items": []}
+    assert len(calls) == 2
+
+def test_no_retry_when_remaining_quota_is_low(api, monkeypatch):
+    calls, responses = api
+    monkeypatch.setattr(search, "get_current_api_usage", lambda: 95)
+    responses.extend([_response(503, {}), _response(200, {"items": []})])
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        search._fetch_search_page(PARAMS, CONFIG, None, PARAMS["q"])
+    assert len(calls) == 1
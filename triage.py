@@ -0,0 +1,125 @@
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import List
+from address_normalizer import AddressMatcher, EXACT, BLOCK, CITY, PREFECTURE
+from company_name import CompanyNameMatcher, FULL, ALIAS
+
+# 判定
+ACCEPT = "accept"  # スニペットだけで一致と判定（ページを取得しない）
+FETCH = "fetch"    # メインページのみ取得して解析（スニペットに住所・電話番号があるため巡回は不要）
+CRAWL = "crawl"    # メインページから関連ページまで巡回して解析
+SKIP = "skip"      # 取得しない（会社名・住所・電話番号のいずれも現れない）
+
+_PHONE_LIKE = re.compile(r"\+?\d[\d\-‐－ー−() ]{7,}\d")
+
+def extract_phone_numbers(text: str) -> set:
+    """テキスト中の電話番号らしき数字列を数字のみの形で返す（+81は0に置き換え）"""
+    numbers = set()
+    for match in _PHONE_LIKE.findall(unicodedata.normalize("NFKC", text or "")):
+        digits = re.sub(r"\D", "", match)
+        if match.startswith("+81"):
+            digits = "0" + digits[2:]
+        if 9 <= len(digits) <= 11:
+            numbers.add(digits)
+    return numbers
+
+@dataclass
+class TriageResult:
+    """スニペット判定の結果"""
+    decision: str
+    score: float
+    matched: List[str] = field(default_factory=list)
+    reason: str = ""
+
+class SnippetTriage:
+    """
+    検索結果のタイトル・スニペットを決定的なルールで採点し、ページを取得するかどうかを判定する
+    採点はAI解析と同じ配点（会社名0.5/0.2、住所0.25/0.15/0.05、電話番号0.25）で行う
+    """
+
+    def __init__(self, application_info, accept_threshold: float = 0.95, accept_enabled: bool = True, address_index=None):
+        """
+        :param application_info: 申請情報リスト [会社名, 住所, 電話番号, その他...]
+        :param accept_threshold: スニペットだけで一致と判定するスコア
+        :param accept_enabled: スニペットだけでの一致判定を行うか（Falseの場合は最低でもメインページを取得）
+        :param address_index: 住所照合に使う市区町村インデックス（Noneの場合は既定のインデックス）
+        """
+        company = application_info[0] if len(application_info) > 0 else ""
+        address = application_info[1] if len(application_info) > 1 else ""
+        tel = application_info[2] if len(application_info) > 2 else ""
+        self.accept_threshold = accept_threshold
+        self.accept_enabled = accept_enabled
+
+        self.name_matcher = CompanyNameMatcher(company, application_info[3:])
+        self.address_matcher = AddressMatcher(address, address_index)
+        self.tel = re.sub(r"\D", "", unicodedata.normalize("NFKC", tel))
+
+    def score_text(self, text: str):
+        """
+        テキストを採点する
+        :return: (スコア, 一致した項目のリスト)
+        """
+        score = 0.0
+        matched = []
+
+        name_match = self.name_matcher.match(text)
+        if name_match is not None and name_match.kind == FULL:
+            score += 0.5
+            matched.append("会社名")
+        elif name_match is not None and name_match.kind == ALIAS:
+            score += 0.2
+            matched.append("会社名(別名)")
+        elif name_match is not None and len(self.name_matcher.core) >= 2:
+            score += 0.2
+            matched.append("会社名(部分)")
+
+        address_level = self.address_matcher.match(text)
+        if address_level == EXACT:
+            score += 0.25
+            matched.append("住所")
+        elif address_level in (BLOCK, CITY):
+            score += 0.15
+            matched.append("住所(市区町村)")
+        elif address_level == PREFECTURE:
+            score += 0.05
+            matched.append("住所(都道府県)")
+
+        if len(self.tel) >= 9 and self.tel in extract_phone_numbers(text):
+            score += 0.25
+            matched.append("電話番号")
+
+        return min(score, 1.0), matched
+
+    def triage(self, item: dict) -> TriageResult:
+        """
+        検索結果1件を判定する
+        :param item: google_searchの結果 {"title", "link", "snippet"}
+        :return: TriageResult
+        """
+        score, matched = self.score_text(f"{item.get('title') or ''} {item.get('snippet') or ''}")
+        has_name = any(m.startswith("会社名") for m in matched)
+        # 住所と電話番号がどちらも現れるページはそのページ自体に連絡先が載っているため、関連ページの巡回は不要
+        has_contact = "電話番号" in matched and "住所" in matched
+
+        if self.accept_enabled and score >= self.accept_threshold:
+            return TriageResult(ACCEPT, score, matched, "スニペットで会社名・住所・電話番号が一致")
+        if has_contact:
+            return TriageResult(FETCH, score, matched, "スニペットに住所・電話番号が一致（メインページのみ解析）")
+        if has_name or "電話番号" in matched or "住所" in matched or "住所(市区町村)" in matched:
+            return TriageResult(CRAWL, score, matched, "会社名・所在地・電話番号のいずれかが一致（関連ページまで巡回）")
+        return TriageResult(SKIP, score, matched, "会社名・住所・電話番号のいずれも一致しない")
+
+    def triage_results(self, search_results: list):
+        """
+        検索結果をまとめて判定する（判定結果はログに記録）
+        :param search_results: google_searchの結果
+        :return: [(検索結果, TriageResult)]
+        """
+        triaged = []
+        for item in search_results:
+            result = self.triage(item)
+            logging.info(f"スニペット判定: {result.decision} スコア={result.score:.2f} {result.matched} {item.get('link')}")
+            triaged.append((item, result))
+        return triaged
@@ -1,81 +1,276 @@
 import json
-import signal
 import threading
 from functools import wraps
-from typing import Any, Callable
+from typing import Callable, Optional
 import os
 from datetime import datetime
 import logging
 import time
 
-class TimeoutException(Exception):
+class JobInterruptedException(Exception):
+    """ジョブ中断例外（タイムアウト・早期終了の基底クラス）"""
+    pass
+
+class TimeoutException(JobInterruptedException):
     """タイムアウト例外"""
     pass
 
-class EarlyTerminationException(Exception):
+class EarlyTerminationException(JobInterruptedException):
     """早期終了例外"""
     pass
 
-# グローバル早期終了フラグ
-_early_termination_flag = threading.Event()
+class QuotaExhaustedError(ValueError):
+    """Google Search APIの日次上限到達例外（同日中は再実行しても検索できない）"""
+    pass
+
+class Deadline:
+    """
+    ジョブ単位の締め切り（wall-clock SLA）と協調的キャンセルを管理する
+    検索・スクレイピング・LLM呼び出しは timeout() で残り時間をタイムアウトとして受け取り、
+    キャンセル後・期限切れ後は check() で例外を送出して処理を打ち切る
+    """
+
+    def __init__(self, seconds: Optional[float] = None, _parent: Optional["Deadline"] = None):
+        """
+        :param seconds: 制限時間（秒）。None または 0 以下の場合は無制限
+        """
+        now = time.monotonic()
+        self.seconds = float(seconds) if seconds and seconds > 0 else None
+        self.started_at = now
+        self.expires_at = now + self.seconds if self.seconds else None
+        if _parent is not None:
+            # 子Deadlineは親の期限を超えず、キャンセルとHTTPセッションを共有する
+            if _parent.expires_at is not None:
+                if self.expires_at is None or _parent.expires_at < self.expires_at:
+                    self.expires_at = _parent.expires_at
+                    self.seconds = _parent.seconds
+            self._cancelled = _parent._cancelled
+            self._shared = _parent._shared
+        else:
+            self._cancelled = threading.Event()
+            self._shared = {"lock": threading.Lock(), "session": None, "cassette": None, "api_calls": 0}
+
+    def child(self, seconds: Optional[float]) -> "Deadline":
+        """
+        残り時間がseconds以内に制限された子Deadlineを生成
+        :param seconds: 子の制限時間（秒）
+        """
+        return Deadline(seconds, _parent=self)
+
+    def remaining(self) -> Optional[float]:
+        """残り時間（秒）。無制限の場合はNone"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        """開始からの経過時間（秒）"""
+        return time.monotonic() - self.started_at
+
+    def expired(self) -> bool:
+        """期限切れかどうか"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    @property
+    def cancelled(self) -> bool:
+        """キャンセル済みかどうか"""
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """ジョブをキャンセル（実行中の処理は次のcheck()で停止する）"""
+        self._cancelled.set()
+
+    def check(self):
+        """
+        キャンセル・期限切れをチェックし、該当する場合は例外を送出
+        :raises EarlyTerminationException: キャンセル済みの場合
+        :raises TimeoutException: 期限切れの場合
+        """
+        if self._cancelled.is_set():
+            raise EarlyTerminationException("ジョブがキャンセルされました")
+        if self.expired():
+            raise TimeoutException(f"処理時間の上限に達しました ({self.seconds:.0f}秒)")
+
+    def timeout(self, default: float) -> float:
+        """
+        ネットワーク呼び出し用のタイムアウト値を取得（残り時間を上限とする）
+        :param default: 呼び出しごとの既定タイムアウト（秒）
+        :return: min(default, 残り時間)
+        """
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(0.1, min(default, remaining))
+
+    def sleep(self, seconds: float):
+        """
+        キャンセル可能な待機（残り時間を超えて待機しない）
+        :param seconds: 待機時間（秒）
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        if seconds > 0:
+            self._cancelled.wait(seconds)
+        self.check()
+
+    def session(self):
+        """
+        ジョブ専用のHTTPセッションを取得（close()で接続をまとめて解放）
+        カセットを設定した場合は、通信を記録・再生するセッションを返す
+        """
+        with self._shared["lock"]:
+            if self._shared["session"] is None:
+                import requests
+                self._shared["session"] = requests.Session()
+                if self._shared["cassette"] is not None:
+                    self._shared["session"] = self._shared["cassette"].session(self._shared["session"], self)
+            return self._shared["session"]
+
+    def count_api_call(self):
+        """ジョブのGoogle Search API呼び出しを1回数える（クォータ消費の実績として判定結果ストアに記録する）"""
+        with self._shared["lock"]:
+            self._shared["api_calls"] += 1
 
-def set_early_termination():
-    """早期終了フラグを設定"""
-    _early_termination_flag.set()
+    @property
+    def api_calls(self) -> int:
+        """ジョブで使用したGoogle Search APIの呼び出し回数"""
+        return self._shared["api_calls"]
 
-def reset_early_termination():
-    """早期終了フラグをリセット"""
-    _early_termination_flag.clear()
+    def use_cassette(self, cassette):
+        """
+        ジョブのHTTP通信を記録・再生するカセットを設定（最初の通信の前に呼ぶ。close()で記録を確定する）
+        :param cassette: cassette.Cassette
+        """
+        with self._shared["lock"]:
+            self._shared["cassette"] = cassette
+            if self._shared["session"] is not None:
+                self._shared["session"] = cassette.session(self._shared["session"], self)
 
-def check_early_termination():
-    """早期終了フラグをチェック"""
-    return _early_termination_flag.is_set()
+    def close(self):
+        """
+        ジョブを終了し、残っている処理の停止とHTTP接続の解放を行う
+        """
+        self._cancelled.set()
+        with self._shared["lock"]:
+            session = self._shared["session"]
+            cassette = self._shared["cassette"]
+            self._shared["session"] = None
+            self._shared["cassette"] = None
+        if session is not None:
+            session.close()
+        if cassette is not None:
+            cassette.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def http_request(method: str, url: str, deadline: Optional[Deadline] = None, timeout: float = 30, **kwargs):
+    """
+    Deadlineを考慮したHTTPリクエスト
+    タイムアウトは min(timeout, 残り時間) となり、期限切れによる失敗はTimeoutExceptionに変換する
+    Deadlineにカセットを設定した場合は、ジョブのセッション経由で通信を記録・再生する（deadline=Noneの通信は対象外）
+    :param method: HTTPメソッド
+    :param url: リクエストURL
+    :param deadline: ジョブのDeadline（Noneの場合は制限なし）
+    :param timeout: 呼び出しごとの既定タイムアウト（秒）
+    :return: requests.Response
+    """
+    import requests
+    if deadline is None:
+        return requests.request(method, url, timeout=timeout, **kwargs)
+
+    try:
+        return deadline.session().request(method, url, timeout=deadline.timeout(timeout), **kwargs)
+    except requests.exceptions.RequestException as e:
+        if deadline.cancelled:
+            raise EarlyTerminationException("ジョブがキャンセルされました") from e
+        if deadline.expired():
+            raise TimeoutException(f"処理時間の上限に達しました ({deadline.seconds:.0f}秒)") from e
+        raise
+
+class JobContext:
+    """
+    1件の検証ジョブのスコープ情報（早期終了シグナル・設定・ロガー・Deadline）
+    グローバル状態を持たずに各処理へ引き回すことで、1プロセス内で複数の検証を並行実行できる
+    """
+
+    def __init__(self, config: dict, logger: Optional[logging.Logger] = None,
+                 job_id: Optional[str] = None, deadline: Optional[Deadline] = None):
+        """
+        :param config: 設定情報
+        :param logger: ジョブで使用するロガー（Noneの場合はルートロガー）
+        :param job_id: ジョブID（Noneの場合は自動採番）
+        :param deadline: ジョブのDeadline（Noneの場合はMAX_PROCESSING_TIMEから生成）
+        """
+        self.config = config
+        self.logger = logger or logging.getLogger()
+        if job_id is None:
+            import uuid
+            job_id = uuid.uuid4().hex[:12]
+        self.job_id = job_id
+        self.deadline = deadline or Deadline(config.get("MAX_PROCESSING_TIME"))
+
+    def set_early_termination(self):
+        """
+        早期終了を設定（このジョブのみ停止し、実行中の待機・通信は次のチェックで打ち切られる）
+        """
+        self.deadline.cancel()
+
+    def check_early_termination(self) -> bool:
+        """早期終了が設定されているかチェック"""
+        return self.deadline.cancelled
+
+    def check(self):
+        """
+        早期終了・期限切れをチェックし、該当する場合は例外を送出
+        :raises EarlyTerminationException: 早期終了が設定されている場合
+        :raises TimeoutException: 処理時間の上限に達した場合
+        """
+        self.deadline.check()
+
+    def close(self):
+        """ジョブを終了し、HTTP接続を解放する"""
+        self.deadline.close()
+
+    def __enter__(self):
+        # このコンテキストで出力されるログにジョブIDを相関IDとして付与する
+        from event_log import current_job_id
+        self._job_id_token = current_job_id.set(self.job_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        token = getattr(self, "_job_id_token", None)
+        if token is not None:
+            from event_log import current_job_id
+            current_job_id.reset(token)
+            self._job_id_token = None
+        return False
 
 def timeout_decorator(timeout_seconds: int):
     """
-    関数にタイムアウトを設定するデコレータ（早期終了対応版）
+    関数にタイムアウトを設定するデコレータ（Deadline版）
+    スレッドを生成せず、制限時間付きのDeadlineを deadline 引数として関数に渡す。
+    呼び出し側から deadline が渡された場合は、その残り時間との短い方を採用する
     :param timeout_seconds: タイムアウト時間（秒）
     """
     def decorator(func: Callable) -> Callable:
         @wraps(func)
-        def wrapper(*args, **kwargs):
-            # 早期終了フラグのチェック
-            if check_early_termination():
-                raise EarlyTerminationException("早期終了フラグが設定されています")
-            
-            result = [TimeoutException("タイムアウトが発生しました")]
-            stop_flag = threading.Event()
-            
-            def target():
-                try:
-                    result[0] = func(*args, **kwargs, _stop_flag=stop_flag)
-                except Exception as e:
-                    result[0] = e
-            
-            thread = threading.Thread(target=target)
-            thread.daemon = True
-            thread.start()
-            
-            # タイムアウト待機（100ms間隔で早期終了フラグもチェック）
-            start_time = time.time()
-            while thread.is_alive():
-                if time.time() - start_time >= timeout_seconds:
-                    stop_flag.set()  # 停止フラグを設定
-                    thread.join(timeout=1.0)  # 1秒待機してスレッド終了を試行
-                    raise TimeoutException(f"処理がタイムアウトしました ({timeout_seconds}秒)")
-                
-                if check_early_termination():
-                    stop_flag.set()  # 停止フラグを設定
-                    thread.join(timeout=1.0)  # 1秒待機してスレッド終了を試行
-                    raise EarlyTerminationException("早期終了フラグが設定されました")
-                
-                time.sleep(0.1)  # 100ms間隔でチェック
-            
-            if isinstance(result[0], Exception):
-                raise result[0]
-            
-            return result[0]
-        
+        def wrapper(*args, deadline: Optional[Deadline] = None, **kwargs):
+            if deadline is None:
+                with Deadline(timeout_seconds) as own_deadline:
+                    return func(*args, deadline=own_deadline, **kwargs)
+
+            child = deadline.child(timeout_seconds)
+            child.check()
+            return func(*args, deadline=child, **kwargs)
+
         return wrapper
     return decorator
 
@@ -85,8 +280,32 @@ def write_result_json(result: dict, file_path: str = "result.json"):
     :param result: 出力するdict
     :param file_path: 出力先ファイル名
     """
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    def dump(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    _replace_file(file_path, dump)
+
+def _replace_file(file_path: str, write: Callable[[str], None]):
+    """
+    一時ファイルに書いてから置き換える（書き込み途中のファイルを読ませない）
+    一時ファイルは書き込みごとに別名とし、並行実行中のジョブが同じファイルに出力しても互いに壊さない
+    :param file_path: 出力先ファイル名
+    :param write: 一時ファイルのパスを受け取って書き込む関数
+    """
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(file_path)}.", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(file_path)))
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
 def standardize_output_format(raw_result: dict) -> dict:
     """
@@ -101,16 +320,28 @@ def standardize_output_format(raw_result: dict) -> dict:
         "results": [],
         "searched_url_count": raw_result.get("searched_url_count", 0),
         "found": raw_result.get("found", False),
-        "early_terminated": raw_result.get("early_terminated", False)
+        "early_terminated": raw_result.get("early_terminated", False),
+        "timed_out": raw_result.get("timed_out", False)
     }
     
     # otherフィールドがある場合は追加
     if "other" in raw_result and raw_result["other"]:
         standardized["other"] = raw_result["other"]
     
+    # 検証を終えた理由（threshold / registry / quota_limited / low_probability / timed_out / exhausted）
+    if raw_result.get("stop_reason"):
+        standardized["stop_reason"] = raw_result["stop_reason"]
+
+    # API使用枠の不足によりGoogle検索を行わなかった場合（法人登記・過去の判定のみで確認）
+    if raw_result.get("quota_limited"):
+        standardized["quota_limited"] = True
+
     # URLが見つからなかった場合のメッセージ
     if not standardized["found"]:
-        standardized["message"] = "申請情報に基づくURLが見つかりませんでした"
+        if standardized.get("quota_limited"):
+            standardized["message"] = "API使用枠の不足により検索を行わず、法人登記・過去の判定でも確認できませんでした"
+        else:
+            standardized["message"] = "申請情報に基づくURLが見つかりませんでした"
     
     # 結果をスコア順にソートして最大10件に制限
     raw_results = raw_result.get("results", [])
@@ -123,6 +354,9 @@ def standardize_output_format(raw_result: dict) -> dict:
             "is_real": result.get("score", 0.0) >= 0.7,  # スコア0.7以上をrealとする
             "reason": result.get("reasoning", result.get("reason", "判定理由不明"))
         }
+        # ページを取得せずに検索結果のスニペットで判定した場合は根拠の種別を残す
+        if result.get("evidence"):
+            standardized_result["evidence"] = result["evidence"]
         standardized["results"].append(standardized_result)
     
     return standardized
@@ -153,6 +387,10 @@ def write_result_markdown_table(result: dict, file_path: str = "result.md"):
         # 早期終了の情報
         if result.get('early_terminated', False):
             f.write("- **注記**: スコア95%以上の結果が見つかりました\n\n")
+
+        # 処理時間上限による打ち切りの情報
+        if result.get('timed_out', False):
+            f.write("- **注記**: 処理時間の上限に達したため検証を打ち切りました\n\n")
         
         # URLが見つからなかった場合のメッセージ
         if not result.get('found', False):
@@ -201,7 +439,7 @@ def write_result_markdown(result: dict, file_path: str = "result.md"):
         # 生データの場合は標準化
         result = standardize_output_format(result)
     
-    write_result_markdown_table(result, file_path)
+    _replace_file(file_path, lambda tmp_path: write_result_markdown_table(result, tmp_path))
 
 def get_api_usage_file_path():
     """
@@ -217,11 +455,24 @@ def get_api_usage_file_path():
     
     return os.path.join(api_log_dir, f"search_api_count_{today}.txt")
 
+# 分散実行時のAPI使用枠の提供元（worker_pool.QuotaLease）。Noneの場合はローカルのファイルで管理する
+_quota_provider = None
+
+def set_quota_provider(provider):
+    """
+    API使用件数・レート制限の管理をprovider（current_usage()・reserve(deadline)を持つ）に委ねる
+    複数ノードのワーカーが日次上限・レート制限を共有するために使う（Noneでローカル管理に戻す）
+    """
+    global _quota_provider
+    _quota_provider = provider
+
 def get_current_api_usage():
     """
     当日のAPI使用件数を取得
     :return: 使用件数（int）
     """
+    if _quota_provider is not None:
+        return _quota_provider.current_usage()
     file_path = get_api_usage_file_path()
     if os.path.exists(file_path):
         try:
@@ -262,37 +513,18 @@ def check_api_limit(required_calls: int = 1, daily_limit: int = 100):
         return False
     return True
 
-def setup_logger(log_level: str = "INFO", log_file: str = "app.log"):
+def setup_logger(log_level: str = "INFO", log_file: str = "app.jsonl", max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5, console: bool = True):
     """
-    ログ設定を初期化
-    :param log_level: ログレベル
+    ログ設定を初期化（キュー経由の非同期JSONLログ。詳細は event_log.setup_event_logger）
+    :param log_level: ログレベル（PAYLOADで生のLLM応答も出力）
     :param log_file: ログファイル名
+    :param max_bytes: ローテーションするファイルサイズ（バイト）
+    :param backup_count: 保持する世代数
+    :param console: コンソールにも出力するか
     """
-    level = getattr(logging, log_level.upper(), logging.INFO)
-    
-    # ログの重複を防ぐため、既存のハンドラーをクリア
-    logging.getLogger().handlers.clear()
-    
-    # フォーマット設定
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # ファイルハンドラー
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setFormatter(formatter)
-    
-    # コンソールハンドラー
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    
-    # ルートロガー設定
-    logger = logging.getLogger()
-    logger.setLevel(level)
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
+    from event_log import setup_event_logger
+    return setup_event_logger(log_level, log_file, max_bytes=max_bytes, backup_count=backup_count, console=console)
 
 def get_api_rate_limit_file_path():
     """
@@ -419,7 +651,7 @@ def enhanced_check_api_limit(required_calls: int = 1, config=None):
         config = load_config()
     
     daily_limit = int(config.get("GOOGLE_API_DAILY_LIMIT", 100))
-    strict_mode = config.get("GOOGLE_API_STRICT_MODE", "false").lower() == "true"
+    strict_mode = config.get("GOOGLE_API_STRICT_MODE", False)
     
     # 日次制限チェック
     current_usage = get_current_api_usage()
@@ -435,7 +667,9 @@ def enhanced_check_api_limit(required_calls: int = 1, config=None):
     elif warning_level == 1:
         logging.warning(f"API使用量が警告レベルに達しています: {current_usage}/{daily_limit}")
     
-    # レート制限チェック
+    # レート制限チェック（分散実行時はreserve_api_callでコーディネータのトークンを待つ）
+    if _quota_provider is not None:
+        return True, "", 0
     can_call, wait_time = check_rate_limits(config)
     if not can_call:
         if strict_mode:
@@ -447,6 +681,49 @@ def enhanced_check_api_limit(required_calls: int = 1, config=None):
     
     return True, "", 0
 
+# 同一プロセス内の並行検索がAPI制限の確認と記録を同時に行わないようにする
+_api_call_lock = threading.Lock()
+
+def reserve_api_call(config, deadline: Optional[Deadline] = None):
+    """
+    API制限を確認し、呼び出し可能になった時点で1回分の呼び出しを記録する
+    確認から記録までをロックで一括して行うため、並行して検索しても日次・分/秒の制限を超えない
+    :param config: 設定情報
+    :param deadline: ジョブのDeadline（レート制限の待機をキャンセル可能にする）
+    :raises QuotaExhaustedError: 日次制限の超過
+    :raises ValueError: strictモードでのレート制限
+    """
+    provider = _quota_provider
+    if provider is not None:
+        provider.reserve(deadline)
+        if deadline is not None:
+            deadline.count_api_call()
+        return
+    auto_pause = config.get("GOOGLE_API_AUTO_PAUSE", True)
+    while True:
+        with _api_call_lock:
+            can_execute, error_msg, wait_time = enhanced_check_api_limit(required_calls=1, config=config)
+            if not can_execute:
+                if wait_time > 0:
+                    raise ValueError(f"Google Search API制限エラー: {error_msg}")
+                raise QuotaExhaustedError(f"Google Search API制限エラー: {error_msg}")
+            if wait_time <= 0 or not auto_pause:
+                if wait_time > 0:
+                    logging.warning(f"レート制限検出: {wait_time:.1f}秒の待機が推奨されます")
+                # 期限切れ・キャンセル済みの場合はAPI使用件数を消費しない
+                if deadline is not None:
+                    deadline.check()
+                record_api_call(config)
+                if deadline is not None:
+                    deadline.count_api_call()
+                return
+        # 待機中は他の検索がロックを取得できるよう、ロックの外で待つ
+        logging.info(f"レート制限により{wait_time:.1f}秒待機します...")
+        if deadline is not None:
+            deadline.sleep(wait_time)
+        else:
+            time.sleep(wait_time)
+
 def reset_api_limits():
     """
     API制限データをリセットする（テスト用・開発用）
@@ -483,8 +760,6 @@ def reset_api_limits():
             f.write("0")
         
         logger.info(f"API使用件数をリセット: {api_count_file}")
-        print("✅ API制限データをリセットしました")
         
     except Exception as e:
         logger.error(f"API制限リセット失敗: {e}")
-        print(f"❌ API制限リセット失敗: {e}")
@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数ノードでの分散実行（共有SQLiteのコーディネータ + ワーカー）
+
+Google Search APIの日次上限・レート制限はAPIキー単位のため、複数のマシン・プロセスで検証する場合は
+コーディネータ（WORKER_COORDINATOR_DB。全ノードから参照できる場所に置く）で共有する。
+SQLiteのWALモードはネットワークファイルシステム上では動作しないため、コーディネータは既定のロールバックジャーナルで使う。
+ネットワーク共有に置く場合はファイルロック（fcntl）が正しく動作するもの（NFSv4等）を使うこと。
+・ジョブキュー：ワーカーはジョブを取得すると期限付きで占有し、ハートビートで期限を延長する。
+  ワーカーが停止して期限が切れたジョブは他のワーカーが取得し直す（WORKER_MAX_ATTEMPTS回まで）
+・日次上限：ワーカーはAPI呼び出し枠をQUOTA_LEASE_BATCH件ずつ借り受け、終了時に未使用分を返す。
+  停止したワーカーの借り受け分は使用済みとして扱うため、全ワーカーの合計が日次上限を超えない
+・レート制限：分/秒単位の上限をコーディネータのトークンバケットで共有し、ワーカーは1秒間有効なトークンをまとめて受け取る
+・配分：ジョブは優先度の高い順に取得し、時間帯ごとの使用可能件数（quota_scheduler）を超える場合は後に回す
+
+コーディネータはCoordinatorクラスのメソッド（enqueue/claim/heartbeat/complete/fail/lease_quota/return_quota/take_rate_tokens）
+だけで使うため、同じメソッドを持つTCPサービスやRedis等の実装に置き換えられる。
+
+使い方:
+  python worker_pool.py enqueue --company 会社名 --address 住所 --tel 電話番号 [--other ...] [--priority 1]
+  python worker_pool.py enqueue-file jobs.jsonl        # 1行1件のJSON {"company", "address", "tel", "other", "priority"}
+  python worker_pool.py work [--concurrency 2] [--exit-when-idle]
+  python worker_pool.py status
+  python worker_pool.py result <ジョブ番号>
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from utils import QuotaExhaustedError
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        not_before REAL NOT NULL DEFAULT 0,
+        payload TEXT NOT NULL,
+        worker TEXT,
+        lease_until REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        enqueued_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        error TEXT,
+        result TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS workers (
+        worker TEXT PRIMARY KEY,
+        host TEXT,
+        started_at REAL,
+        heartbeat_at REAL
+    )""",
+    """CREATE TABLE IF NOT EXISTS quota_leases (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        day TEXT NOT NULL,
+        worker TEXT NOT NULL,
+        granted INTEGER NOT NULL,
+        returned INTEGER NOT NULL DEFAULT 0,
+        leased_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS rate_buckets (
+        name TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status_priority ON jobs (status, priority DESC, id)",
+    "CREATE INDEX IF NOT EXISTS idx_quota_leases_day ON quota_leases (day)",
+)
+
+def today() -> str:
+    """日次上限の集計単位（utils.get_api_usage_file_pathと同じくローカル日付）"""
+    return datetime.now().strftime("%Y%m%d")
+
+def seconds_until_next_day() -> float:
+    """日次上限の集計単位が次の日付に切り替わるまでの秒数"""
+    now = datetime.now()
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+class Coordinator:
+    """
+    ジョブキューとAPI使用枠の共有ストア（SQLite。ロールバックジャーナルで複数プロセス・複数ノードから利用する）
+    状態を変更する処理はBEGIN IMMEDIATEのトランザクションで行い、同時に取得したワーカー同士が同じジョブ・枠を得ないようにする
+    """
+
+    def __init__(self, db_path: str = "coordinator.db", lease_seconds: float = 120, max_attempts: int = 3):
+        """
+        :param db_path: SQLiteファイル
+        :param lease_seconds: ジョブの占有期限（秒）。ハートビートがこの時間途絶えたジョブは再実行される
+        :param max_attempts: 1ジョブの最大実行回数（超えた場合はfailed）
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # WALは共有メモリ（-shm）を使い同一ホスト内でしか排他できないため、共有ファイルでは使わない
+        # （以前WALで作成したファイルもロールバックジャーナルに戻す）
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, func):
+        """funcを書き込みトランザクション内で実行する（他のプロセスの書き込みとは直列化される）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    # ---- ジョブキュー ----
+
+    def enqueue(self, company: str, address: str, tel: str, other=None, priority: int = 0) -> int:
+        """
+        ジョブを追加する
+        :param priority: 優先度（大きいほど先に取得する）
+        :return: ジョブ番号
+        """
+        payload = json.dumps({"company": company, "address": address, "tel": tel, "other": list(other or []),
+                              "priority": priority}, ensure_ascii=False)
+        return self._transaction(lambda conn: conn.execute(
+            "INSERT INTO jobs (status, priority, payload, enqueued_at) VALUES (?, ?, ?, ?)",
+            (QUEUED, priority, payload, time.time())
+        ).lastrowid)
+
+    def claim(self, worker: str):
+        """
+        待機中のジョブ（または占有期限の切れたジョブ）を優先度の高い順に1件取得して占有する
+        :param worker: ワーカーID
+        :return: (ジョブ番号, 申請情報のdict)（ジョブがない場合はNone）
+        """
+        def claim_one(conn):
+            now = time.time()
+            while True:
+                row = conn.execute(
+                    "SELECT id, status, attempts, payload FROM jobs"
+                    " WHERE (status = ? AND not_before <= ?) OR (status = ? AND lease_until < ?)"
+                    " ORDER BY priority DESC, id LIMIT 1",
+                    (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["status"] == RUNNING:
+                    logging.warning(f"占有期限切れのジョブを再実行: #{row['id']}（{row['attempts']}回目まで実行済み）")
+                if row["attempts"] >= self.max_attempts:
+                    conn.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                                 (FAILED, now, "最大実行回数を超過（ワーカー停止）", row["id"]))
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, started_at = ?"
+                    " WHERE id = ?", (RUNNING, worker, now + self.lease_seconds, now, row["id"])
+                )
+                return row["id"], json.loads(row["payload"])
+        return self._transaction(claim_one)
+
+    def heartbeat(self, worker: str, job_ids=(), host: str = None):
+        """
+        ワーカーの生存を記録し、実行中のジョブの占有期限を延長する
+        :param worker: ワーカーID
+        :param job_ids: 実行中のジョブ番号
+        """
+        def beat(conn):
+            now = time.time()
+            conn.execute(
+                "INSERT INTO workers (worker, host, started_at, heartbeat_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(worker) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (worker, host or socket.gethostname(), now, now)
+            )
+            for job_id in job_ids:
+                conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                             (now + self.lease_seconds, job_id, worker, RUNNING))
+        self._transaction(beat)
+
+    def complete(self, job_id: int, worker: str, result: dict) -> bool:
+        """
+        ジョブの完了を記録する
+        :return: 記録した場合True（占有期限が切れて他のワーカーに移っていた場合はFalse）
+        """
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = NULL"
+            " WHERE id = ? AND worker = ? AND status = ?",
+            (DONE, time.time(), json.dumps(result, ensure_ascii=False), job_id, worker, RUNNING)
+        ).rowcount > 0)
+
+    def fail(self, job_id: int, worker: str, error: str, retry: bool = True):
+        """
+        ジョブの失敗を記録する（retry=Trueで実行回数が上限未満の場合は待機中に戻す）
+        """
+        def fail_one(conn):
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                               (job_id, worker, RUNNING)).fetchone()
+            if row is None:
+                return
+            requeue = retry and row["attempts"] < self.max_attempts
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ?, lease_until = NULL WHERE id = ?",
+                         (QUEUED if requeue else FAILED, None if requeue else time.time(), error, job_id))
+        self._transaction(fail_one)
+
+    def defer(self, job_id: int, worker: str, seconds: float):
+        """
+        ジョブを待機中に戻し、seconds秒後まで取得しないようにする（実行回数には数えない）
+        """
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, not_before = ?, lease_until = NULL, attempts = attempts - 1"
+            " WHERE id = ? AND worker = ? AND status = ?",
+            (QUEUED, time.time() + seconds, job_id, worker, RUNNING)
+        ))
+
+    def next_ready_in(self):
+        """
+        後に回したジョブが取得可能になるまでの秒数
+        :return: 秒数（待機中のジョブがない場合はNone）
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(not_before) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def job(self, job_id: int):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def status(self) -> dict:
+        """ジョブの状態別件数・ワーカー・当日のAPI使用枠"""
+        with self._lock:
+            counts = {row["status"]: row["n"] for row in
+                      self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+            workers = [dict(row) for row in
+                       self._conn.execute("SELECT * FROM workers ORDER BY heartbeat_at DESC")]
+        return {"jobs": counts, "workers": workers, "quota_used": self.quota_usage(today())}
+
+    # ---- API使用枠 ----
+
+    def quota_usage(self, day: str) -> int:
+        """当日の使用枠（借り受け中で未返却の分を含む）"""
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(granted - returned), 0) FROM quota_leases WHERE day = ?",
+                                     (day,)).fetchone()
+        return int(row[0])
+
+    def lease_quota(self, worker: str, day: str, requested: int, daily_limit: int) -> tuple:
+        """
+        日次上限の範囲でAPI呼び出し枠を借り受ける
+        :return: (借り受け番号, 借り受けた件数)（上限に達している場合は件数0）
+        """
+        def lease(conn):
+            used = conn.execute("SELECT COALESCE(SUM(granted - returned), 0) FROM quota_leases WHERE day = ?",
+                                (day,)).fetchone()[0]
+            granted = max(0, min(requested, daily_limit - used))
+            if granted == 0:
+                return None, 0
+            lease_id = conn.execute("INSERT INTO quota_leases (day, worker, granted, leased_at) VALUES (?, ?, ?, ?)",
+                                    (day, worker, granted, time.time())).lastrowid
+            return lease_id, granted
+        return self._transaction(lease)
+
+    def return_quota(self, lease_id: int, unused: int):
+        """借り受けた枠の未使用分を返す"""
+        if lease_id is None or unused <= 0:
+            return
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE quota_leases SET returned = MIN(granted, returned + ?) WHERE id = ?", (unused, lease_id)
+        ))
+
+    def take_rate_tokens(self, requested: int, per_second: float, per_minute: float) -> tuple:
+        """
+        分/秒単位のトークンバケットからトークンを取り出す
+        :return: (取り出した件数, 件数0の場合に次のトークンが溜まるまでの秒数)
+        """
+        buckets = (("second", per_second, per_second), ("minute", per_minute, per_minute / 60.0))
+
+        def take(conn):
+            now = time.time()
+            levels = []
+            for name, capacity, rate in buckets:
+                row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row["tokens"] + (now - row["updated_at"]) * rate)
+                levels.append((name, tokens, rate))
+            granted = max(0, min(requested, *(math.floor(tokens) for _, tokens, _ in levels)))
+            for name, tokens, _ in levels:
+                conn.execute("INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                             (name, tokens - granted, now))
+            if granted:
+                return granted, 0.0
+            return 0, max((1 - tokens) / rate for _, tokens, rate in levels if tokens < 1)
+        return self._transaction(take)
+
+class QuotaLease:
+    """
+    ワーカー側のAPI使用枠（utils.set_quota_providerで設定し、reserve_api_callの代わりに使う）
+    日次上限の枠はbatch件ずつ、レート制限のトークンは1秒間有効な分をまとめて借り受け、1回の検索ごとに1件ずつ消費する
+    """
+
+    # 借り受けたレート制限トークンの有効期間（秒）。使い残したトークンは期限切れで破棄する（上限を超えない側に倒す）
+    TOKEN_TTL = 1.0
+
+    def __init__(self, coordinator: Coordinator, worker: str, config, batch: int = 5):
+        """
+        :param coordinator: コーディネータ
+        :param worker: ワーカーID
+        :param config: 設定情報（GOOGLE_API_DAILY_LIMIT・GOOGLE_API_RATE_LIMIT_PER_MINUTE/SECOND）
+        :param batch: 一度に借り受ける件数
+        """
+        self.coordinator = coordinator
+        self.worker = worker
+        self.batch = max(1, batch)
+        self.daily_limit = int(config.get("GOOGLE_API_DAILY_LIMIT", 100))
+        self.per_minute = float(config.get("GOOGLE_API_RATE_LIMIT_PER_MINUTE", 60))
+        self.per_second = float(config.get("GOOGLE_API_RATE_LIMIT_PER_SECOND", 10))
+        self._lock = threading.Lock()
+        self._day = None
+        self._lease_id = None
+        self._units = 0
+        self._tokens = 0
+        self._tokens_expire = 0.0
+
+    def current_usage(self) -> int:
+        """全ワーカー合計の当日の使用件数（借り受け中の枠を含む）"""
+        return self.coordinator.quota_usage(today())
+
+    def _ensure_units(self):
+        day = today()
+        if day != self._day:
+            # 日付が変わった場合は前日の枠を破棄する
+            self._day, self._lease_id, self._units = day, None, 0
+        if self._units > 0:
+            return
+        lease_id, granted = self.coordinator.lease_quota(self.worker, day, self.batch, self.daily_limit)
+        if granted == 0:
+            raise QuotaExhaustedError(f"Google Search API制限エラー: 全ワーカー合計で日次上限（{self.daily_limit}件）に達しています")
+        self._lease_id, self._units = lease_id, granted
+
+    def reserve(self, deadline=None):
+        """
+        1回分のAPI呼び出し枠とレート制限トークンを確保する（トークンが溜まるまで待機）
+        :raises QuotaExhaustedError: 日次上限に達した場合
+        """
+        while True:
+            with self._lock:
+                self._ensure_units()
+                now = time.monotonic()
+                if now >= self._tokens_expire:
+                    self._tokens = 0
+                wait = 0.0
+                if self._tokens == 0:
+                    granted, wait = self.coordinator.take_rate_tokens(
+                        min(self.batch, max(1, int(self.per_second))), self.per_second, self.per_minute)
+                    if granted:
+                        self._tokens, self._tokens_expire = granted, now + self.TOKEN_TTL
+                if self._tokens > 0:
+                    # 期限切れ・キャンセル済みの場合は枠を消費しない
+                    if deadline is not None:
+                        deadline.check()
+                    self._tokens -= 1
+                    self._units -= 1
+                    return
+            logging.info(f"レート制限（全ワーカー共有）により{wait:.1f}秒待機します...")
+            if deadline is not None:
+                deadline.sleep(wait)
+            else:
+                time.sleep(wait)
+
+    def release(self):
+        """未使用の日次枠をコーディネータに返す"""
+        with self._lock:
+            if self._day == today():
+                self.coordinator.return_quota(self._lease_id, self._units)
+            self._lease_id, self._units = None, 0
+
+class Worker:
+    """
+    コーディネータからジョブを取得して検証を実行するワーカー（1プロセスでconcurrency件を並行実行）
+    """
+
+    def __init__(self, coordinator: Coordinator, config, worker: str = None, concurrency: int = 1,
+                 heartbeat_seconds: float = 20, poll_seconds: float = 2):
+        """
+        :param coordinator: コーディネータ
+        :param config: 設定情報
+        :param worker: ワーカーID（Noneの場合はホスト名・プロセスIDから生成）
+        :param concurrency: 並行実行するジョブ数
+        :param heartbeat_seconds: ハートビートの間隔（秒）。コーディネータの占有期限より十分短くする
+        :param poll_seconds: ジョブがない場合の再確認間隔（秒）
+        """
+        self.coordinator = coordinator
+        self.config = config
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = max(1, concurrency)
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.quota = QuotaLease(coordinator, self.worker, config, batch=int(config.get("QUOTA_LEASE_BATCH", 5)))
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            with self._running_lock:
+                job_ids = list(self._running)
+            try:
+                self.coordinator.heartbeat(self.worker, job_ids)
+            except sqlite3.Error as e:
+                logging.warning(f"ハートビートの記録に失敗: {e}")
+
+    def _run_job(self, job_id: int, payload: dict):
+        # 検証処理は初回のジョブ実行時にimport（CLIの起動を軽くするため）
+        from main import main_fixed, TestCompanyInfo
+        from quota_scheduler import get_quota_scheduler, DEFER
+
+        priority = int(payload.get("priority", 0))
+        decision = get_quota_scheduler(self.config).decide(self.quota.current_usage(), priority, can_defer=True)
+        if decision.mode == DEFER:
+            logging.info(f"ジョブ#{job_id}を{decision.wait_seconds:.0f}秒後に回します（{decision.reason}）")
+            self.coordinator.defer(job_id, self.worker, decision.wait_seconds)
+            return
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            result = main_fixed(TestCompanyInfo(payload["company"], payload["address"], payload["tel"],
+                                                payload.get("other") or [], priority=priority), can_defer=True)
+            if not self.coordinator.complete(job_id, self.worker, result):
+                logging.warning(f"ジョブ#{job_id}は占有期限切れで他のワーカーに移ったため結果を破棄")
+        except QuotaExhaustedError as e:
+            # 全ワーカー合計の日次上限は同日中は解消しないため、翌日（使用件数の集計が切り替わる時刻）に回す
+            wait = seconds_until_next_day()
+            logging.info(f"ジョブ#{job_id}を{wait:.0f}秒後に回します（{e}）")
+            self.coordinator.defer(job_id, self.worker, wait)
+        except (Exception, SystemExit) as e:
+            logging.error(f"ジョブ#{job_id}の実行エラー: {e!r}")
+            self.coordinator.fail(job_id, self.worker, repr(e))
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+    def _loop(self, exit_when_idle: bool):
+        while not self._stop.is_set():
+            claimed = self.coordinator.claim(self.worker)
+            if claimed is None:
+                ready_in = self.coordinator.next_ready_in()
+                if exit_when_idle and ready_in is None:
+                    return
+                self._stop.wait(min(self.poll_seconds, ready_in) if ready_in else self.poll_seconds)
+                continue
+            self._run_job(*claimed)
+
+    def run(self, exit_when_idle: bool = False):
+        """
+        ジョブの取得・実行を繰り返す（Ctrl+Cで実行中のジョブの終了後に停止）
+        :param exit_when_idle: 待機中のジョブ（後に回したジョブを含む）がなくなったら終了する
+        """
+        from utils import set_quota_provider
+
+        set_quota_provider(self.quota)
+        self.coordinator.heartbeat(self.worker)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="heartbeat", daemon=True)
+        heartbeat.start()
+        threads = [threading.Thread(target=self._loop, args=(exit_when_idle,), name=f"worker-{n}")
+                   for n in range(self.concurrency)]
+        logging.info(f"ワーカー開始: {self.worker}（並行数={self.concurrency}）")
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            logging.info("停止要求を受け付けました。実行中のジョブの終了後に停止します")
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            self._stop.set()
+            self.quota.release()
+            set_quota_provider(None)
+            logging.info(f"ワーカー停止: {self.worker}")
+
+def build_coordinator(config, db_path: str = None) -> Coordinator:
+    """
+    設定に従ってコーディネータを開く
+    :param config: 設定情報
+    :param db_path: SQLiteファイル（Noneの場合はWORKER_COORDINATOR_DB）
+    """
+    return Coordinator(
+        db_path or config.get("WORKER_COORDINATOR_DB", "coordinator.db"),
+        lease_seconds=float(config.get("WORKER_LEASE_SECONDS", 120)),
+        max_attempts=int(config.get("WORKER_MAX_ATTEMPTS", 3))
+    )
+
+def main():
+    from config import load_config
+
+    config = load_config()
+    parser = argparse.ArgumentParser(description="複数ノードでの分散実行")
+    parser.add_argument("--db", default=None, help="コーディネータのSQLiteファイル（省略時はWORKER_COORDINATOR_DB）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    enqueue = sub.add_parser("enqueue", help="ジョブを追加")
+    enqueue.add_argument("--company", required=True, help="会社名")
+    enqueue.add_argument("--address", required=True, help="住所")
+    enqueue.add_argument("--tel", required=True, help="電話番号")
+    enqueue.add_argument("--other", nargs="*", default=[], help="その他情報（旧社名、支店名など）")
+    enqueue.add_argument("--priority", type=int, default=0, help="優先度（大きいほど先に実行）")
+    enqueue_file = sub.add_parser("enqueue-file", help="JSONLファイルのジョブをまとめて追加")
+    enqueue_file.add_argument("path")
+    work = sub.add_parser("work", help="ワーカーとして実行")
+    work.add_argument("--concurrency", type=int, default=int(config.get("WORKER_CONCURRENCY", 2)))
+    work.add_argument("--worker-id", default=None)
+    work.add_argument("--exit-when-idle", action="store_true", help="待機中のジョブがなくなったら終了")
+    sub.add_parser("status", help="ジョブ・ワーカー・API使用枠の状況")
+    result = sub.add_parser("result", help="ジョブの結果")
+    result.add_argument("job_id", type=int)
+    args = parser.parse_args()
+
+    coordinator = build_coordinator(config, args.db)
+    try:
+        if args.command == "enqueue":
+            print(coordinator.enqueue(args.company, args.address, args.tel, args.other, args.priority))
+        elif args.command == "enqueue-file":
+            count = 0
+            with open(args.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        item = json.loads(line)
+                        coordinator.enqueue(item["company"], item["address"], item["tel"], item.get("other"),
+                                            int(item.get("priority", 0)))
+                        count += 1
+            print(f"{count}件のジョブを追加")
+        elif args.command == "work":
+            Worker(coordinator, config, worker=args.worker_id, concurrency=args.concurrency,
+                   heartbeat_seconds=float(config.get("WORKER_HEARTBEAT_SECONDS", 20))).run(args.exit_when_idle)
+        elif args.command == "status":
+            print(json.dumps(coordinator.status(), ensure_ascii=False, indent=2))
+        else:
+            print(json.dumps(coordinator.job(args.job_id), ensure_ascii=False, indent=2))
+    finally:
+        coordinator.close()
+
+if __name__ == "__main__":
+    main()